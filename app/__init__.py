@@ -1,13 +1,33 @@
 from flask import Flask
-from config import Config
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 
-app = Flask(__name__)
-app.config.from_object(Config)
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+from config import Config
+
+db = SQLAlchemy()
+
+
+def create_app(config_class=Config):
+    """
+    Build the app. Blueprints and the modules behind them are imported here
+    rather than when the package is, and Flask-Migrate only when a
+    `flask db` command runs (see app/commands.py).
+    """
+    from app import routes, api, admin, commands
+
+    app = Flask(__name__)
+    app.cli = commands.AppCommands(app.name)
+    app.config.from_object(config_class)
+    db.init_app(app)
+
+    from app.database import configure_sqlite
+    configure_sqlite(app)
 
-from app import routes
+    app.register_blueprint(routes.bp)
+    app.register_blueprint(api.bp)
+    app.register_blueprint(admin.bp)
+    app.register_blueprint(commands.bp)
 
-   
\ No newline at end of file
+    from app import sessions, instrumentation
+    sessions.init_app(app)
+    instrumentation.init_app(app, db)
+    return app
@@ -0,0 +1,70 @@
+"""
+Admin endpoints under /admin, for accounts flagged with `flask set-admin`.
+"""
+import hmac
+from functools import wraps
+
+from flask import Blueprint, current_app, g, redirect, url_for, abort, jsonify, request, make_response
+
+from app.models import QuestionStats
+from app.question_cache import question_cache
+from app.fragment_cache import fragment_cache
+from app.question_stats import stats_to_dict
+from app.user_cache import user_cache
+from app.instrumentation import render_metrics
+
+bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+def admin_required(view):
+    """Only lets through users whose is_admin flag is set."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not g.user:
+            return redirect(url_for('main.login'))
+        if not g.user.is_admin:
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapped
+
+@bp.route('/question_stats')
+@admin_required
+def question_stats():
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 100, type=int)
+    pagination = QuestionStats.query.order_by(QuestionStats.question_id).paginate(
+        page=page, per_page=per_page, max_per_page=1000, error_out=False)
+    return jsonify({
+        'page': pagination.page,
+        'per_page': pagination.per_page,
+        'total': pagination.total,
+        'pages': pagination.pages,
+        'items': [stats_to_dict(stats) for stats in pagination.items],
+    })
+
+@bp.route('/metrics')
+def metrics():
+    """Prometheus text for this worker process; only served when INSTRUMENTATION is on."""
+    if not current_app.config['INSTRUMENTATION']:
+        abort(404)
+    token = current_app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    if not (token and hmac.compare_digest(authorization, 'Bearer ' + token)):
+        if not g.user:
+            return redirect(url_for('main.login'))
+        if not g.user.is_admin:
+            abort(403)
+
+    stats = [(name, cache.stats()) for name, cache in
+             (('question', question_cache), ('user', user_cache), ('fragment', fragment_cache))]
+    caches = [
+        ('awan_cache_entries', 'gauge', 'Entries in each per-process cache.',
+         [((('cache', name),), cache['size']) for name, cache in stats]),
+        ('awan_cache_hits_total', 'counter', 'Lookups answered from each cache.',
+         [((('cache', name),), cache['hits']) for name, cache in stats]),
+        ('awan_cache_misses_total', 'counter', 'Lookups each cache had to load.',
+         [((('cache', name),), cache['misses']) for name, cache in stats]),
+    ]
+    response = make_response(render_metrics(caches))
+    response.mimetype = 'text/plain'
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
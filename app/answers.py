@@ -0,0 +1,128 @@
+"""
+Recording a rater's answer to a question.
+
+save_answer() writes the user_interactions row and everything derived from
+it (score aggregates, resume pointer, question stats) as one unit of work,
+so it can be retried as a whole by commit_with_retry().
+"""
+import json
+import math
+
+from app import db
+from app.assignments import advanced_resume_position
+from app.dialect import upsert_insert
+from app.encoding import encode_choices, encode_categories, CATEGORY_IDS
+from app.models import User, User_Interactions
+from app.question_stats import answer_contribution, update_question_stats
+from app.scoring import answer_totals
+
+
+# How the question page's hidden is_flagged input reads when the flag is off
+FALSE_STRINGS = {'', '0', 'false', 'off', 'no', 'none', 'null'}
+
+
+def parse_flag(value):
+    """is_flagged as posted by the question page ("true"/"false"/"") or sent as a JSON boolean."""
+    if isinstance(value, str):
+        return value.strip().lower() not in FALSE_STRINGS
+    return bool(value)
+
+
+def _seconds(value, name):
+    if value is None or value == '':
+        return 0.0
+    if isinstance(value, bool):
+        raise ValueError('{} must be a number of seconds'.format(name))
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('{} must be a number of seconds'.format(name))
+    if not math.isfinite(seconds) or seconds < 0:
+        raise ValueError('{} must be a non-negative number of seconds'.format(name))
+    return seconds
+
+
+def parse_answer(q, item):
+    """
+    Validate one answer sent to the JSON API for q (a CachedQuestion) and
+    return the keyword arguments for save_answer(). Applies the same rules
+    as the question page's form; raises ValueError with a message for the
+    client otherwise.
+    """
+    choices = item.get('choices')
+    if isinstance(choices, str):
+        choices = [choices]
+    if not isinstance(choices, list) or not choices or not all(isinstance(c, str) for c in choices):
+        raise ValueError('choices must be a non-empty list of letters')
+    if any(choice not in q.choices for choice in choices) or len(set(choices)) != len(choices):
+        raise ValueError('choices must be distinct letters out of {}'.format(''.join(q.choices)))
+    if not q.is_multi_select and len(choices) != 1:
+        raise ValueError('this question takes exactly one choice')
+
+    categories = item.get('categories')
+    if not isinstance(categories, list) or not categories:
+        raise ValueError('categories must be a non-empty list of category ids')
+    categories = [str(category) for category in categories]
+    if any(category not in CATEGORY_IDS for category in categories):
+        raise ValueError('categories must be ids between 1 and 10')
+
+    difficulty = item.get('difficulty')
+    if isinstance(difficulty, bool) or not isinstance(difficulty, int) or not 1 <= difficulty <= 5:
+        raise ValueError('difficulty must be an integer between 1 and 5')
+
+    return dict(
+        choices=choices,
+        categories=categories,
+        difficulty=difficulty,
+        individual_question_time=_seconds(item.get('individual_question_time'), 'individual_question_time'),
+        stopped_for=_seconds(item.get('stopped_for_time'), 'stopped_for_time'),
+        is_flagged=parse_flag(item.get('is_flagged')),
+    )
+
+
+def is_correct_answer(q, choices):
+    """choices is the list of selected letters; order does not matter for multi-select questions."""
+    if q.is_multi_select:
+        return sorted(choices) == sorted(q.answer)  # Sort to ensure consistent comparison
+    return choices == [q.answer]
+
+
+def save_answer(user_id, q, position, choices, categories, difficulty,
+                individual_question_time, stopped_for, is_flagged):
+    """
+    Store the user's answer to q (a CachedQuestion at the given position of
+    their assignment list), replacing any earlier answer. Returns whether it
+    was correct. The caller commits.
+
+    This issues three statements and no SELECTs: one UPDATE of the user row
+    (aggregates and resume pointer), the question_stats upsert and the
+    user_interactions upsert. The first two read the previously stored
+    answer through subqueries, so they run before it is overwritten.
+    """
+    is_correct = is_correct_answer(q, choices)
+
+    answer = {
+        'correctness': 1 if is_correct else 0,
+        #using json.dumps() to save with double quotation marks
+        'selected_choices': json.dumps(sorted(choices)) if q.is_multi_select else choices[0],
+        'choice_mask': encode_choices(choices),
+        'individual_question_time': individual_question_time,
+        'stopped_for': stopped_for,
+        'selected_category': json.dumps(list(categories)),
+        'category_mask': encode_categories(categories),
+        'selected_difficulty': difficulty,
+        'is_flagged': 1 if is_flagged else 0,
+    }
+
+    totals = answer_totals(user_id, q.id, answer['correctness'], individual_question_time)
+    totals[User.resume_position] = advanced_resume_position(position)
+    User.query.filter_by(id=user_id).update(totals, synchronize_session=False)
+
+    update_question_stats(user_id, q.id, answer_contribution(answer))
+
+    stmt = upsert_insert(User_Interactions.__table__).values(user_id=user_id, question_id=q.id, **answer)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id', 'question_id'],
+        set_={name: stmt.excluded[name] for name in answer},
+    ))
+    return is_correct
@@ -0,0 +1,127 @@
+"""
+JSON endpoints under /api used by the question page's prefetching and
+offline answer queue (app/static/js/question_bundle.js).
+"""
+from flask import Blueprint, current_app, g, jsonify, request, url_for
+from flask_wtf.csrf import validate_csrf
+from wtforms.validators import ValidationError
+
+from app.question_cache import question_cache
+from app.assignments import position_of, first_unanswered, unanswered_assignments
+from app.routing import router
+from app.answers import save_answer, parse_answer
+from app.database import commit_with_retry
+from app.user_cache import user_cache
+
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+@bp.route('/questions/next')
+def question_bundle():
+    """
+    The next n unanswered assigned questions as compact JSON, so the question
+    page can show them without a round trip per question. With after=<id>
+    (1-based) the bundle starts behind that question, otherwise at the
+    user's resume pointer. Answer keys and explanations are not included.
+    """
+    if not g.user:
+        return jsonify({'error': 'not logged in'}), 401
+
+    n = request.args.get('n', current_app.config['QUESTION_BUNDLE_SIZE'], type=int)
+    n = max(1, min(n, current_app.config['QUESTION_BUNDLE_MAX']))
+    start = g.user.resume_position or 0
+    after = request.args.get('after', type=int)
+    if after is not None:
+        position = position_of(g.user.id, after - 1)
+        if position is not None:
+            start = position + 1
+
+    questions = []
+    for position, question_id in unanswered_assignments(g.user.id, start).limit(n):
+        q = question_cache.get(question_id)
+        if q is None:
+            continue
+        questions.append({
+            'question_id': q.id + 1,
+            'url': url_for('main.question', id=q.id + 1),
+            'position': position,
+            'question': q.question,
+            'choices': q.choices,
+            'multi_select': q.is_multi_select,
+        })
+
+    response = jsonify({'total': g.user.assigned_count, 'questions': questions})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@bp.route('/answers', methods=['POST'])
+def submit_answers():
+    """
+    Save a batch of answers queued by the client, e.g. while a rater was
+    offline. The body is {"answers": [...]}, each item carrying question_id
+    (1-based, as in /question/<id>), choices, categories, difficulty,
+    individual_question_time, stopped_for_time, is_flagged and an optional
+    client_timestamp (ms since the epoch). Valid items are saved in one
+    transaction, oldest client_timestamp first; each item gets its own
+    result, in request order.
+    """
+    if not g.user:
+        return jsonify({'error': 'not logged in'}), 401
+    if current_app.config.get('WTF_CSRF_ENABLED', True):
+        try:
+            validate_csrf(request.headers.get('X-CSRFToken'))
+        except ValidationError as e:
+            return jsonify({'error': str(e)}), 400
+
+    payload = request.get_json(silent=True)
+    items = payload.get('answers') if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        return jsonify({'error': 'expected a JSON object with an "answers" list'}), 400
+    if len(items) > current_app.config['ANSWER_BATCH_MAX']:
+        return jsonify({'error': 'at most {} answers per request'.format(current_app.config['ANSWER_BATCH_MAX'])}), 413
+
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {'status': 'invalid', 'error': 'expected an object'}
+            continue
+        url_id = item.get('question_id')
+        result = results[index] = {'question_id': url_id}
+        timestamp = item.get('client_timestamp') or 0
+        if isinstance(url_id, bool) or not isinstance(url_id, int) or not isinstance(timestamp, (int, float)):
+            result.update(status='invalid', error='question_id and client_timestamp must be numbers')
+            continue
+        position = position_of(g.user.id, url_id - 1)
+        q = question_cache.get(url_id - 1) if position is not None else None
+        if q is None:
+            result.update(status='invalid', error='question is not assigned to you')
+            continue
+        try:
+            fields = parse_answer(q, item)
+        except ValueError as e:
+            result.update(status='invalid', error=str(e))
+            continue
+        valid.append((timestamp, index, q, position, fields))
+    valid.sort(key=lambda answer: answer[:2])
+
+    def save_all():
+        return [save_answer(g.user.id, q, position, **fields) for _, _, q, position, fields in valid]
+
+    # One transaction for the whole batch, retried as a whole if SQLite reports it locked
+    correct = commit_with_retry(save_all) if valid else []
+    for (_, index, _, _, _), is_correct in zip(valid, correct):
+        results[index].update(status='saved', correct=is_correct)
+
+    user_cache.invalidate(g.user.id)
+    if current_app.config['ROUTING_MODE'] == 'adaptive':
+        for _, _, q, _, fields in valid:
+            router.record_answer(g.user.id, q.id, fields['categories'], fields['difficulty'], fields['is_flagged'])
+
+    next_unanswered = first_unanswered(g.user.id, 0)
+    return jsonify({
+        'saved': len(valid),
+        'invalid': len(items) - len(valid),
+        'results': results,
+        'next_question_id': next_unanswered[1] + 1 if next_unanswered else None,
+    })
@@ -0,0 +1,24 @@
+"""
+Versioned, long-cacheable assets built from Python data.
+
+The category names and descriptions shown by the home and question pages
+are served once as a small script instead of being inlined into every
+render. Its URL carries a hash of the content, so browsers may keep it for
+a year; changing the text in app/forms.py changes the URL.
+"""
+import hashlib
+import json
+
+from app.forms import CATEGORY_MAP, CAT_LIST
+
+
+def _categories_script():
+    data = json.dumps({'names': CATEGORY_MAP, 'descriptions': CAT_LIST}, ensure_ascii=False)
+    body = 'window.AWAN_CATEGORIES = {};\n'.format(data).encode('utf-8')
+    return body, hashlib.sha1(body).hexdigest()[:12]
+
+
+CATEGORIES_JS, CATEGORIES_VERSION = _categories_script()
+
+# For URLs that carry the current version
+IMMUTABLE = 'public, max-age=31536000, immutable'
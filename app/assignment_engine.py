@@ -0,0 +1,301 @@
+"""
+Chooses which questions a newly registered rater is assigned.
+
+The strategy is picked with ASSIGNMENT_STRATEGY:
+
+    blocks      rater n gets block (n - 1) // RATERS_PER_QUESTION of
+                QUESTIONS_PER_RATER consecutive questions, wrapping around
+                the bank (the original formula from register())
+    balanced    the QUESTIONS_PER_RATER questions with the fewest raters, so
+                the whole bank reaches RATERS_PER_QUESTION raters before any
+                question gets another one
+    stratified  like balanced, but every rater's list mixes the values of the
+                ASSIGNMENT_STRATA column ("topic" or "source") in proportion
+                to the bank
+
+Each worker process keeps the number of raters per question in memory,
+bucketed by count, so choosing a list costs O(QUESTIONS_PER_RATER). The
+counts are loaded from the assignments table with one aggregate query the
+first time someone registers. Before each later choice, the worker reads
+the assignments of users it has not counted yet: those above the highest
+user id it has seen, and the few ids below it that were not committed when
+it last looked. Both are primary key lookups, so lists handed out by other
+workers are counted whatever order they are committed in. Changing the
+settings needs a restart.
+"""
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import func
+
+from app import db
+from app.assignments import assign_questions
+from app.models import Assignment, Questions, User
+
+
+class CoverageLevels(object):
+    """Question ids bucketed by how many raters each has, least covered first."""
+
+    def __init__(self, question_ids, counts):
+        self.counts = {}
+        self._buckets = []
+        self._lowest = 0
+        for question_id in question_ids:
+            self._insert(question_id, counts.get(question_id, 0))
+        self._advance()
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _insert(self, question_id, count):
+        while len(self._buckets) <= count:
+            self._buckets.append(OrderedDict())
+        self._buckets[count][question_id] = None
+        self.counts[question_id] = count
+        self._lowest = min(self._lowest, count)
+
+    def _advance(self):
+        while self._lowest < len(self._buckets) - 1 and not self._buckets[self._lowest]:
+            self._lowest += 1
+
+    def take(self, n):
+        """
+        The n least covered questions, counting one more rater for each. Ties
+        go to the question that reached its count first, so a fresh bank is
+        handed out in id order.
+        """
+        taken = []
+        level = self._lowest
+        while len(taken) < n and level < len(self._buckets):
+            bucket = self._buckets[level]
+            if not bucket:
+                level += 1
+                continue
+            question_id, _ = bucket.popitem(last=False)
+            taken.append((question_id, level))
+        # Re-inserted only now so one list cannot get the same question twice
+        for question_id, level in taken:
+            self._insert(question_id, level + 1)
+        self._advance()
+        return [question_id for question_id, _ in taken]
+
+    def increment(self, question_id):
+        count = self.counts[question_id]
+        del self._buckets[count][question_id]
+        self._insert(question_id, count + 1)
+        self._advance()
+
+
+class AssignmentStrategy(object):
+    """
+    Base class. load() gets every (question_id, stratum) in id order and the
+    current rater count per question; choose() returns the ids for one new
+    rater and counts them; record() counts ids assigned elsewhere.
+    """
+
+    name = None
+    # Largest max - min raters per question the strategy guarantees, None if uneven by design
+    max_spread = None
+
+    def __init__(self, questions_per_rater, raters_per_question):
+        self.questions_per_rater = questions_per_rater
+        self.raters_per_question = raters_per_question
+
+    def load(self, questions, counts):
+        raise NotImplementedError
+
+    def choose(self, user_id):
+        raise NotImplementedError
+
+    def record(self, question_ids):
+        raise NotImplementedError
+
+    def coverage(self):
+        """{question_id: raters assigned}"""
+        raise NotImplementedError
+
+
+class FixedBlocks(AssignmentStrategy):
+    name = 'blocks'
+
+    def load(self, questions, counts):
+        self.question_ids = [question_id for question_id, _ in questions]
+        self.counts = {question_id: counts.get(question_id, 0) for question_id in self.question_ids}
+
+    def choose(self, user_id):
+        size = self.questions_per_rater
+        blocks = max(1, -(-len(self.question_ids) // size))
+        block = (user_id - 1) // self.raters_per_question % blocks
+        question_ids = self.question_ids[block * size:(block + 1) * size]
+        self.record(question_ids)
+        return question_ids
+
+    def record(self, question_ids):
+        for question_id in question_ids:
+            if question_id in self.counts:
+                self.counts[question_id] += 1
+
+    def coverage(self):
+        return self.counts
+
+
+class BalancedLoad(AssignmentStrategy):
+    name = 'balanced'
+    max_spread = 1
+
+    def load(self, questions, counts):
+        self.levels = CoverageLevels([question_id for question_id, _ in questions], counts)
+
+    def choose(self, user_id):
+        return sorted(self.levels.take(min(self.questions_per_rater, len(self.levels))))
+
+    def record(self, question_ids):
+        for question_id in question_ids:
+            if question_id in self.levels.counts:
+                self.levels.increment(question_id)
+
+    def coverage(self):
+        return self.levels.counts
+
+
+class Stratified(AssignmentStrategy):
+    """
+    Splits every list across strata in proportion to their size. Fractional
+    seats carry over to the next rater, so over many raters each stratum
+    gets exactly its share and the strata stay as evenly covered as the
+    bank as a whole.
+    """
+    name = 'stratified'
+    max_spread = 2
+
+    def load(self, questions, counts):
+        by_stratum = OrderedDict()
+        for question_id, stratum in questions:
+            by_stratum.setdefault(stratum or '', []).append(question_id)
+        self.strata = {stratum: CoverageLevels(ids, counts) for stratum, ids in by_stratum.items()}
+        self.stratum_of = {question_id: stratum or '' for question_id, stratum in questions}
+        self.total = len(self.stratum_of)
+        self.owed = dict.fromkeys(self.strata, 0.0)
+
+    def choose(self, user_id):
+        size = min(self.questions_per_rater, self.total)
+        seats = {}
+        for stratum, levels in self.strata.items():
+            self.owed[stratum] += size * len(levels) / self.total
+            seats[stratum] = min(int(self.owed[stratum]), len(levels))
+        # Seats left by rounding down go to the strata owed the most
+        remaining = size - sum(seats.values())
+        for stratum in sorted(self.strata, key=lambda s: seats[s] - self.owed[s]):
+            if remaining <= 0:
+                break
+            if seats[stratum] < len(self.strata[stratum]):
+                seats[stratum] += 1
+                remaining -= 1
+
+        question_ids = []
+        for stratum, count in seats.items():
+            self.owed[stratum] -= count
+            question_ids.extend(self.strata[stratum].take(count))
+        return sorted(question_ids)
+
+    def record(self, question_ids):
+        for question_id in question_ids:
+            stratum = self.stratum_of.get(question_id)
+            if stratum is not None:
+                self.strata[stratum].increment(question_id)
+
+    def coverage(self):
+        counts = {}
+        for levels in self.strata.values():
+            counts.update(levels.counts)
+        return counts
+
+
+STRATEGIES = {strategy.name: strategy for strategy in (FixedBlocks, BalancedLoad, Stratified)}
+
+
+def make_strategy(config, name=None):
+    name = name or config['ASSIGNMENT_STRATEGY']
+    if name not in STRATEGIES:
+        raise ValueError('Unknown ASSIGNMENT_STRATEGY {!r}, expected one of {}'.format(
+            name, ', '.join(sorted(STRATEGIES))))
+    return STRATEGIES[name](config['QUESTIONS_PER_RATER'], config['RATERS_PER_QUESTION'])
+
+
+def bank_questions(config):
+    """Every (question_id, stratum) in the bank, in id order."""
+    stratum = getattr(Questions, config['ASSIGNMENT_STRATA'])
+    return db.session.query(Questions.id, stratum).order_by(Questions.id).all()
+
+
+def coverage_summary(counts, raters_per_question):
+    """min, mean and max raters per question, and how many questions have fewer than raters_per_question."""
+    values = list(counts.values()) or [0]
+    return {
+        'min': min(values),
+        'mean': sum(values) / len(values),
+        'max': max(values),
+        'below_target': sum(1 for value in values if value < raters_per_question),
+    }
+
+
+class AssignmentEngine(object):
+    """The process-wide strategy with its coverage counts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._strategy = None
+        self._watermark = 0  # users up to this id are counted, except the ones in _gaps
+        self._gaps = set()  # ids below the watermark without a committed user row when last checked
+
+    def _load(self):
+        strategy = make_strategy(current_app.config)
+        counts = dict(db.session.query(Assignment.question_id, func.count()).group_by(Assignment.question_id))
+        strategy.load(bank_questions(current_app.config), counts)
+        user_ids = [user_id for user_id, in db.session.query(User.id).order_by(User.id)]
+        self._watermark = user_ids[-1] if user_ids else 0
+        self._gaps = set(range(1, self._watermark + 1)).difference(user_ids)
+        self._strategy = strategy
+
+    def _catch_up(self):
+        # A user row is committed together with its assignments, but other
+        # workers commit in any order, so ids skipped below the watermark are
+        # looked up again until they show up
+        user_ids = [user_id for user_id, in db.session.query(User.id).filter(User.id > self._watermark)]
+        if self._gaps:
+            user_ids += [user_id for user_id, in db.session.query(User.id).filter(User.id.in_(self._gaps))]
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            rows = db.session.query(Assignment.question_id).filter(Assignment.user_id.in_(chunk)).all()
+            self._strategy.record([question_id for question_id, in rows])
+        if user_ids and max(user_ids) > self._watermark:
+            self._gaps.update(range(self._watermark + 1, max(user_ids)))
+            self._watermark = max(user_ids)
+        self._gaps.difference_update(user_ids)
+
+    def assign(self, user):
+        """Choose and store user's questions. The caller commits. Returns the question ids."""
+        with self._lock:
+            if self._strategy is None:
+                self._load()
+            else:
+                self._catch_up()
+            question_ids = self._strategy.choose(user.id)
+        assign_questions(user, question_ids)
+        return question_ids
+
+    def stats(self):
+        with self._lock:
+            if self._strategy is None:
+                return {'strategy': None}
+            summary = coverage_summary(self._strategy.coverage(), self._strategy.raters_per_question)
+            return dict(summary, strategy=self._strategy.name)
+
+    def reset(self):
+        """Forget the counts; they are reloaded on the next registration."""
+        with self._lock:
+            self._strategy = None
+
+
+assignment_engine = AssignmentEngine()
@@ -0,0 +1,136 @@
+"""
+Per-user question assignments.
+
+Each user's list of questions lives in the assignments table as one row per
+position. User.assigned_questions is still written as a JSON list so older
+tooling keeps working, but the request path only uses the indexed rows.
+"""
+import json
+
+from sqlalchemy import case, exists, func
+
+from app import db
+from app.dialect import upsert_insert
+from app.models import Assignment, User, User_Interactions
+from app.user_cache import user_cache
+
+
+def assign_questions(user, question_ids):
+    """
+    Replace the questions assigned to user with question_ids, in order.
+    The caller is responsible for committing the session.
+    """
+    question_ids = list(question_ids)
+    Assignment.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+    if question_ids:
+        db.session.execute(
+            Assignment.__table__.insert(),
+            [{'user_id': user.id, 'position': position, 'question_id': qid}
+             for position, qid in enumerate(question_ids)]
+        )
+    user.assigned_questions = json.dumps(question_ids)
+    user.assigned_count = len(question_ids)
+    user.resume_position = 0
+    user_cache.invalidate(user.id)
+
+
+def append_assignment(user_id, question_ids, question_id):
+    """
+    Add question_id at the end of the user's list, whose current question
+    ids (in order) are question_ids. Returns False, changing nothing, when a
+    concurrent request has already added a row at that position or assigned
+    question_id. The caller commits.
+    """
+    inserted = db.session.execute(upsert_insert(Assignment.__table__).on_conflict_do_nothing(), {
+        'user_id': user_id, 'position': len(question_ids), 'question_id': question_id}).rowcount
+    if not inserted:
+        return False
+    User.query.filter_by(id=user_id).update({
+        User.assigned_questions: json.dumps(list(question_ids) + [question_id]),
+        User.assigned_count: len(question_ids) + 1,
+    }, synchronize_session=False)
+    user_cache.invalidate(user_id)
+    return True
+
+
+def position_of(user_id, question_id):
+    """Zero-based position of question_id in the user's list, or None if it is not assigned."""
+    return db.session.query(Assignment.position).filter_by(
+        user_id=user_id, question_id=question_id).scalar()
+
+
+def question_at(user_id, position):
+    """Question id at the given position of the user's list, or None past the end."""
+    return db.session.query(Assignment.question_id).filter_by(
+        user_id=user_id, position=position).scalar()
+
+
+def assigned_question_ids(user_id):
+    """All of the user's assigned question ids, in order."""
+    rows = db.session.query(Assignment.question_id).filter_by(
+        user_id=user_id).order_by(Assignment.position).all()
+    return [row[0] for row in rows]
+
+
+def unanswered_assignments(user_id, start=0):
+    """
+    Query for the (position, question_id) pairs at or after start that the
+    user has not answered, in position order.
+
+    This is a single anti-join: a range scan on the assignments primary key
+    (user_id, position) probing the user_interactions primary key
+    (user_id, question_id), so a LIMIT stops it at the first rows it needs.
+    """
+    answered = exists().where(
+        User_Interactions.user_id == Assignment.user_id,
+        User_Interactions.question_id == Assignment.question_id,
+    )
+    return db.session.query(Assignment.position, Assignment.question_id).filter(
+        Assignment.user_id == user_id,
+        Assignment.position >= start,
+        ~answered,
+    ).order_by(Assignment.position)
+
+
+def first_unanswered(user_id, start=0):
+    """
+    (position, question_id) of the first assigned question at or after start
+    that the user has not answered, or None when everything is answered.
+    """
+    return unanswered_assignments(user_id, start).first()
+
+
+def advanced_resume_position(position):
+    """
+    SET value for User.resume_position after answering the question at
+    position: moved past it if it currently points at it. Answers given out
+    of order leave the pointer alone; start_quiz() skips over them with
+    first_unanswered().
+    """
+    return case((func.coalesce(User.resume_position, 0) == position, position + 1),
+                else_=User.resume_position)
+
+
+def set_resume_position(user_id, position):
+    """Store position as the user's resume pointer. The caller commits."""
+    User.query.filter_by(id=user_id).update(
+        {User.resume_position: position}, synchronize_session=False)
+    user_cache.invalidate(user_id)
+
+
+def backfill_assignments(overwrite=False):
+    """
+    Populate the assignments table from the legacy User.assigned_questions JSON.
+
+    Users that already have assignment rows are left alone unless overwrite is
+    set. Returns the number of users that were (re)assigned.
+    """
+    already_done = {row[0] for row in db.session.query(Assignment.user_id).distinct()}
+    updated = 0
+    for user in User.query.filter(User.assigned_questions.isnot(None)).all():
+        if user.id in already_done and not overwrite:
+            continue
+        assign_questions(user, json.loads(user.assigned_questions))
+        updated += 1
+    db.session.commit()
+    return updated
@@ -0,0 +1,208 @@
+"""
+Maintenance commands, available through the flask CLI (``flask --app main <command>``).
+"""
+import click
+from flask import Blueprint, current_app
+from flask.cli import AppGroup
+
+from app import db
+from app.assignments import backfill_assignments
+from app.scoring import reconcile_scores
+from app.encoding import legacy_choice_mask, legacy_category_mask
+from app.models import Assignment, QuestionStats, User, User_Interactions
+from app.question_stats import rebuild_question_stats
+
+# Registered without a URL prefix or CLI group, so the commands are top-level: flask <command>
+bp = Blueprint('commands', __name__, cli_group=None)
+
+
+class AppCommands(AppGroup):
+    """
+    The app's command group (app.cli). `flask db` is Flask-Migrate's own
+    group, but Flask-Migrate, and Alembic with it, is only imported and set
+    up when that command is looked up.
+    """
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | {'db'})
+
+    def get_command(self, ctx, name):
+        if name == 'db' and name not in self.commands:
+            from flask_migrate import Migrate
+            Migrate(current_app._get_current_object(), db)  # adds flask_migrate.cli.db to this group
+        return super().get_command(ctx, name)
+
+
+def require_tables(*models):
+    """Exit with a hint to migrate when a model's table is missing from the database."""
+    existing = set(db.inspect(db.engine).get_table_names())
+    missing = [model.__tablename__ for model in models if model.__tablename__ not in existing]
+    if missing:
+        raise SystemExit('The database has no {} table; run flask db upgrade first.'.format(', '.join(missing)))
+
+
+@bp.cli.command('backfill-assignments')
+@click.option('--overwrite', is_flag=True, help='Rebuild rows for users that already have assignments.')
+def backfill_assignments_command(overwrite):
+    """Copy User.assigned_questions JSON into the assignments table."""
+    require_tables(Assignment)
+    updated = backfill_assignments(overwrite=overwrite)
+    click.echo('Backfilled assignments for {} users.'.format(updated))
+
+
+@bp.cli.command('reconcile-scores')
+@click.option('--fix', is_flag=True, help='Overwrite drifted aggregates with the recomputed values.')
+def reconcile_scores_command(fix):
+    """Recompute user score aggregates from user_interactions and report drift."""
+    drifted = reconcile_scores(fix=fix)
+    for user, expected, stored in drifted:
+        click.echo('{} (id {}): stored score/answered/time {} expected {}'.format(
+            user.username, user.id, stored, expected))
+    click.echo('{} users drifted{}.'.format(len(drifted), ', fixed' if fix and drifted else ''))
+
+
+@bp.cli.command('encode-answers')
+@click.option('--batch-size', default=1000, help='Rows converted per commit.')
+def encode_answers_command(batch_size):
+    """Fill choice_mask/category_mask for interactions recorded before they existed."""
+    converted = 0
+    while True:
+        rows = User_Interactions.query.filter(db.or_(
+            User_Interactions.choice_mask.is_(None),
+            User_Interactions.category_mask.is_(None),
+        )).limit(batch_size).all()
+        if not rows:
+            break
+        for row in rows:
+            row.choice_mask = legacy_choice_mask(row.selected_choices)
+            row.category_mask = legacy_category_mask(row.selected_category)
+        db.session.commit()
+        converted += len(rows)
+    click.echo('Encoded {} interactions.'.format(converted))
+
+
+@bp.cli.command('rebuild-question-stats')
+def rebuild_question_stats_command():
+    """Recompute the question_stats table from user_interactions."""
+    require_tables(QuestionStats)
+    count = rebuild_question_stats()
+    click.echo('Rebuilt stats for {} questions.'.format(count))
+
+
+@bp.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if a hot query stops using its index (SQLite only)."""
+    from app.query_plans import check_query_plans
+
+    failed = 0
+    for description, plan, problems in check_query_plans():
+        click.echo('{} {}'.format('FAIL' if problems else 'ok  ', description))
+        for line in plan:
+            click.echo('       ' + line)
+        for problem in problems:
+            click.echo('     ! ' + problem)
+        failed += bool(problems)
+    if failed:
+        raise SystemExit('{} query plans regressed.'.format(failed))
+
+
+@bp.cli.command('simulate-assignments')
+@click.option('--strategy', 'strategies', multiple=True,
+              help='Strategy to simulate; repeat for several. Default: all of them.')
+@click.option('--users', default='100,1000,10000', help='Comma-separated rater counts to report at.')
+@click.option('--questions', type=int, default=None,
+              help='Simulate a synthetic bank of this size instead of the questions table.')
+@click.option('--strata', type=int, default=12, help='Strata of the synthetic bank.')
+def simulate_assignments_command(strategies, users, questions, strata):
+    """Register raters in memory and report how evenly each strategy covers the bank."""
+    import time
+
+    from app.assignment_engine import STRATEGIES, bank_questions, coverage_summary, make_strategy
+
+    checkpoints = sorted(int(count) for count in users.split(','))
+    if questions is None:
+        bank = bank_questions(current_app.config)
+    else:
+        bank = [(question_id, 'stratum{}'.format(question_id * 7 % strata)) for question_id in range(questions)]
+    if not bank:
+        raise SystemExit('The question bank is empty; pass --questions to simulate a synthetic one.')
+    target = current_app.config['RATERS_PER_QUESTION']
+    click.echo('{} questions, {} per rater, target {} raters per question'.format(
+        len(bank), current_app.config['QUESTIONS_PER_RATER'], target))
+
+    uneven = 0
+    for name in strategies or sorted(STRATEGIES):
+        strategy = make_strategy(current_app.config, name)
+        strategy.load(bank, {})
+        user_id, elapsed = 0, 0.0
+        for checkpoint in checkpoints:
+            started = time.perf_counter()
+            while user_id < checkpoint:
+                user_id += 1
+                strategy.choose(user_id)
+            elapsed += time.perf_counter() - started
+            summary = coverage_summary(strategy.coverage(), target)
+            spread = summary['max'] - summary['min']
+            failed = strategy.max_spread is not None and spread > strategy.max_spread
+            uneven += failed
+            click.echo('{:<10} {:>6} raters  min {:>4} mean {:>7.2f} max {:>4}  below target {:>7}  '
+                       '{:>6.1f} us/rater  {}'.format(
+                           name, checkpoint, summary['min'], summary['mean'], summary['max'],
+                           summary['below_target'], 1e6 * elapsed / checkpoint,
+                           'UNEVEN' if failed else 'ok'))
+    if uneven:
+        raise SystemExit('{} checkpoints exceeded their strategy\'s coverage spread.'.format(uneven))
+
+
+@bp.cli.command('import-raters')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8'))
+@click.option('--output', type=click.File('w', encoding='utf-8'),
+              help='Write username,password for the created accounts to this CSV.')
+@click.option('--batch-size', default=100, help='Accounts created per commit.')
+@click.option('--threads', default=4, help='Passwords hashed in parallel.')
+def import_raters_command(csv_file, output, batch_size, threads):
+    """Create rater accounts and assignments from a CSV with username, email and optional password columns."""
+    import csv
+
+    from app.onboarding import import_raters
+
+    raters = [{key: (value or '').strip() for key, value in row.items()} for row in csv.DictReader(csv_file)]
+    if raters and not {'username', 'email'} <= set(raters[0]):
+        raise SystemExit('The CSV needs a header row with username and email columns.')
+    created, skipped = import_raters(raters, batch_size=batch_size, threads=threads)
+    for rater in skipped:
+        click.echo('skipped {} <{}>: username or email already registered'.format(rater['username'], rater['email']))
+    if output:
+        writer = csv.writer(output)
+        writer.writerow(['username', 'password'])
+        writer.writerows([rater['username'], rater['password']] for rater in created)
+    click.echo('Created {} raters, skipped {}.'.format(len(created), len(skipped)))
+
+
+@bp.cli.command('purge-sessions')
+def purge_sessions_command():
+    """Delete expired server-side sessions (SESSION_BACKEND sqlite or filesystem)."""
+    import time
+
+    from app.sessions import make_store
+
+    if current_app.config['SESSION_BACKEND'] == 'cookie':
+        raise SystemExit('SESSION_BACKEND is cookie; there are no server-side sessions to purge.')
+    purged = make_store(current_app.config).purge(time.time())
+    click.echo('Purged {} expired sessions.'.format(purged))
+
+
+@bp.cli.command('set-admin')
+@click.argument('username')
+@click.option('--revoke', is_flag=True, help='Take admin rights away instead.')
+def set_admin_command(username, revoke):
+    """Let a registered account use the /admin endpoints."""
+    from app.user_cache import user_cache
+
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise SystemExit('No user named {!r}; they have to register first.'.format(username))
+    user.is_admin = not revoke
+    db.session.commit()
+    user_cache.invalidate(user.id)
+    click.echo('{} is {}an admin.'.format(username, 'no longer ' if revoke else 'now '))
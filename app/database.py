@@ -0,0 +1,72 @@
+"""
+SQLite production profile and write-contention handling.
+
+configure_sqlite() sets the journal mode, synchronous level, busy timeout
+and mmap size from Config on every new connection. commit_with_retry()
+re-runs a unit of work when SQLite reports that the database is locked, so
+a burst of raters submitting at once waits and retries instead of failing.
+"""
+import random
+import sqlite3
+import time
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from app import db
+
+
+def configure_sqlite(app):
+    """Register the PRAGMA listener on the app's engine when it is backed by SQLite."""
+    if not app.config['SQLITE_TUNING']:
+        return
+
+    pragmas = [
+        'PRAGMA journal_mode={}'.format(app.config['SQLITE_JOURNAL_MODE']),
+        'PRAGMA synchronous={}'.format(app.config['SQLITE_SYNCHRONOUS']),
+        'PRAGMA busy_timeout={:d}'.format(app.config['SQLITE_BUSY_TIMEOUT_MS']),
+        'PRAGMA mmap_size={:d}'.format(app.config['SQLITE_MMAP_SIZE']),
+    ]
+
+    def set_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    with app.app_context():
+        event.listen(db.engine, 'connect', set_pragmas)
+
+
+def is_locked_error(error):
+    """True for SQLite's "database is locked" / "database table is locked" errors."""
+    return isinstance(error, OperationalError) and 'locked' in str(error.orig)
+
+
+def commit_with_retry(work, retries=None, backoff=None):
+    """
+    Run work() and commit the session, retrying both with exponential backoff
+    (plus jitter) while the database is locked. work is re-run from scratch
+    after a rollback, so it must not depend on state from a failed attempt.
+    Returns whatever work() returned.
+    """
+    if retries is None:
+        retries = current_app.config['DB_COMMIT_RETRIES']
+    if backoff is None:
+        backoff = current_app.config['DB_COMMIT_BACKOFF']
+
+    attempt = 0
+    while True:
+        try:
+            result = work()
+            db.session.commit()
+            return result
+        except OperationalError as e:
+            db.session.rollback()
+            if not is_locked_error(e) or attempt >= retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+            attempt += 1
@@ -0,0 +1,16 @@
+"""
+Dialect-specific SQL that the ORM does not abstract over.
+"""
+from app import db
+
+
+def upsert_insert(table):
+    """
+    An INSERT for table that supports .on_conflict_do_update() /
+    .on_conflict_do_nothing() on the configured database (SQLite or PostgreSQL).
+    """
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
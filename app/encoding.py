@@ -0,0 +1,85 @@
+"""
+Compact integer encoding of a rater's answer.
+
+Selected choices are stored as a bitmask over the letters A-E (bit 0 = A)
+and selected categories as a bitmask over the CATEGORY_MAP ids 1-10
+(bit 0 = "1"), so readers can decode them with integer operations instead
+of guessing between JSON, Python literals and bare strings.
+"""
+import ast
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHOICE_LETTERS = 'ABCDE'
+CATEGORY_IDS = [str(n) for n in range(1, 11)]
+
+
+def encode_choices(letters):
+    """['B', 'D'] -> 0b01010. Raises ValueError for a letter outside A-E."""
+    mask = 0
+    for letter in letters:
+        index = CHOICE_LETTERS.find(letter)
+        if len(letter) != 1 or index < 0:
+            raise ValueError('Unknown choice {!r}'.format(letter))
+        mask |= 1 << index
+    return mask
+
+
+def decode_choices(mask):
+    """0b01010 -> ['B', 'D']"""
+    return [letter for i, letter in enumerate(CHOICE_LETTERS) if mask >> i & 1]
+
+
+def encode_categories(category_ids):
+    """['1', '3'] -> 0b101. Raises ValueError for an id outside 1-10."""
+    mask = 0
+    for category_id in category_ids:
+        if category_id not in CATEGORY_IDS:
+            raise ValueError('Unknown category {!r}'.format(category_id))
+        mask |= 1 << (int(category_id) - 1)
+    return mask
+
+
+def decode_categories(mask):
+    """0b101 -> ['1', '3']"""
+    return [category_id for i, category_id in enumerate(CATEGORY_IDS) if mask >> i & 1]
+
+
+def _legacy_list(text):
+    """Parses the old free-form text columns: a JSON list, a Python literal or a bare value."""
+    if not text:
+        return []
+    try:
+        value = json.loads(text)
+    except ValueError:
+        try:
+            value = ast.literal_eval(text)
+        except (ValueError, SyntaxError, TypeError):
+            value = text  # a bare letter such as B
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value]
+    return [str(value)]
+
+
+def _known(values, allowed, kind, text):
+    """The values found in allowed; anything else is logged and dropped."""
+    unknown = [value for value in values if value not in allowed]
+    if unknown:
+        logger.warning('Skipping unknown %s %s in legacy answer %r', kind, unknown, text)
+    return [value for value in values if value in allowed]
+
+
+def legacy_choice_mask(text):
+    """Mask for a selected_choices value written before masks existed. Letters outside A-E are skipped."""
+    letters = []
+    for item in _legacy_list(text):
+        # single-select answers were stored as the bare letter, e.g. "B"
+        letters.extend(item if item.isalpha() else [])
+    return encode_choices(_known(letters, CHOICE_LETTERS, 'choice', text))
+
+
+def legacy_category_mask(text):
+    """Mask for a selected_category value written before masks existed. Ids outside 1-10 are skipped."""
+    return encode_categories(_known(_legacy_list(text), CATEGORY_IDS, 'category', text))
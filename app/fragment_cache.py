@@ -0,0 +1,98 @@
+"""
+In-process cache of pre-rendered template fragments.
+
+Most of a question page is the same for every rater: the question text and
+choices depend only on the question, and the category and difficulty
+controls never change. Those parts are rendered once per process and kept
+as Markup; question() only renders the per-request parts (CSRF token,
+progress counter) around them.
+
+Entries are keyed by fragment name, key (e.g. the question id) and a hash
+of the fragment templates' source. The hash is taken once per process, so
+an edited template shows up after a restart; with TEMPLATES_AUTO_RELOAD (or
+debug mode) it is taken on every render, so edits show up straight away. When load_questions.py signals an import,
+question_cache drops everything here along with its own entries.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import current_app, render_template
+from markupsafe import Markup
+
+# Templates whose output is cached; their source goes into the version hash
+FRAGMENT_TEMPLATES = ('_question_body.html', '_question_controls.html')
+
+
+class FragmentCache(object):
+    """Size-bounded LRU of rendered fragments. A maxsize of 0 turns caching off."""
+
+    def __init__(self, maxsize=None):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def maxsize(self):
+        if self._maxsize is None:
+            return current_app.config['FRAGMENT_CACHE_SIZE']
+        return self._maxsize
+
+    @property
+    def version(self):
+        """Short hash of the fragment templates, computed once per process unless templates auto-reload."""
+        if self._version is None or current_app.jinja_env.auto_reload:
+            digest = hashlib.sha1()
+            for name in FRAGMENT_TEMPLATES:
+                source = current_app.jinja_loader.get_source(current_app.jinja_env, name)[0]
+                digest.update(source.encode('utf-8'))
+            self._version = digest.hexdigest()[:12]
+        return self._version
+
+    def render(self, name, key, template, **context):
+        """
+        The Markup of template rendered with context, from the cache when an
+        entry for (name, key) exists. context must not contain anything
+        user-specific, since the result is shared by every request.
+        """
+        maxsize = self.maxsize
+        cache_key = (name, key, self.version)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = Markup(render_template(template, **context))
+        if maxsize:
+            with self._lock:
+                self._entries[cache_key] = entry
+                while len(self._entries) > maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return entry
+
+    def invalidate(self):
+        """Drop every fragment."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'version': self._version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,276 @@
+"""
+Opt-in request instrumentation (INSTRUMENTATION=1).
+
+Records per process:
+  * request duration per endpoint, method and status
+  * where each request's time went: before_request (session user lookup),
+    SQL statements, template rendering and session commits
+  * SQL statements and SQL time per request, from engine events
+  * statements slower than SLOW_QUERY_MS, which are also logged
+
+render_metrics() returns everything in the Prometheus text format for
+/admin/metrics. Each gunicorn worker keeps its own numbers, so samples
+carry a pid label.
+
+With PROFILING=1 an admin can add ?_profile=1 to any URL: the view, SQL
+and rendering of that request are sampled every PROFILE_INTERVAL_MS by a background thread and its stacks
+are written in the folded format that flamegraph.pl and speedscope read.
+Sampling needs real threads, so it does nothing under the gevent profile.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Seconds; tuned for a page that should take a few milliseconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50)
+PHASES = ('before_request', 'sql', 'render', 'commit')
+
+
+class Histogram(object):
+    """A Prometheus histogram with one set of cumulative buckets per label combination."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield self.name + '_bucket', labels + (('le', _format_bound(bound)),), cumulative
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, cumulative
+
+
+class Metrics(object):
+    """Everything /admin/metrics reports for this process."""
+
+    def __init__(self):
+        self.request_seconds = Histogram(
+            'awan_request_duration_seconds', 'Time to handle a request.',
+            ('endpoint', 'method', 'status'), DURATION_BUCKETS)
+        self.phase_seconds = Histogram(
+            'awan_request_phase_seconds', 'Time per request spent in each phase.',
+            ('endpoint', 'phase'), DURATION_BUCKETS)
+        self.sql_statements = Histogram(
+            'awan_request_sql_statements', 'SQL statements issued per request.',
+            ('endpoint',), COUNT_BUCKETS)
+        self.slow_queries = Counter()
+        self._lock = threading.Lock()
+
+    def count_slow_query(self, endpoint):
+        with self._lock:
+            self.slow_queries[endpoint] += 1
+
+
+metrics = Metrics()
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_sample(name, labels, value):
+    label_text = ','.join('{}="{}"'.format(key, _escape(val)) for key, val in labels)
+    return '{}{{{}}} {}'.format(name, label_text, repr(float(value)))
+
+
+def _request_state():
+    """Per-request accumulators, or None outside an instrumented request."""
+    if not has_request_context():
+        return None
+    return g.get('_instrumentation')
+
+
+def init_app(app, db):
+    """Install the hooks and engine listeners when INSTRUMENTATION is on. Call after the routes are registered."""
+    if not app.config['INSTRUMENTATION']:
+        return
+    slow_query_seconds = app.config['SLOW_QUERY_MS'] / 1000.0
+
+    def start_request():
+        g._instrumentation = {
+            'started': time.perf_counter(),
+            'phases': dict.fromkeys(PHASES, 0.0),
+            'statements': 0,
+        }
+
+    def end_before_request():
+        state = _request_state()
+        if state is None:
+            return
+        state['phases']['before_request'] = time.perf_counter() - state['started']
+        # Only now is g.user known, so only admins can start the profiler
+        if app.config['PROFILING'] and request.args.get('_profile') == '1' and _is_admin():
+            g._profiler = Sampler(threading.get_ident(), app.config['PROFILE_INTERVAL_MS'] / 1000.0)
+            g._profiler.start()
+
+    # Runs first and last among the before_request hooks, around the session user lookup in routes.py
+    app.before_request_funcs.setdefault(None, []).insert(0, start_request)
+    app.before_request_funcs[None].append(end_before_request)
+
+    @app.after_request
+    def finish_request(response):
+        state = _request_state()
+        if state is None:
+            return response
+        endpoint = request.endpoint or 'unknown'
+        metrics.request_seconds.observe(
+            (('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))),
+            time.perf_counter() - state['started'])
+        for phase, seconds in state['phases'].items():
+            metrics.phase_seconds.observe((('endpoint', endpoint), ('phase', phase)), seconds)
+        metrics.sql_statements.observe((('endpoint', endpoint),), state['statements'])
+
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            response.headers['X-Profile-File'] = profiler.stop_and_write(app.config['PROFILE_DIR'], endpoint)
+        return response
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info['_query_started'].pop()
+        state = _request_state()
+        endpoint = request.endpoint if state is not None else None
+        if state is not None:
+            state['statements'] += 1
+            state['phases']['sql'] += seconds
+        if seconds >= slow_query_seconds:
+            metrics.count_slow_query(endpoint or 'none')
+            logger.warning('slow query (%.1f ms, endpoint %s): %s', seconds * 1000, endpoint,
+                           ' '.join(statement.split())[:500])
+
+    @event.listens_for(db.session, 'before_commit')
+    def before_commit(session):
+        state = _request_state()
+        if state is not None:
+            state['commit_started'] = time.perf_counter()
+
+    @event.listens_for(db.session, 'after_commit')
+    def after_commit(session):
+        state = _request_state()
+        if state is not None and 'commit_started' in state:
+            state['phases']['commit'] += time.perf_counter() - state.pop('commit_started')
+
+    def render_started(sender, template, context, **extra):
+        state = _request_state()
+        if state is not None:
+            state.setdefault('render_started', []).append(time.perf_counter())
+
+    def render_finished(sender, template, context, **extra):
+        state = _request_state()
+        if state is not None and state.get('render_started'):
+            started = state['render_started'].pop()
+            # Fragments render inside the page; only count the outermost template
+            if not state['render_started']:
+                state['phases']['render'] += time.perf_counter() - started
+
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
+
+
+def _is_admin():
+    user = g.get('user')
+    return user is not None and getattr(user, 'is_admin', False)
+
+
+def render_metrics(extra=()):
+    """
+    The metrics in the Prometheus text exposition format. extra is an
+    iterable of (name, type, help, [(labels, value), ...]) computed by the
+    caller, e.g. cache sizes.
+    """
+    pid = (('pid', str(os.getpid())),)
+    lines = []
+    for histogram in (metrics.request_seconds, metrics.phase_seconds, metrics.sql_statements):
+        lines.append('# HELP {} {}'.format(histogram.name, histogram.help_text))
+        lines.append('# TYPE {} histogram'.format(histogram.name))
+        lines.extend(_format_sample(name, pid + labels, value) for name, labels, value in histogram.samples())
+
+    lines.append('# HELP awan_slow_queries_total SQL statements slower than SLOW_QUERY_MS.')
+    lines.append('# TYPE awan_slow_queries_total counter')
+    with metrics._lock:
+        slow = sorted(metrics.slow_queries.items())
+    lines.extend(_format_sample('awan_slow_queries_total', pid + (('endpoint', endpoint),), count)
+                 for endpoint, count in slow)
+
+    for name, kind, help_text, samples in extra:
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} {}'.format(name, kind))
+        lines.extend(_format_sample(name, pid + tuple(labels), value) for labels, value in samples)
+    return '\n'.join(lines) + '\n'
+
+
+class Sampler(object):
+    """Samples one thread's stack at a fixed interval and writes folded stacks."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), frame.f_lineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def stop_and_write(self, directory, endpoint):
+        """Stop sampling and write <directory>/<endpoint>-<time>.folded. Returns the path."""
+        self.stop()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, '{}-{}.folded'.format(endpoint, time.strftime('%Y%m%d-%H%M%S')))
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write('{} {}\n'.format(stack, count))
+        return path
@@ -1,17 +1,24 @@
 from app import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from app import passwords
 
 class User(db.Model):
     __tablename__ = 'user'
     id = db.Column('user_id', db.Integer, primary_key=True)
     username = db.Column(db.String(64), index=True, unique=True)
     email = db.Column(db.String(120), index=True, unique=True)
-    password_hash = db.Column(db.String(128))
-    total_score = db.Column(db.Integer)
-    total_answered = db.Column(db.Integer)
-    total_time = db.Column(db.Float)
+    password_hash = db.Column(db.String(256))
+    # Kept up to date by the answer POST (see app/scoring.py)
+    total_score = db.Column(db.Integer, default=0)
+    total_answered = db.Column(db.Integer, default=0)
+    total_time = db.Column(db.Float, default=0)
 
     assigned_questions = db.Column(db.Text)
+    # Number of rows this user has in the assignments table
+    assigned_count = db.Column(db.Integer, default=0)
+    # Every assigned position below this one has been answered
+    resume_position = db.Column(db.Integer, default=0)
+    # May use the /admin endpoints; set with `flask set-admin`
+    is_admin = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     
     # Relationship to user_interactions
     interactions = db.relationship('User_Interactions', backref='user', lazy=True)
@@ -20,10 +27,13 @@ class User(db.Model):
         return '<User {}>'.format(self.username)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.check_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return passwords.needs_rehash(self.password_hash)
 
 class Questions(db.Model):
     __tablename__ = 'questions'
@@ -57,9 +67,87 @@ class User_Interactions(db.Model):
     individual_question_time = db.Column(db.Float, nullable=False)
     stopped_for = db.Column(db.Float, nullable=False)
     selected_category = db.Column(db.Text)
+    # Canonical bitmask forms of selected_choices / selected_category (see app/encoding.py)
+    choice_mask = db.Column(db.Integer)
+    category_mask = db.Column(db.Integer)
     selected_difficulty = db.Column(db.Integer)
     is_flagged = db.Column(db.Integer, nullable=False)
 
+    __table_args__ = (
+        # Per-question scans: the exporter and the question_stats rebuild
+        db.Index('ix_user_interactions_question_user', 'question_id', 'user_id'),
+        # Per-user totals (reconcile-scores) without touching the table
+        db.Index('ix_user_interactions_user_totals', 'user_id', 'correctness', 'individual_question_time'),
+    )
+
     def __repr__(self):
         return '<User_Interaction User:{} Question:{}>'.format(self.user_id, self.question_id)
-    
\ No newline at end of file
+
+
+class Assignment(db.Model):
+    __tablename__ = 'assignments'
+
+    # One row per (user, position) so both "where is question X in U's list"
+    # and "what comes after position P" are single index lookups.
+    user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.question_id'), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_assignments_user_question', 'user_id', 'question_id', unique=True),
+    )
+
+    def __repr__(self):
+        return '<Assignment User:{} Position:{} Question:{}>'.format(self.user_id, self.position, self.question_id)
+
+
+class QuestionStats(db.Model):
+    __tablename__ = 'question_stats'
+
+    # Vote counters per question, maintained by the answer POST (see app/question_stats.py)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.question_id'), primary_key=True)
+    ratings = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+    flags = db.Column(db.Integer, nullable=False, default=0)
+
+    # Difficulty histogram (how many raters picked 1..5)
+    difficulty_1 = db.Column(db.Integer, nullable=False, default=0)
+    difficulty_2 = db.Column(db.Integer, nullable=False, default=0)
+    difficulty_3 = db.Column(db.Integer, nullable=False, default=0)
+    difficulty_4 = db.Column(db.Integer, nullable=False, default=0)
+    difficulty_5 = db.Column(db.Integer, nullable=False, default=0)
+
+    # How many raters selected each choice
+    choice_a = db.Column(db.Integer, nullable=False, default=0)
+    choice_b = db.Column(db.Integer, nullable=False, default=0)
+    choice_c = db.Column(db.Integer, nullable=False, default=0)
+    choice_d = db.Column(db.Integer, nullable=False, default=0)
+    choice_e = db.Column(db.Integer, nullable=False, default=0)
+
+    # How many raters selected each CATEGORY_MAP id
+    category_1 = db.Column(db.Integer, nullable=False, default=0)
+    category_2 = db.Column(db.Integer, nullable=False, default=0)
+    category_3 = db.Column(db.Integer, nullable=False, default=0)
+    category_4 = db.Column(db.Integer, nullable=False, default=0)
+    category_5 = db.Column(db.Integer, nullable=False, default=0)
+    category_6 = db.Column(db.Integer, nullable=False, default=0)
+    category_7 = db.Column(db.Integer, nullable=False, default=0)
+    category_8 = db.Column(db.Integer, nullable=False, default=0)
+    category_9 = db.Column(db.Integer, nullable=False, default=0)
+    category_10 = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return '<QuestionStats Question:{} Ratings:{}>'.format(self.question_id, self.ratings)
+
+
+class ServerSession(db.Model):
+    __tablename__ = 'sessions'
+
+    # Server-side session data for SESSION_BACKEND=sqlite (see app/sessions.py)
+    session_id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    # Unix time after which the session is ignored and purged
+    expires = db.Column(db.Float, nullable=False, index=True)
+
+    def __repr__(self):
+        return '<ServerSession {}>'.format(self.session_id[:8])
@@ -0,0 +1,57 @@
+"""
+Bulk creation of rater accounts (flask import-raters).
+
+Each batch hashes its passwords in parallel with passwords.hash_passwords(),
+since hashlib releases the GIL while it works. The accounts are then inserted
+and given assignments by the assignment engine, and the batch is
+committed as a whole. This is the same thing register() does, minus the
+forms.
+"""
+import secrets
+
+from flask import current_app
+
+from app import db, passwords
+from app.assignment_engine import assignment_engine
+from app.models import User
+
+
+def generated_password():
+    return secrets.token_urlsafe(9)
+
+
+def import_raters(raters, batch_size=100, threads=4):
+    """
+    Create an account for each dict in raters (username, email and an
+    optional password; a missing one is generated and written back into the
+    dict). Usernames or emails that already exist are skipped. Returns
+    (created, skipped) lists of the dicts.
+    """
+    config = current_app.config
+    existing_usernames = {row[0] for row in db.session.query(User.username)}
+    existing_emails = {row[0] for row in db.session.query(User.email)}
+    created, skipped = [], []
+    pending = []
+    for rater in raters:
+        if rater['username'] in existing_usernames or rater['email'] in existing_emails:
+            skipped.append(rater)
+            continue
+        existing_usernames.add(rater['username'])
+        existing_emails.add(rater['email'])
+        if not rater.get('password'):
+            rater['password'] = generated_password()
+        pending.append(rater)
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        hashes = passwords.hash_passwords([rater['password'] for rater in batch], threads)
+        users = [User(username=rater['username'], email=rater['email'], password_hash=password_hash)
+                 for rater, password_hash in zip(batch, hashes)]
+        db.session.add_all(users)
+        db.session.flush()  # assigns the user ids the engine needs
+        if config['ROUTING_MODE'] != 'adaptive':
+            for user in users:
+                assignment_engine.assign(user)
+        db.session.commit()
+        created.extend(batch)
+    return created, skipped
@@ -0,0 +1,79 @@
+"""
+Password hashing with the method and cost from the config.
+
+PASSWORD_HASH_METHOD takes werkzeug's method strings, e.g.
+"scrypt:32768:8:1" or "pbkdf2:sha256:600000". A stored hash records the
+method it was made with, so changing the setting does not lock anyone out:
+check_password() still verifies old hashes, and login rehashes them with
+the new method (see needs_rehash()).
+
+Hashing is deliberately slow and CPU-bound, and hashlib releases the GIL
+while it works. Under the gevent worker profile a hash runs on gevent's
+native threadpool, so other greenlets keep being served during a login.
+Under sync and gthread it runs in the request's own thread, and at most
+PASSWORD_HASH_THREADS of them hash at once per process. Bulk imports hash
+a batch in parallel with hash_passwords().
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def _gevent_threadpool():
+    """gevent's pool of real threads when the process is monkey-patched, else None."""
+    try:
+        from gevent import get_hub
+        from gevent.monkey import is_module_patched
+    except ImportError:
+        return None
+    return get_hub().threadpool if is_module_patched('threading') else None
+
+
+def run_hashing(fn, *args):
+    """Call fn(*args): on gevent's threadpool when the process is patched, else here, PASSWORD_HASH_THREADS at a time."""
+    threadpool = _gevent_threadpool()
+    if threadpool is not None:
+        return threadpool.apply(fn, args)
+    global _slots
+    if _slots is None:
+        with _slots_lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(current_app.config['PASSWORD_HASH_THREADS'])
+    with _slots:
+        return fn(*args)
+
+
+@lru_cache(maxsize=8)
+def _hash_prefix(method):
+    """The method part werkzeug writes for method, with its defaults filled in ("scrypt" -> "scrypt:32768:8:1")."""
+    return generate_password_hash('', method, salt_length=1).split('$', 1)[0]
+
+
+def hash_password(password, method=None):
+    method = method or current_app.config['PASSWORD_HASH_METHOD']
+    return run_hashing(generate_password_hash, password, method, current_app.config['PASSWORD_SALT_LENGTH'])
+
+
+def hash_passwords(passwords, threads):
+    """Hashes of passwords, in order, computed on threads OS threads at once (for bulk imports)."""
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    salt_length = current_app.config['PASSWORD_SALT_LENGTH']
+    with ThreadPoolExecutor(threads, thread_name_prefix='password-hash') as executor:
+        return list(executor.map(lambda password: generate_password_hash(password, method, salt_length), passwords))
+
+
+def check_password(password_hash, password):
+    if not password_hash:
+        return False
+    return run_hashing(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """Whether password_hash was made with something other than PASSWORD_HASH_METHOD."""
+    return password_hash.split('$', 1)[0] != _hash_prefix(current_app.config['PASSWORD_HASH_METHOD'])
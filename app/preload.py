@@ -0,0 +1,28 @@
+"""
+State built once in the gunicorn master before it forks (preload_app, see
+gunicorn.conf.py), so every worker starts with it instead of paying for it
+on its first requests: the question cache and the compiled templates.
+Workers share those pages with the master until they write to them.
+"""
+import logging
+
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.question_cache import question_cache
+
+logger = logging.getLogger(__name__)
+
+
+def preload(app):
+    """Warm the per-process caches of app, then close the master's database connections."""
+    with app.app_context():
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+        if app.config['QUESTION_CACHE_PRELOAD']:
+            try:
+                question_cache.warm()
+            except OperationalError as e:  # e.g. started before `flask db upgrade`
+                logger.warning('question cache not preloaded: %s', e)
+        # Connections must not be shared with the forked workers
+        db.engine.dispose()
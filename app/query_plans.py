@@ -0,0 +1,123 @@
+"""
+EXPLAIN QUERY PLAN checks for the hot queries.
+
+Each check runs the real query code with the engine's statements captured,
+asks SQLite for the plan of the statement of interest and verifies that the
+expected index is used, that no table is read with a full scan and that
+nothing is sorted in a temporary B-tree. Used by ``flask check-query-plans``
+so a schema or query change that loses an index is caught before it ships.
+"""
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app import db
+from app.assignment_engine import AssignmentEngine
+from app.assignments import first_unanswered, position_of, question_at
+from app.question_stats import rebuild_question_stats
+from app.scoring import reconcile_scores
+from app.user_cache import user_cache
+
+# "SCAN t" without "USING ... INDEX" reads the whole table
+FULL_SCAN = re.compile(r'\bSCAN (\w+)$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+@contextmanager
+def captured_statements():
+    """Collects (sql, parameters) for every statement the engine runs inside the block."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+
+def statements_of(run, prefix):
+    """Runs run() and returns the captured statements starting with prefix. Rolls back afterwards."""
+    with captured_statements() as statements:
+        try:
+            run()
+        finally:
+            db.session.rollback()
+    return [(sql, params) for sql, params in statements
+            if ' '.join(sql.split()).startswith(prefix)]
+
+
+def _catch_up():
+    # A worker that has seen no user yet, with one id still missing below its watermark
+    engine = AssignmentEngine()
+    engine._load()
+    engine._watermark, engine._gaps = 0, {0}
+    engine._catch_up()
+
+
+def _export_statements():
+    from extract_questions import INTERACTIONS_SQL
+    return [(INTERACTIONS_SQL.format(where=' WHERE question_id >= ? AND question_id < ?'), (0, 500))]
+
+
+# (description, statements to explain, substrings the plan must contain)
+CHECKS = [
+    ('start_quiz: first unanswered assignment',
+     lambda: statements_of(lambda: first_unanswered(0, 0), 'SELECT assignments'),
+     ['SEARCH assignments USING', 'SEARCH user_interactions USING']),
+    ('question: position of the question',
+     lambda: statements_of(lambda: position_of(0, 0), 'SELECT assignments'),
+     ['ix_assignments_user_question']),
+    ('question: next assigned question',
+     lambda: statements_of(lambda: question_at(0, 1), 'SELECT assignments'),
+     ['SEARCH assignments USING']),
+    ('register: users not counted by this worker yet',
+     lambda: statements_of(_catch_up, 'SELECT user.user_id AS user_user_id FROM user WHERE'),
+     ['SEARCH user USING INTEGER PRIMARY KEY (rowid>?)', 'SEARCH user USING INTEGER PRIMARY KEY (rowid=?)']),
+    ('register: their assignments',
+     lambda: statements_of(_catch_up, 'SELECT assignments.question_id AS assignments_question_id FROM assignments WHERE'),
+     ['SEARCH assignments USING']),
+    ('score: user row',
+     lambda: statements_of(lambda: user_cache.get(0, refresh=True), 'SELECT user'),
+     ['SEARCH user USING INTEGER PRIMARY KEY']),
+    ('reconcile-scores: per-user totals',
+     lambda: statements_of(reconcile_scores, 'SELECT user_interactions'),
+     ['ix_user_interactions_user_totals']),
+    ('rebuild-question-stats: per-question counts',
+     lambda: statements_of(lambda: rebuild_question_stats(commit=False), 'INSERT INTO question_stats'),
+     ['ix_user_interactions_question_user']),
+    ('extract_questions.py: interactions in question order',
+     _export_statements,
+     ['ix_user_interactions_question_user']),
+]
+
+
+def explain(sql, params=()):
+    """The detail column of EXPLAIN QUERY PLAN for one statement."""
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def check_query_plans():
+    """Returns (description, plan lines, problems) for every check; problems is empty when it passed."""
+    results = []
+    for description, statements, expected in CHECKS:
+        plan = []
+        for sql, params in statements():
+            plan.extend(explain(sql, params))
+        db.session.rollback()
+
+        problems = [] if plan else ['query was not issued']
+        text = '\n'.join(plan)
+        problems += ['expected {!r} in the plan'.format(needle) for needle in expected if needle not in text]
+        for line in plan:
+            match = FULL_SCAN.search(line)
+            if match:
+                problems.append('full scan of {}'.format(match.group(1)))
+            if TEMP_SORT in line:
+                problems.append('sorts in a temporary B-tree')
+        results.append((description, plan, problems))
+    return results
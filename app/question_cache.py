@@ -0,0 +1,166 @@
+"""
+In-process, read-through cache for the questions table.
+
+The question bank does not change while a labeling campaign is running, so
+every worker keeps the rows it has served (with the choices JSON already
+decoded) and answers /question/<id> without a database round trip.
+
+The cache is per process. load_questions.py touches the QUESTION_BANK_STAMP
+file after an import; every worker compares its mtime with the one it saw
+last, at most every QUESTION_CACHE_CHECK_SECONDS, and drops its cached
+questions and question fragments when it has changed.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from app.fragment_cache import fragment_cache
+from app.models import Questions
+
+
+def bank_stamp():
+    """mtime of the QUESTION_BANK_STAMP file, or None when no import has touched it yet."""
+    try:
+        return os.stat(current_app.config['QUESTION_BANK_STAMP']).st_mtime_ns
+    except OSError:
+        return None
+
+
+def touch_bank_stamp():
+    """Tell running workers that the questions table changed."""
+    path = current_app.config['QUESTION_BANK_STAMP']
+    with open(path, 'a'):
+        os.utime(path)
+
+
+class CachedQuestion(object):
+    """Detached, read-only copy of a Questions row that can be shared between requests."""
+
+    __slots__ = ('id', 'question', 'choices', 'answer', 'explanation',
+                 'topic', 'difficulty', 'source', 'is_multi_select')
+
+    def __init__(self, row):
+        self.id = row.id
+        self.question = row.question
+        self.choices = json.loads(row.choices) if row.choices else {}
+        self.answer = row.answer or ''
+        self.explanation = row.explanation
+        self.topic = row.topic
+        self.difficulty = row.difficulty
+        self.source = row.source
+        # More than one letter in the answer key means checkboxes instead of radios
+        self.is_multi_select = len(self.answer) > 1
+
+    def __repr__(self):
+        return '<CachedQuestion {}>'.format(self.id)
+
+
+class QuestionCache(object):
+    """
+    Size-bounded LRU of CachedQuestion objects keyed by question id.
+
+    On the first lookup the whole table (up to the size bound) is loaded in a
+    single query when QUESTION_CACHE_PRELOAD is set; otherwise rows are
+    loaded one at a time as they are requested.
+    """
+
+    def __init__(self, maxsize=None):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._warmed = False
+        self._stamp = None
+        self._checked_at = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def maxsize(self):
+        if self._maxsize is None:
+            return current_app.config['QUESTION_CACHE_SIZE']
+        return self._maxsize
+
+    def get(self, question_id):
+        """Return the CachedQuestion for question_id, or None if there is no such question."""
+        self._check_stamp()
+        if not self._warmed and current_app.config['QUESTION_CACHE_PRELOAD']:
+            self.warm()
+
+        with self._lock:
+            entry = self._entries.get(question_id)
+            if entry is not None:
+                self._entries.move_to_end(question_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Query outside the lock so a slow read does not stall other workers' threads
+        row = Questions.query.filter_by(id=question_id).first()
+        if row is None:
+            return None
+        entry = CachedQuestion(row)
+        self._put(entry)
+        return entry
+
+    def _check_stamp(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < current_app.config['QUESTION_CACHE_CHECK_SECONDS']:
+            return
+        first_check = self._checked_at is None
+        self._checked_at = now
+        stamp = bank_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            if not first_check:
+                self.invalidate()
+                fragment_cache.invalidate()
+
+    def warm(self):
+        """Load up to maxsize questions in one query. Returns the number of cached entries."""
+        maxsize = self.maxsize
+        self._stamp = bank_stamp()
+        self._checked_at = time.monotonic()
+        rows = Questions.query.order_by(Questions.id).limit(maxsize).all()
+        entries = [CachedQuestion(row) for row in rows]
+        with self._lock:
+            self._entries.clear()
+            for entry in entries:
+                self._entries[entry.id] = entry
+            self._warmed = True
+            return len(self._entries)
+
+    def invalidate(self, question_id=None):
+        """Drop one question, or the whole cache when question_id is None."""
+        with self._lock:
+            if question_id is None:
+                self._entries.clear()
+                self._warmed = False
+            else:
+                self._entries.pop(question_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _put(self, entry):
+        maxsize = self.maxsize
+        with self._lock:
+            self._entries[entry.id] = entry
+            self._entries.move_to_end(entry.id)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+
+question_cache = QuestionCache()
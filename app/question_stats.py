@@ -0,0 +1,149 @@
+"""
+Materialized per-question rating statistics (the question_stats table).
+
+The answer POST adds each answer's contribution with a single upsert (and
+subtracts the previously stored one on a re-answer), so researchers can read vote
+counts, difficulty histograms and agreement without scanning
+user_interactions. rebuild_question_stats() recomputes the table from
+scratch with one GROUP BY.
+"""
+from sqlalchemy import case, func, literal, select
+
+from app import db
+from app.dialect import upsert_insert
+from app.encoding import CHOICE_LETTERS, CATEGORY_IDS
+from app.models import QuestionStats, User_Interactions
+
+DIFFICULTY_LEVELS = [1, 2, 3, 4, 5]
+DIFFICULTY_COLUMNS = ['difficulty_{}'.format(level) for level in DIFFICULTY_LEVELS]
+CHOICE_COLUMNS = ['choice_{}'.format(letter.lower()) for letter in CHOICE_LETTERS]
+CATEGORY_COLUMNS = ['category_{}'.format(category_id) for category_id in CATEGORY_IDS]
+COUNTER_COLUMNS = ['ratings', 'correct', 'flags'] + DIFFICULTY_COLUMNS + CHOICE_COLUMNS + CATEGORY_COLUMNS
+
+
+def answer_contribution(answer):
+    """
+    The counter increments a single answer adds to its question. answer maps
+    user_interactions column names to the values being stored.
+    """
+    counts = {
+        'ratings': 1,
+        'correct': 1 if answer['correctness'] else 0,
+        'flags': 1 if answer['is_flagged'] else 0,
+    }
+    if answer['selected_difficulty'] in DIFFICULTY_LEVELS:
+        counts['difficulty_{}'.format(answer['selected_difficulty'])] = 1
+    choice_mask = answer['choice_mask'] or 0
+    for i, column in enumerate(CHOICE_COLUMNS):
+        if choice_mask >> i & 1:
+            counts[column] = 1
+    category_mask = answer['category_mask'] or 0
+    for i, column in enumerate(CATEGORY_COLUMNS):
+        if category_mask >> i & 1:
+            counts[column] = 1
+    return counts
+
+
+def _counter_aggregates():
+    """Aggregates over user_interactions rows, one per COUNTER_COLUMNS entry and in that order."""
+    ui = User_Interactions
+    choice_mask = func.coalesce(ui.choice_mask, 0)
+    category_mask = func.coalesce(ui.category_mask, 0)
+
+    def bit_count(mask, i):
+        return func.sum(mask.op('>>')(i).op('&')(1))
+
+    aggregates = [
+        func.count(),
+        func.sum(ui.correctness),
+        func.sum(case((ui.is_flagged == 1, 1), else_=0)),
+    ]
+    aggregates += [func.sum(case((ui.selected_difficulty == level, 1), else_=0)) for level in DIFFICULTY_LEVELS]
+    aggregates += [bit_count(choice_mask, i) for i in range(len(CHOICE_COLUMNS))]
+    aggregates += [bit_count(category_mask, i) for i in range(len(CATEGORY_COLUMNS))]
+    return aggregates
+
+
+def update_question_stats(user_id, question_id, new):
+    """
+    Add the contribution new to the question's counters, replacing the one
+    of the user's previously stored answer, in one INSERT ... SELECT ... ON
+    CONFLICT DO UPDATE. Must run before the new answer is written. The
+    caller commits.
+
+    The SELECT aggregates over the user's existing user_interactions row
+    (none for a first answer), so it always yields exactly one row of deltas.
+    """
+    ui = User_Interactions
+    deltas = [literal(new.get(column, 0)) - func.coalesce(aggregate, 0)
+              for column, aggregate in zip(COUNTER_COLUMNS, _counter_aggregates())]
+    previous = select(literal(question_id), *deltas).where(
+        ui.user_id == user_id,
+        ui.question_id == question_id,
+    )
+
+    table = QuestionStats.__table__
+    stmt = upsert_insert(table).from_select(['question_id'] + COUNTER_COLUMNS, previous)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['question_id'],
+        set_={column: table.c[column] + stmt.excluded[column] for column in COUNTER_COLUMNS},
+    )
+    db.session.execute(stmt)
+
+
+def rebuild_question_stats(commit=True):
+    """
+    Recompute every row from user_interactions. Returns the number of
+    questions with stats. With commit=False the caller commits or rolls back.
+    """
+    table = QuestionStats.__table__
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(
+        ['question_id'] + COUNTER_COLUMNS,
+        select(User_Interactions.question_id, *_counter_aggregates()).group_by(User_Interactions.question_id),
+    ))
+    if commit:
+        db.session.commit()
+    return db.session.query(func.count(QuestionStats.question_id)).scalar()
+
+
+def _pairwise_agreement(counts):
+    """Share of rater pairs that gave the same label (the per-item term of Fleiss' kappa)."""
+    n = sum(counts)
+    if n < 2:
+        return None
+    return sum(c * (c - 1) for c in counts) / (n * (n - 1))
+
+
+def agreement(ratings, difficulty_histogram, category_votes):
+    """(difficulty agreement, category agreement) of a question, each None below two ratings."""
+    # Categories are multi-select, so agreement is averaged over one yes/no decision per category
+    category_agreement = None
+    if ratings >= 2:
+        category_agreement = sum(_pairwise_agreement([votes, ratings - votes])
+                                 for votes in category_votes) / len(category_votes)
+    return _pairwise_agreement(difficulty_histogram), category_agreement
+
+
+def stats_to_dict(stats):
+    """JSON-ready view of a QuestionStats row, including derived agreement figures."""
+    ratings = stats.ratings
+    histogram = [getattr(stats, column) for column in DIFFICULTY_COLUMNS]
+    rated_difficulty = sum(histogram)
+    category_votes = [getattr(stats, column) for column in CATEGORY_COLUMNS]
+
+    difficulty_agreement, category_agreement = agreement(ratings, histogram, category_votes)
+
+    return {
+        'question_id': stats.question_id,
+        'ratings': ratings,
+        'flags': stats.flags,
+        'percent_correct': 100.0 * stats.correct / ratings if ratings else None,
+        'mean_difficulty': (sum(level * n for level, n in zip(DIFFICULTY_LEVELS, histogram)) / rated_difficulty
+                            if rated_difficulty else None),
+        'difficulty_histogram': {str(level): n for level, n in zip(DIFFICULTY_LEVELS, histogram)},
+        'difficulty_agreement': difficulty_agreement,
+        'choice_votes': {letter: getattr(stats, column) for letter, column in zip(CHOICE_LETTERS, CHOICE_COLUMNS)},
+        'category_votes': dict(zip(CATEGORY_IDS, category_votes)),
+        'category_agreement': category_agreement,
+    }
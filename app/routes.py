@@ -1,45 +1,86 @@
-from app import app
-from flask import render_template, request, redirect, url_for, session, g, flash
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, session, g, flash, make_response
 
 # from werkzeug.urls import url_parse
 from urllib.parse import urlparse
 
-from app.forms import LoginForm, RegistrationForm, QuestionForm, CATEGORY_MAP, CAT_LIST
-from app.models import User, Questions, User_Interactions
+from app.forms import LoginForm, RegistrationForm, QuestionForm, CATEGORY_MAP
+from app.assets import CATEGORIES_JS, CATEGORIES_VERSION, IMMUTABLE
+from app.models import User
+from app.question_cache import question_cache
+from app.fragment_cache import fragment_cache
+from app.assignments import position_of, question_at, first_unanswered, set_resume_position
+from app.assignment_engine import assignment_engine
+from app.routing import router
+from app.answers import save_answer, parse_flag
+from app.database import commit_with_retry
+from app.user_cache import user_cache, SessionUser
 from app import db
-from sqlalchemy import func
-import json
 
-@app.before_request
+bp = Blueprint('main', __name__)
+
+# Difficulty radio buttons on the question page
+DIFFICULTY_CHOICES = {1: '1', 2: '2', 3: '3', 4: '4', 5: '5'}
+
+# Pages that only need to know who is logged in, which the session cookie already says
+SESSION_ONLY_ENDPOINTS = {'main.home', 'main.login', 'main.register', 'main.logout'}
+
+# Assets served the same to everyone. Reading the session would add Vary: Cookie and keep shared
+# caches from storing them
+SESSIONLESS_ENDPOINTS = {'static', 'main.categories_asset'}
+
+@bp.before_app_request
 def before_request():
     g.user = None
+    if request.endpoint in SESSIONLESS_ENDPOINTS:
+        return
 
     if 'user_id' in session:
-        user = User.query.filter_by(id=session['user_id']).first()
-        g.user = user
+        if request.endpoint in SESSION_ONLY_ENDPOINTS and 'username' in session:
+            g.user = SessionUser(session['user_id'], session['username'])
+        else:
+            # The score page shows the aggregates, so always read them fresh there
+            g.user = user_cache.get(session['user_id'], refresh=(request.endpoint == 'main.score'))
 
-@app.route('/')
-def home():
-    return render_template('index.html', title='Home', categories=CATEGORY_MAP, descriptions=json.dumps(CAT_LIST))
+@bp.app_context_processor
+def asset_urls():
+    return {'categories_asset_url': url_for('main.categories_asset', version=CATEGORIES_VERSION)}
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/')
+def home():
+    return render_template('index.html', title='Home')
+
+@bp.route('/assets/categories.<version>.js')
+def categories_asset(version):
+    """Category names and descriptions for the help pop-up, see app/assets.py."""
+    response = make_response(CATEGORIES_JS)
+    response.mimetype = 'application/javascript'
+    response.set_etag(CATEGORIES_VERSION)
+    # A page rendered before a deploy may still ask for an old version: serve the current one, uncached
+    response.headers['Cache-Control'] = IMMUTABLE if version == CATEGORIES_VERSION else 'no-cache'
+    return response.make_conditional(request)
+
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
         if user is None or not user.check_password(form.password.data):
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
+        if user.password_needs_rehash():
+            # PASSWORD_HASH_METHOD changed since this password was set
+            user.set_password(form.password.data)
+            db.session.commit()
         session['user_id'] = user.id
-        session['total_score'] = 0
+        session['username'] = user.username
         next_page = request.args.get('next')
-        if not next_page or url_parse(next_page).netloc != '':
-            next_page = url_for('home')
+        if not next_page or urlparse(next_page).netloc != '':
+            next_page = url_for('main.home')
         return redirect(next_page)
     if g.user:
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     return render_template('login.html', form=form, title='Login')
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     form = RegistrationForm()
     if form.validate_on_submit():
@@ -48,228 +89,170 @@ def register():
         db.session.add(user)
         db.session.commit()
 
-        # New logic to assign a deterministic block of questions
-        # The user_id is a 1-based integer from the database.
-        # We need to use floor division to get the correct block.
-        # ### for 5,000 questions, 100 users, 150 questions per user, 3 users per question
-        # block_index = (user.id - 1) // 3
-        # start_id = block_index * 150
-        # end_id = start_id + 150
-        
-        ### for 6,000 questions, 100 users, 150 questions per user, 3 users per question
-        block_index = (user.id - 1) // 3
-        start_id = block_index * 150
-        end_id = start_id + 150
-
-        # ### for demo 20    questions 2 users, 10 questions each
-        # block_index = (user.id - 1) // 1
-        # start_id = block_index * 10
-        # end_id = start_id + 10
-
-        assigned_ids = list(range(start_id, end_id))
-
-        user.assigned_questions = json.dumps(assigned_ids)
+        # Which questions depends on ASSIGNMENT_STRATEGY, see app/assignment_engine.py.
+        # In adaptive routing mode the list starts empty and grows one question at a time.
+        if current_app.config['ROUTING_MODE'] != 'adaptive':
+            assignment_engine.assign(user)
 
         db.session.commit()
         session['user_id'] = user.id
-        session['total_score'] = 0
-        return redirect(url_for('home'))
+        session['username'] = user.username
+        return redirect(url_for('main.home'))
     if g.user:
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     return render_template('register.html', title='Register', form=form)
 
-@app.route('/start_quiz')
+@bp.route('/start_quiz')
 def start_quiz():
     if not g.user:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
-    # Load the user's assigned questions
-    assigned_ids = json.loads(g.user.assigned_questions)
+    # Resume from the stored pointer; the anti-join skips anything answered out of order
+    resume_position = g.user.resume_position or 0
+    next_unanswered = first_unanswered(g.user.id, resume_position)
 
-    # Find the questions the user has already answered
-    answered_ids_query = db.session.query(User_Interactions.question_id).filter_by(user_id=g.user.id).all()
-    answered_ids = {qid[0] for qid in answered_ids_query}
-    
-    # Find the first un-answered question in the assigned list
     next_question_id = None
-    for qid in assigned_ids:
-        if qid not in answered_ids:
-            next_question_id = qid
-            break
+    if next_unanswered is not None:
+        position, next_question_id = next_unanswered
+        if position != resume_position:
+            set_resume_position(g.user.id, position)
+            db.session.commit()
+    elif current_app.config['ROUTING_MODE'] == 'adaptive':
+        next_question_id = router.next_question(g.user.id)
+        db.session.commit()
 
     if next_question_id is not None:
         # Redirect to the question, adjusting for the 1-based URL
-        return redirect(url_for('question', id=(next_question_id + 1)))
+        return redirect(url_for('main.question', id=(next_question_id + 1)))
     else:
         # All assigned questions have been answered
-        return redirect(url_for('score'))
+        return redirect(url_for('main.score'))
 
 
-@app.route('/question/<int:id>', methods=['GET', 'POST'])
+@bp.route('/question/<int:id>', methods=['GET', 'POST'])
 def question(id):
     question_id = id-1 # database is zero-index, the questions id will be 1 indexed...
     
 
     if not g.user:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     # We will use the form object to render the submit button and the CSRF token.
     form = QuestionForm()
 
-    # Get user's assigned questions to determine progress
-    assigned_ids = json.loads(g.user.assigned_questions)
-
-    # Find the index of the current question in the user's list
-    # The `try-except` handles cases where an invalid question ID is manually entered.
-    try:
-        current_question_index = assigned_ids.index(question_id)
-        current_question_number = current_question_index + 1
-        total_user_questions = len(assigned_ids)
-    except ValueError:
+    # Find the position of the current question in the user's list (one indexed lookup)
+    current_question_index = position_of(g.user.id, question_id)
+    if current_question_index is None:
         # If the question ID is not in the assigned list, redirect to the start of the quiz.
-        return redirect(url_for('start_quiz'))
+        return redirect(url_for('main.start_quiz'))
+    total_user_questions = g.user.assigned_count
+    if current_app.config['ROUTING_MODE'] == 'adaptive':
+        total_user_questions = max(total_user_questions, current_app.config['QUESTIONS_PER_RATER'])
 
     # # Correctly set the choices for the SelectMultipleField using .items()
     # form.category.choices = list(CATEGORY_MAP.items())
     
-    q = Questions.query.filter_by(id=question_id).first()
+    # Served from the in-process cache; choices are already decoded there.
+    q = question_cache.get(question_id)
 
 
     if not q:
         # If no question is found, redirect to the score page.
-        return redirect(url_for('score'))
+        return redirect(url_for('main.score'))
     
-    # We need to load the choices from the stored JSON string.
-    q_choices = json.loads(q.choices)
+    q_choices = q.choices
 
     # Correctly set the choices for the SelectMultipleField using .items()
     # It's better to do this here before validation.
     form.options.choices = list(q_choices.items())
     form.category.choices = list(CATEGORY_MAP.items())
 
-    # Create a list of difficulty choices to pass to the template
-    DIFFICULTY_CHOICES = {1: '1', 2: '2', 3: '3', 4: '4', 5: '5'}
-
     # print("is form valid on submit: ", form.validate_on_submit())
     if form.validate_on_submit():
-        # Check if the question has a single or multiple correct answers
-        is_multi_select = len(q.answer) > 1
-        is_correct = False
-        user_options_multi = []
-        user_options_single = ""
-        if is_multi_select:
+        if q.is_multi_select:
             # For multiple-choice questions, `request.form.getlist` gets a list of selected values
-            user_options_multi = request.form.getlist('options')
-            user_options_multi.sort() # Sort to ensure consistent comparison
-            correct_options = sorted(list(q.answer)) # Sort the correct answer string
-            is_correct = (user_options_multi == correct_options)
+            user_options = request.form.getlist('options')
         else:
             # For single-choice questions, `request.form['options']` gets the single selected value
-            user_options_single = request.form['options']
-            is_correct = (user_options_single == q.answer)
-
-        if is_correct:
-            session['total_score'] = session.get('total_score', 0) + 1
-            # flash('Correct! Explanation: {} Your score is now {}'.format(q.explanation, session['total_score']), 'success')
-        # else:
-            # flash('Incorrect. The correct answer was {} Explanation: {}'.format(q.answer, q.explanation), 'danger')
-
-        # # Save the selected category to the current question's database entry
-        # print("Current id: ", id)
-        # selected_category = form.category.data
-        # print("selected_category: ", selected_category)
-        # category_str = CATEGORY_MAP.get(selected_category)
-        # print("category_str: ", category_str)
-        # q.category = category_str
-        # db.session.commit()
-
-        interaction = User_Interactions.query.filter_by(user_id=g.user.id, question_id=q.id).first()
-        if not interaction:
-            interaction = User_Interactions(user_id=g.user.id, question_id=q.id)
-            db.session.add(interaction)
-        
-        interaction.correctness = 1 if is_correct else 0
-
-        if is_multi_select:
-            # print("user_options_multi: ", user_options_multi)
-            # print("\".join(user_options_multi) ", "".join(user_options_multi))
-            interaction.selected_choices = json.dumps(user_options_multi) #using json.dumps() to save with double quotation marks
-        else:
-            interaction.selected_choices = user_options_single
+            user_options = [request.form['options']]
 
-        # Retrieve the individual question time from the hidden form field
+        # Retrieve the individual question time and the stopped for time from the hidden form fields
         individual_question_time = request.form.get('individual_question_time')
-        interaction.individual_question_time = float(individual_question_time) if individual_question_time else 0
-        
-        # Retrieve the stopped for time from the hidden form field
         stopped_for_time = request.form.get('stopped_for_time')
-        interaction.stopped_for = float(stopped_for_time) if stopped_for_time else 0 
-
-        selected_categories = request.form.getlist('category')
-        category_list_str = json.dumps(list(selected_categories))
-        # print("category lsit string: ", category_list_str)
-        interaction.selected_category = category_list_str
 
+        # The whole write is retried if SQLite reports the database as locked
+        is_correct = commit_with_retry(lambda: save_answer(
+            g.user.id, q, current_question_index,
+            choices=user_options,
+            categories=request.form.getlist('category'),
+            difficulty=form.difficulty.data,
+            individual_question_time=float(individual_question_time) if individual_question_time else 0,
+            stopped_for=float(stopped_for_time) if stopped_for_time else 0,
+            is_flagged=parse_flag(request.form.get('is_flagged')),
+        ))
+
+        # The score is User.total_score, kept by save_answer(), so answering leaves the session alone
+        # if is_correct:
+            # flash('Correct! Explanation: {} Your score is now {}'.format(q.explanation, g.user.total_score), 'success')
+        # else:
+            # flash('Incorrect. The correct answer was {} Explanation: {}'.format(q.answer, q.explanation), 'danger')
 
-        difficulties = [1,2,3,4,5]
-        # print("form.difficulty.data: ", form.difficulty.data)
-        interaction.selected_difficulty = form.difficulty.data 
+        # Totals and the resume pointer changed; reload them on the next request
+        user_cache.invalidate(g.user.id)
 
-        is_flagged = request.form.get('is_flagged')
-        # print("is_flagged: ", is_flagged)
-        interaction.is_flagged = 1 if is_flagged else 0
+        # Find the next question in the user's assigned list
+        next_question_id = question_at(g.user.id, current_question_index + 1)
+        if current_app.config['ROUTING_MODE'] == 'adaptive':
+            router.record_answer(g.user.id, q.id, request.form.getlist('category'), form.difficulty.data,
+                                 parse_flag(request.form.get('is_flagged')))
+            if next_question_id is None:
+                next_question_id = router.next_question(g.user.id)
+                db.session.commit()
+        if next_question_id is not None:
+            return redirect(url_for('main.question', id=(next_question_id + 1)))
+        else:
+            return redirect(url_for('main.score'))
 
-        db.session.commit()
+    return render_question_page(form, q, current_question_index, total_user_questions)
 
-        # Find the next question in the user's assigned list
-        assigned_ids = json.loads(g.user.assigned_questions)
-        try:
-            current_index = assigned_ids.index(q.id)
-            if current_index + 1 < len(assigned_ids):
-                next_question_id = assigned_ids[current_index + 1]
-                return redirect(url_for('question', id=(next_question_id + 1)))
-            else:
-                return redirect(url_for('score'))
-        except ValueError:
-            # Current question ID not in the assigned list, something is wrong.
-            return redirect(url_for('score'))
 
+def render_question_page(form, q, position, total_questions):
+    """
+    The question page for q at position of the user's assignment list. The
+    question text, choices and rating controls come from the fragment
+    cache; only the CSRF token and progress counter are rendered per request.
+    """
     # Determine if we should render radio buttons or checkboxes
-    is_multi_select = len(q.answer) > 1
-
+    is_multi_select = q.is_multi_select
     is_multi_select_txt = "(多选题)" if is_multi_select else "(单选题)"
-    
-    # print("is_multi_select_txt: ", is_multi_select_txt)
 
-    return render_template('question.html', form=form, score=session['total_score'], total_questions=total_user_questions, is_multi_select_txt=is_multi_select_txt, q=q, choices=q_choices, is_multi_select=is_multi_select, 
-                           title='問題 {}/{}'.format(current_question_number, total_user_questions), categories=CATEGORY_MAP, difficulties=DIFFICULTY_CHOICES, descriptions=json.dumps(CAT_LIST))
+    question_body = fragment_cache.render('question', q.id, '_question_body.html',
+                                          q=q, choices=q.choices, is_multi_select=is_multi_select)
+    question_controls = fragment_cache.render('controls', None, '_question_controls.html',
+                                              categories=CATEGORY_MAP, difficulties=DIFFICULTY_CHOICES)
 
+    return render_template('question.html', form=form, total_questions=total_questions,
+                           is_multi_select_txt=is_multi_select_txt, q=q, question_body=question_body, question_controls=question_controls,
+                           title='問題 {}/{}'.format(position + 1, total_questions))
 
-@app.route('/score')
+
+@bp.route('/score')
 def score():
     if not g.user:
-        return redirect(url_for('login'))
-    
-    correct_count = User_Interactions.query.filter_by(user_id=g.user.id, correctness=1).count()
-    total_answered = User_Interactions.query.filter_by(user_id=g.user.id).count()
+        return redirect(url_for('main.login'))
     
-    total_time = db.session.query(func.sum(User_Interactions.individual_question_time)).filter_by(user_id=g.user.id).scalar()
-    
-    g.user.total_score = correct_count
-    g.user.total_answered = total_answered
-    g.user.total_time = total_time
-    db.session.commit()
-
+    # Aggregates are maintained by the answer POST, so this is a plain read
     return render_template('score.html', 
                            title='Final Score',
-                           total_score=correct_count,
-                           total_answered=total_answered,
-                           total_time=total_time)
+                           total_score=g.user.total_score or 0,
+                           total_answered=g.user.total_answered or 0,
+                           total_time=g.user.total_time or 0)
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     if not g.user:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
+    user_cache.invalidate(g.user.id)
     session.pop('user_id', None)
-    session.pop('total_score', None)
-    return redirect(url_for('home'))
+    session.pop('username', None)
+    return redirect(url_for('main.home'))
@@ -0,0 +1,244 @@
+"""
+Adaptive routing of raters to questions (ROUTING_MODE=adaptive).
+
+A fixed assignment list keeps sending raters to questions that several
+raters have already agreed on, while disputed or flagged questions get no
+extra ratings. In adaptive mode a rater's list starts empty. Whenever they
+need a next question, the highest priority one they have not had yet is
+appended to it (see append_assignment()). A question's priority adds up:
+
+  * its coverage deficit: raters still missing to RATERS_PER_QUESTION
+  * disagreement: 1 - the mean of its category and difficulty agreement
+    (the figures /admin/question_stats reports)
+  * the share of its raters who flagged it
+
+A question is settled, and no longer handed out, once it has
+RATERS_PER_QUESTION ratings with agreement of at least ROUTING_AGREEMENT
+and no flags, or once it has ROUTING_MAX_RATINGS ratings. Raters still
+answer at most QUESTIONS_PER_RATER questions each.
+
+Each worker process keeps the counters in memory in a heap, updated as its
+own answers arrive. A question that was handed out counts as one more
+rating until it is answered or its lease runs out (ROUTING_LEASE_SECONDS),
+so concurrent raters are spread out. Every ROUTING_REFRESH_SECONDS the
+counters are reloaded from question_stats to pick up other workers'
+answers and re-answers.
+"""
+import heapq
+import threading
+import time
+from collections import deque
+
+from flask import current_app
+
+from app import db
+from app.assignments import append_assignment, assigned_question_ids
+from app.encoding import encode_categories
+from app.models import QuestionStats, Questions
+from app.question_stats import CATEGORY_COLUMNS, DIFFICULTY_COLUMNS, DIFFICULTY_LEVELS, agreement
+
+RATINGS, FLAGS = 0, 1
+DIFFICULTY = slice(2, 2 + len(DIFFICULTY_COLUMNS))
+CATEGORY = slice(DIFFICULTY.stop, DIFFICULTY.stop + len(CATEGORY_COLUMNS))
+STATS_COLUMNS = ['ratings', 'flags'] + DIFFICULTY_COLUMNS + CATEGORY_COLUMNS
+
+
+class RoutingQueue(object):
+    """
+    Priority queue of questions over their rating counters, without any
+    database access. Heap entries are (-priority, question_id, version);
+    an entry whose version is no longer current is skipped when popped.
+    """
+
+    def __init__(self, target, max_ratings, agreement_target, lease_seconds):
+        self.target = target
+        self.max_ratings = max_ratings
+        self.agreement_target = agreement_target
+        self.lease_seconds = lease_seconds
+        self._counts = {}
+        self._pending = {}
+        self._version = {}
+        self._heap = []
+        self._leases = {}
+        self._lease_order = deque()
+
+    def load(self, question_ids, stats_rows):
+        """
+        Replace the counters. stats_rows are (question_id, *STATS_COLUMNS)
+        tuples; questions without one start at zero. Leases are kept.
+        """
+        empty = [0] * len(STATS_COLUMNS)
+        self._counts = {question_id: list(empty) for question_id in question_ids}
+        for row in stats_rows:
+            if row[0] in self._counts:
+                self._counts[row[0]] = list(row[1:])
+        self._heap = []
+        for question_id in self._counts:
+            self._version[question_id] = self._version.get(question_id, 0) + 1
+            priority = self.priority(question_id)
+            if priority is not None:
+                self._heap.append((-priority, question_id, self._version[question_id]))
+        heapq.heapify(self._heap)
+
+    def priority(self, question_id):
+        """How much another rating of the question is worth, or None when it is settled."""
+        counts = self._counts[question_id]
+        ratings = counts[RATINGS]
+        expected = ratings + self._pending.get(question_id, 0)
+        if expected >= self.max_ratings:
+            return None
+        disagreement = 1 - self.agreement(counts)
+        flag_share = counts[FLAGS] / ratings if ratings else 0
+        deficit = max(0, self.target - expected)
+        if not deficit and disagreement <= 1 - self.agreement_target and not counts[FLAGS]:
+            return None
+        return deficit + disagreement + flag_share
+
+    @staticmethod
+    def agreement(counts):
+        """Mean of the available agreement figures, 1 while there are too few ratings to disagree."""
+        figures = [figure for figure in agreement(counts[RATINGS], counts[DIFFICULTY], counts[CATEGORY])
+                   if figure is not None]
+        return sum(figures) / len(figures) if figures else 1.0
+
+    def _reprioritize(self, question_id):
+        self._version[question_id] += 1
+        priority = self.priority(question_id)
+        if priority is not None:
+            heapq.heappush(self._heap, (-priority, question_id, self._version[question_id]))
+
+    def _expire(self, now):
+        while self._lease_order and self._lease_order[0][0] <= now:
+            expires, user_id, question_id = self._lease_order.popleft()
+            if self._leases.get((user_id, question_id)) == expires:
+                self._release(user_id, question_id)
+
+    def _release(self, user_id, question_id):
+        del self._leases[(user_id, question_id)]
+        self._pending[question_id] -= 1
+        if not self._pending[question_id]:
+            del self._pending[question_id]
+        self._reprioritize(question_id)
+
+    def next(self, user_id, exclude, now):
+        """Lease the highest priority question not in exclude to user_id. None when all are settled."""
+        self._expire(now)
+        skipped = []
+        chosen = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            _, question_id, version = entry
+            if version != self._version[question_id]:
+                continue
+            if question_id in exclude:
+                skipped.append(entry)
+                continue
+            chosen = question_id
+            break
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        if chosen is None:
+            return None
+
+        expires = now + self.lease_seconds
+        self._leases[(user_id, chosen)] = expires
+        self._lease_order.append((expires, user_id, chosen))
+        self._pending[chosen] = self._pending.get(chosen, 0) + 1
+        self._reprioritize(chosen)
+        return chosen
+
+    def release(self, user_id, question_id):
+        """End user_id's lease on question_id without counting an answer."""
+        if (user_id, question_id) in self._leases:
+            self._release(user_id, question_id)
+
+    def record(self, user_id, question_id, difficulty, category_mask, is_flagged):
+        """Count a (first) answer to question_id and end the user's lease on it."""
+        counts = self._counts.get(question_id)
+        if counts is None:
+            return
+        counts[RATINGS] += 1
+        counts[FLAGS] += 1 if is_flagged else 0
+        if difficulty in DIFFICULTY_LEVELS:
+            counts[DIFFICULTY.start + DIFFICULTY_LEVELS.index(difficulty)] += 1
+        for i in range(len(CATEGORY_COLUMNS)):
+            counts[CATEGORY.start + i] += category_mask >> i & 1
+        if (user_id, question_id) in self._leases:
+            self._release(user_id, question_id)
+        else:
+            self._reprioritize(question_id)
+
+    def stats(self):
+        settled = sum(1 for question_id in self._counts if self.priority(question_id) is None)
+        return {
+            'questions': len(self._counts),
+            'settled': settled,
+            'ratings': sum(counts[RATINGS] for counts in self._counts.values()),
+            'leased': len(self._leases),
+        }
+
+
+class AdaptiveRouter(object):
+    """The process-wide RoutingQueue, loaded from question_stats and kept fresh."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = None
+        self._loaded_at = None
+
+    def _refresh(self):
+        config = current_app.config
+        if self._queue is None:
+            self._queue = RoutingQueue(config['RATERS_PER_QUESTION'], config['ROUTING_MAX_RATINGS'],
+                                       config['ROUTING_AGREEMENT'], config['ROUTING_LEASE_SECONDS'])
+        elif time.monotonic() - self._loaded_at < config['ROUTING_REFRESH_SECONDS']:
+            return
+        question_ids = [row[0] for row in db.session.query(Questions.id).order_by(Questions.id)]
+        columns = [getattr(QuestionStats, column) for column in STATS_COLUMNS]
+        stats_rows = db.session.query(QuestionStats.question_id, *columns).all()
+        self._queue.load(question_ids, stats_rows)
+        self._loaded_at = time.monotonic()
+
+    def next_question(self, user_id):
+        """
+        Append the next question to the user's list and return its id, or
+        None when the user has answered QUESTIONS_PER_RATER questions or
+        nothing needs rating. The caller commits.
+        """
+        question_ids = assigned_question_ids(user_id)
+        if len(question_ids) >= current_app.config['QUESTIONS_PER_RATER']:
+            return None
+        with self._lock:
+            self._refresh()
+            question_id = self._queue.next(user_id, set(question_ids), time.monotonic())
+        if question_id is None:
+            return None
+        try:
+            appended = append_assignment(user_id, question_ids, question_id)
+        except Exception:
+            self._release(user_id, question_id)
+            raise
+        if appended:
+            return question_id
+        # A concurrent request of the same user (a double click, a prefetch) extended the list
+        # first; hand back what it added instead
+        self._release(user_id, question_id)
+        current = assigned_question_ids(user_id)
+        return current[len(question_ids)] if len(current) > len(question_ids) else None
+
+    def _release(self, user_id, question_id):
+        with self._lock:
+            self._queue.release(user_id, question_id)
+
+    def record_answer(self, user_id, question_id, categories, difficulty, is_flagged):
+        """Count a committed answer. Re-answers are corrected by the next refresh."""
+        with self._lock:
+            if self._queue is not None:
+                self._queue.record(user_id, question_id, difficulty, encode_categories(categories), is_flagged)
+
+    def stats(self):
+        with self._lock:
+            return self._queue.stats() if self._queue is not None else {}
+
+
+router = AdaptiveRouter()
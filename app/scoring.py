@@ -0,0 +1,68 @@
+"""
+Per-user score aggregates (User.total_score, total_answered, total_time).
+
+The answer POST adjusts the aggregates in the transaction that writes the
+interaction, so /score only has to read the user row. reconcile_scores()
+recomputes them from user_interactions to detect or repair drift.
+"""
+from sqlalchemy import func, select
+
+from app import db
+from app.models import User, User_Interactions
+
+
+def answer_totals(user_id, question_id, correctness, time):
+    """
+    SET values that fold one submitted answer into the user's aggregates, for
+    an UPDATE of the user row issued before the interaction is written.
+
+    The previously stored answer (if any) is read by correlated subqueries on
+    the user_interactions primary key and subtracted out, so a re-answer
+    needs no SELECT round trip first.
+    """
+    def previous(column):
+        return select(column).where(
+            User_Interactions.user_id == user_id,
+            User_Interactions.question_id == question_id,
+        ).scalar_subquery()
+
+    old_correctness = previous(User_Interactions.correctness)
+    old_time = previous(User_Interactions.individual_question_time)
+    answered_before = previous(func.count())
+    return {
+        User.total_score: func.coalesce(User.total_score, 0) + correctness - func.coalesce(old_correctness, 0),
+        User.total_answered: func.coalesce(User.total_answered, 0) + 1 - answered_before,
+        User.total_time: func.coalesce(User.total_time, 0) + time - func.coalesce(old_time, 0),
+    }
+
+
+def reconcile_scores(fix=False):
+    """
+    Compare every user's stored aggregates with a fresh GROUP BY over
+    user_interactions. Returns a list of (user, expected, stored) tuples for
+    users that drifted, where expected/stored are (score, answered, time).
+    With fix=True the stored values are overwritten and committed.
+    """
+    totals = {
+        row.user_id: (int(row.score or 0), row.answered, float(row.time or 0))
+        for row in db.session.query(
+            User_Interactions.user_id,
+            func.sum(User_Interactions.correctness).label('score'),
+            func.count().label('answered'),
+            func.sum(User_Interactions.individual_question_time).label('time'),
+        ).group_by(User_Interactions.user_id)
+    }
+
+    drifted = []
+    for user in User.query.all():
+        expected = totals.get(user.id, (0, 0, 0.0))
+        stored = (user.total_score or 0, user.total_answered or 0, float(user.total_time or 0))
+        # Times are float sums, so allow for rounding differences
+        if expected[:2] != stored[:2] or abs(expected[2] - stored[2]) > 1e-6:
+            drifted.append((user, expected, stored))
+            if fix:
+                user.total_score, user.total_answered, user.total_time = expected
+
+    if fix:
+        db.session.commit()
+    return drifted
@@ -0,0 +1,226 @@
+"""
+Server-side sessions (SESSION_BACKEND=sqlite or filesystem).
+
+By default Flask keeps the whole session in a signed cookie. With a
+server-side backend the cookie only holds a random session id, and the
+data lives in one of two places:
+
+    sqlite      the sessions table of the app database, shared by every
+                worker process
+    filesystem  one file per session in SESSION_FILE_DIR, with a per-process
+                LRU of SESSION_CACHE_SIZE entries; an entry is reused while
+                the file's mtime is unchanged
+
+The session is written only when its data changes, or when less than half
+of PERMANENT_SESSION_LIFETIME is left on its server-side expiry. The id is
+replaced whenever the logged-in user changes, so a login never reuses an id
+the client had before. Expired sessions are deleted in bulk by
+`flask purge-sessions`. Each process also purges them at most every
+SESSION_GC_SECONDS.
+"""
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from app import db
+from app.models import ServerSession
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+
+    def __init__(self, data=None, sid=None, expires=None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(data, on_update)
+        self.sid = sid
+        self.expires = expires
+        self.new = sid is None
+        self.modified = False
+        self.loaded_user_id = self.get('user_id')
+
+
+class SqliteSessionStore(object):
+    """Sessions in the sessions table, read and written on their own connection outside the request's transaction."""
+
+    table = ServerSession.__table__
+
+    def load(self, sid):
+        with db.engine.connect() as conn:
+            row = conn.execute(db.select(self.table.c.data, self.table.c.expires).where(
+                self.table.c.session_id == sid)).first()
+        return (row.data, row.expires) if row is not None else None
+
+    def save(self, sid, data, expires):
+        with db.engine.begin() as conn:
+            updated = conn.execute(self.table.update().where(self.table.c.session_id == sid).values(
+                data=data, expires=expires)).rowcount
+            if not updated:
+                conn.execute(self.table.insert().values(session_id=sid, data=data, expires=expires))
+
+    def delete(self, sid):
+        with db.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.session_id == sid))
+
+    def purge(self, now):
+        with db.engine.begin() as conn:
+            return conn.execute(self.table.delete().where(self.table.c.expires < now)).rowcount
+
+
+class FilesystemSessionStore(object):
+    """One JSON file per session, fronted by an mtime-checked LRU."""
+
+    def __init__(self, directory, cache_size):
+        self.directory = directory
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def load(self, sid):
+        path = self._path(sid)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            with self._lock:
+                self._cache.pop(sid, None)
+            return None
+        with self._lock:
+            cached = self._cache.get(sid)
+            if cached is not None and cached[0] == mtime:
+                self._cache.move_to_end(sid)
+                return cached[1]
+        try:
+            with open(path, encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        value = (stored['data'], stored['expires'])
+        self._remember(sid, mtime, value)
+        return value
+
+    def _remember(self, sid, mtime, value):
+        with self._lock:
+            self._cache[sid] = (mtime, value)
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def save(self, sid, data, expires):
+        path = self._path(sid)
+        temp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'data': data, 'expires': expires}, f)
+        os.replace(temp_path, path)
+        self._remember(sid, os.stat(path).st_mtime_ns, (data, expires))
+
+    def delete(self, sid):
+        with self._lock:
+            self._cache.pop(sid, None)
+        try:
+            os.remove(self._path(sid))
+        except OSError:
+            pass
+
+    def purge(self, now):
+        purged = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.tmp'):
+                continue
+            try:
+                with open(entry.path, encoding='utf-8') as f:
+                    expired = json.load(f)['expires'] < now
+            except (OSError, ValueError, KeyError):
+                expired = True
+            if expired:
+                self.delete(entry.name)
+                purged += 1
+        return purged
+
+
+class ServerSideSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSideSession
+
+    def __init__(self, store, gc_seconds):
+        self.store = store
+        self.gc_seconds = gc_seconds
+        self._last_gc = time.time()
+
+    def _lifetime(self, app):
+        return app.permanent_session_lifetime.total_seconds()
+
+    def open_session(self, app, request):
+        now = time.time()
+        if now - self._last_gc > self.gc_seconds:
+            self._last_gc = now
+            self.store.purge(now)
+
+        sid = request.cookies.get(self.get_cookie_name(app))
+        # Ids are token_urlsafe(32); anything else is not ours (e.g. an old signed cookie)
+        if not sid or len(sid) != 43 or not sid.replace('-', '').replace('_', '').isalnum():
+            return self.session_class()
+        stored = self.store.load(sid)
+        if stored is None or stored[1] < now:
+            return self.session_class()
+        data, expires = stored
+        return self.session_class(self.serializer.loads(data), sid=sid, expires=expires)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.sid is not None:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app), httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        now = time.time()
+        lifetime = self._lifetime(app)
+        stale = session.expires is None or session.expires - now < lifetime / 2
+        if not (session.modified or stale):
+            return
+
+        old_sid = session.sid
+        if session.new or session.get('user_id') != session.loaded_user_id:
+            session.sid = secrets.token_urlsafe(32)
+            if old_sid is not None:
+                self.store.delete(old_sid)
+        session.expires = now + lifetime
+        self.store.save(session.sid, self.serializer.dumps(dict(session)), session.expires)
+
+        if session.sid != old_sid or session.permanent:
+            response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+        response.vary.add('Cookie')
+
+
+def make_store(config):
+    backend = config['SESSION_BACKEND']
+    if backend == 'sqlite':
+        return SqliteSessionStore()
+    if backend == 'filesystem':
+        return FilesystemSessionStore(config['SESSION_FILE_DIR'], config['SESSION_CACHE_SIZE'])
+    raise ValueError('Unknown SESSION_BACKEND {!r}, expected cookie, sqlite or filesystem'.format(backend))
+
+
+def init_app(app):
+    """Install the server-side session interface unless SESSION_BACKEND is cookie (Flask's signed cookie)."""
+    if app.config['SESSION_BACKEND'] == 'cookie':
+        return
+    app.session_interface = ServerSideSessionInterface(make_store(app.config), app.config['SESSION_GC_SECONDS'])
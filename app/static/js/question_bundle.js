@@ -0,0 +1,254 @@
+// Answers assigned questions without a page load per question.
+//
+// The page prefetches the next few unanswered questions from
+// /api/questions/next. On submit the answer is queued (in localStorage, so
+// it survives a reload or a dropped connection), sent to /api/answers in
+// the background, and the next question from the bundle is shown straight
+// away. When the bundle runs out, or the answer is incomplete, the form is
+// submitted normally and the server takes over again.
+//
+// The queue is kept per rater and cleared on logout, so answers left behind
+// on a shared browser are never sent under someone else's account. Logging
+// out first sends what is queued; if that fails the rater is warned and has
+// to confirm before the answers are dropped. Answers the server turns down
+// are listed above the form.
+(function () {
+    const PREFETCH_BELOW = 3;     // refill the bundle when fewer questions are left
+    const RETRY_DELAY_MS = 5000;  // wait before resending after a network error
+
+    const form = document.getElementById('question-form');
+    if (!form || !window.fetch || !window.history.replaceState) {
+        return;
+    }
+
+    const QUEUE_KEY = 'awan-answer-queue:' + form.dataset.userId;
+    const csrfInput = form.querySelector('input[name="csrf_token"]');
+    const unsaved = document.getElementById('unsaved-answers');
+    const unsent = document.getElementById('unsent-answers');
+    let currentId = Number(form.dataset.questionId);
+    let total = Number(form.dataset.total);
+    let upcoming = [];
+    let prefetching = null;
+    let flushing = null;
+    let queue = loadQueue();
+
+    function loadQueue() {
+        try {
+            return JSON.parse(window.localStorage.getItem(QUEUE_KEY)) || [];
+        } catch (e) {
+            return [];
+        }
+    }
+
+    function saveQueue() {
+        try {
+            window.localStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+        } catch (e) {
+            // private browsing: the queue only lives as long as the page
+        }
+    }
+
+    function clearQueue() {
+        queue = [];
+        try {
+            window.localStorage.removeItem(QUEUE_KEY);
+        } catch (e) {
+            // nothing stored
+        }
+    }
+
+    // Resolves to true once nothing is left in the queue, false when a batch could not be sent
+    function flush() {
+        if (flushing) {
+            return flushing;
+        }
+        if (!queue.length) {
+            reportUnsent();
+            return Promise.resolve(true);
+        }
+        const batch = queue.slice(0, 200);
+        flushing = fetch(form.dataset.answersUrl, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfInput ? csrfInput.value : ''
+            },
+            body: JSON.stringify({answers: batch})
+        }).then(function (response) {
+            if (!response.ok) {
+                const error = new Error('answers rejected with HTTP ' + response.status);
+                error.status = response.status;
+                throw error;
+            }
+            return response.json();
+        }).then(function (result) {
+            result.results.forEach(function (item) {
+                if (item.status !== 'saved') {
+                    reportUnsaved(item);
+                }
+            });
+            queue = queue.slice(batch.length);
+            saveQueue();
+            flushing = null;
+            return flush();
+        }).catch(function (error) {
+            flushing = null;
+            console.warn(error);
+            reportUnsent();
+            if (!(error.status >= 400 && error.status < 500)) {
+                window.setTimeout(flush, RETRY_DELAY_MS);
+            }
+            // else logged out, the token expired or the batch is malformed: resending from this
+            // page will not help, so the answers wait for the next page load
+            return false;
+        });
+        return flushing;
+    }
+
+    function reportUnsent() {
+        if (!unsent) {
+            return;
+        }
+        unsent.querySelector('.count').textContent = queue.length;
+        unsent.hidden = !queue.length;
+    }
+
+    function reportUnsaved(item) {
+        if (!unsaved) {
+            return;
+        }
+        const entry = document.createElement('li');
+        entry.textContent = '問題 ' + item.question_id + ': ' + (item.error || item.status);
+        unsaved.querySelector('ul').appendChild(entry);
+        unsaved.hidden = false;
+    }
+
+    function prefetch() {
+        if (prefetching) {
+            return prefetching;
+        }
+        const after = upcoming.length ? upcoming[upcoming.length - 1].question_id : currentId;
+        prefetching = fetch(form.dataset.bundleUrl + '?after=' + after, {credentials: 'same-origin'})
+            .then(function (response) {
+                return response.ok ? response.json() : {questions: []};
+            })
+            .then(function (bundle) {
+                total = bundle.total || total;
+                upcoming = upcoming.concat(bundle.questions);
+            })
+            .catch(function () {})
+            .then(function () {
+                prefetching = null;
+            });
+        return prefetching;
+    }
+
+    // The form's answer, or null when something required is missing and the server should say so
+    function readAnswer() {
+        const data = new FormData(form);
+        const answer = {
+            question_id: currentId,
+            choices: data.getAll('options'),
+            categories: data.getAll('category'),
+            difficulty: Number(data.get('difficulty')),
+            individual_question_time: Number(data.get('individual_question_time')) || 0,
+            stopped_for_time: Number(data.get('stopped_for_time')) || 0,
+            is_flagged: data.get('is_flagged') === 'true',
+            client_timestamp: Date.now()
+        };
+        if (!answer.choices.length || !answer.categories.length || !answer.difficulty) {
+            return null;
+        }
+        return answer;
+    }
+
+    function choiceElement(key, text, multiSelect) {
+        const wrapper = document.createElement('div');
+        wrapper.className = 'form-check';
+        const input = document.createElement('input');
+        input.className = 'form-check-input';
+        input.type = multiSelect ? 'checkbox' : 'radio';
+        input.name = 'options';
+        input.value = key;
+        input.id = 'choice-' + key;
+        const label = document.createElement('label');
+        label.className = 'form-check-label';
+        label.htmlFor = input.id;
+        label.textContent = text;
+        wrapper.appendChild(input);
+        wrapper.appendChild(label);
+        return wrapper;
+    }
+
+    function show(question) {
+        const heading = '問題 ' + (question.position + 1) + '/' + total;
+        form.querySelector('.qnum').textContent =
+            heading + ' ' + (question.multi_select ? '(多选题)' : '(单选题)') + '.';
+        form.querySelector('.ques-heading').textContent = question.question;
+
+        const options = form.querySelector('.options-div');
+        options.innerHTML = '';
+        Object.keys(question.choices).forEach(function (key) {
+            if (question.choices[key] !== '') {
+                options.appendChild(choiceElement(key, question.choices[key], question.multi_select));
+            }
+        });
+        form.querySelectorAll('input[name="category"], input[name="difficulty"]').forEach(function (input) {
+            input.checked = false;
+        });
+
+        currentId = question.question_id;
+        document.title = heading;
+        window.history.replaceState(null, '', question.url);
+        window.scrollTo(0, 0);
+        resetQuestionState(Object.keys(question.choices));
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        // Registered after the page's own submit handler, which fills in the timing fields
+        form.addEventListener('submit', function (event) {
+            const answer = readAnswer();
+            if (!answer || !upcoming.length) {
+                if (queue.length) {
+                    // Send what is queued first so the server sees the answers in order
+                    event.preventDefault();
+                    flush().then(function () {
+                        form.submit();
+                    });
+                }
+                return;
+            }
+            event.preventDefault();
+            queue.push(answer);
+            saveQueue();
+            flush();
+            show(upcoming.shift());
+            if (upcoming.length < PREFETCH_BELOW) {
+                prefetch();
+            }
+        });
+
+        // Send what is queued before logging out. Handled here, base.html leaves the queue alone
+        const logout = document.getElementById('logout-link');
+        if (logout) {
+            logout.addEventListener('click', function (event) {
+                if (!queue.length) {
+                    return;
+                }
+                event.preventDefault();
+                flush().then(function (sent) {
+                    if (!sent && !window.confirm('有 ' + queue.length + ' 個回答尚未送出，登出後將會遺失。仍要登出嗎？')) {
+                        return;
+                    }
+                    clearQueue();
+                    window.location.href = logout.href;
+                });
+            });
+        }
+
+        window.addEventListener('online', flush);
+        flush();
+        prefetch();
+    });
+})();
@@ -0,0 +1,124 @@
+"""
+Short-lived, per-process cache of the logged-in user for before_request().
+
+Only the columns a request needs are loaded; password_hash and the
+assigned_questions JSON are never read on the request path. Entries expire
+after USER_CACHE_TTL seconds so other workers' writes show up quickly, and
+the worker that changes a user invalidates its own entry straight away.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from app import db
+from app.models import User
+
+
+class CachedUser(object):
+    """Detached copy of the light columns of a User row."""
+
+    COLUMNS = ('id', 'username', 'total_score', 'total_answered', 'total_time',
+               'assigned_count', 'resume_position', 'is_admin')
+
+    __slots__ = COLUMNS + ('loaded_at',)
+
+    def __init__(self, row, loaded_at):
+        for name in self.COLUMNS:
+            setattr(self, name, getattr(row, name))
+        self.loaded_at = loaded_at
+
+    def __repr__(self):
+        return '<CachedUser {}>'.format(self.username)
+
+
+class SessionUser(object):
+    """What the session cookie alone knows about the logged-in user."""
+
+    __slots__ = ('id', 'username')
+
+    def __init__(self, user_id, username):
+        self.id = user_id
+        self.username = username
+
+    def __repr__(self):
+        return '<SessionUser {}>'.format(self.username)
+
+
+class UserCache(object):
+    """Size-bounded LRU of CachedUser objects that expire after a TTL."""
+
+    def __init__(self, ttl=None, maxsize=None):
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by invalidate(), so a row read while another thread commits is not cached
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def ttl(self):
+        if self._ttl is None:
+            return current_app.config['USER_CACHE_TTL']
+        return self._ttl
+
+    @property
+    def maxsize(self):
+        if self._maxsize is None:
+            return current_app.config['USER_CACHE_SIZE']
+        return self._maxsize
+
+    def get(self, user_id, refresh=False):
+        """Return the CachedUser for user_id, or None if the user does not exist."""
+        now = time.monotonic()
+        if not refresh:
+            with self._lock:
+                entry = self._entries.get(user_id)
+                if entry is not None and now - entry.loaded_at < self.ttl:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return entry
+                self.misses += 1
+        with self._lock:
+            generation = self._generation
+
+        columns = [getattr(User, name) for name in CachedUser.COLUMNS]
+        row = db.session.query(*columns).filter(User.id == user_id).first()
+        if row is None:
+            self.invalidate(user_id)
+            return None
+
+        entry = CachedUser(row, now)
+        maxsize = self.maxsize
+        with self._lock:
+            if generation != self._generation:
+                return entry  # possibly stale already; use it for this request only
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, user_id=None):
+        """Drop one user, or every cached user when user_id is None."""
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+user_cache = UserCache()
@@ -0,0 +1,116 @@
+"""
+Ratings spent by adaptive routing compared with fixed assignment lists.
+
+Simulates raters on a synthetic bank in memory; no database is needed.
+Every question has a true difficulty and category set. Clear questions are
+labelled correctly by 95% of raters, ambiguous ones (--ambiguous share of
+the bank) by 60%. Everyone else picks at random. A question counts as
+resolved when the majority difficulty and the majority yes/no vote on each
+category match the truth.
+
+Fixed lists give every question K ratings. Adaptive routing goes through
+app.routing.RoutingQueue with the default settings until it has nothing
+left to hand out. The report gives total ratings and the share of
+questions resolved for each.
+
+    python -m benchmarks.adaptive_routing --questions 6000
+"""
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+
+from benchmarks import common
+
+CATEGORIES = 10
+
+
+class Bank(object):
+    def __init__(self, size, ambiguous, rng):
+        self.rng = rng
+        self.truth = []
+        for _ in range(size):
+            categories = frozenset(rng.sample(range(CATEGORIES), rng.choice((1, 1, 2))))
+            self.truth.append((rng.randint(1, 5), categories, rng.random() < ambiguous))
+        self.answers = [[] for _ in range(size)]
+
+    def rate(self, question_id):
+        """One rater's (difficulty, category set, flagged) for the question, which is also stored."""
+        difficulty, categories, is_ambiguous = self.truth[question_id]
+        if self.rng.random() >= (0.6 if is_ambiguous else 0.95):
+            difficulty = self.rng.randint(1, 5)
+            categories = frozenset(self.rng.sample(range(CATEGORIES), 1))
+        flagged = is_ambiguous and self.rng.random() < 0.2
+        self.answers[question_id].append((difficulty, categories))
+        return difficulty, categories, flagged
+
+    def resolved(self):
+        count = 0
+        for (difficulty, categories, _), answers in zip(self.truth, self.answers):
+            if not answers:
+                continue
+            top = Counter(answer[0] for answer in answers).most_common()
+            if top[0][0] != difficulty or len(top) > 1 and top[1][1] == top[0][1]:
+                continue
+            if all((sum(category in answer[1] for answer in answers) * 2 > len(answers)) == (category in categories)
+                   for category in range(CATEGORIES)):
+                count += 1
+        return count
+
+
+def run_fixed(size, ambiguous, ratings, seed):
+    bank = Bank(size, ambiguous, random.Random(seed))
+    for question_id in range(size):
+        for _ in range(ratings):
+            bank.rate(question_id)
+    return size * ratings, bank.resolved()
+
+
+def run_adaptive(size, ambiguous, seed, target, max_ratings, agreement, per_rater):
+    from app.routing import RoutingQueue
+
+    bank = Bank(size, ambiguous, random.Random(seed))
+    queue = RoutingQueue(target, max_ratings, agreement, lease_seconds=900)
+    queue.load(range(size), [])
+    total, user_id = 0, 0
+    while True:
+        user_id += 1
+        seen = set()
+        for _ in range(per_rater):
+            question_id = queue.next(user_id, seen, now=0)
+            if question_id is None:
+                break
+            seen.add(question_id)
+            difficulty, categories, flagged = bank.rate(question_id)
+            queue.record(user_id, question_id, difficulty, sum(1 << category for category in categories), flagged)
+            total += 1
+        if not seen:
+            return total, bank.resolved(), user_id - 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--questions', type=int, default=6000)
+    parser.add_argument('--ambiguous', type=float, default=0.2, help='share of ambiguous questions')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    from config import Config
+    target, max_ratings = Config.RATERS_PER_QUESTION, Config.ROUTING_MAX_RATINGS
+    print('{} questions, {:.0%} ambiguous'.format(args.questions, args.ambiguous))
+    for ratings in sorted({target, target + 2, max_ratings}):
+        total, resolved = run_fixed(args.questions, args.ambiguous, ratings, args.seed)
+        print('fixed {:>2} per question  {:>7} ratings  {:>6.1%} resolved'.format(
+            ratings, total, resolved / args.questions))
+    started = time.perf_counter()
+    total, resolved, raters = run_adaptive(args.questions, args.ambiguous, args.seed, target, max_ratings,
+                                           Config.ROUTING_AGREEMENT, common.QUESTIONS_PER_RATER)
+    elapsed = time.perf_counter() - started
+    print('adaptive               {:>7} ratings  {:>6.1%} resolved  ({} raters, {:.0f} us per routing)'.format(
+        total, resolved / args.questions, raters, 1e6 * elapsed / max(total, 1)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Helpers shared by the benchmark scripts: a throwaway SQLite database seeded
+with synthetic questions, and raters driving the real routes through the
+Flask test client.
+
+use_temp_database() must be called before the app package is imported,
+because Config reads DATABASE_URL at import time.
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+QUESTIONS_PER_RATER = 150  # the block size register() assigns
+
+
+def use_temp_database(path=None):
+    """Point the app at a new (or the given) SQLite file and return its path."""
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix='awan-bench-', suffix='.db')
+        os.close(fd)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    return path
+
+
+def remove_database(path):
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            os.unlink(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def load_app():
+    """Import the app against the temp database, with CSRF off for scripted form posts."""
+    from main import app
+    app.config['WTF_CSRF_ENABLED'] = False
+    return app
+
+
+def seed_questions(app, count, batch_size=5000):
+    """Create the schema and insert count synthetic questions (every 10th is multi-select)."""
+    from app import db
+    from app.models import Questions
+
+    with app.app_context():
+        db.create_all()
+        rows = []
+        for qid in range(count):
+            rows.append({
+                'question_id': qid,
+                'question': '合成問題 {}'.format(qid),
+                'choices': json.dumps({letter: '選項 {}{}'.format(letter, qid) for letter in 'ABCDE'},
+                                      ensure_ascii=False),
+                'answer': 'BD' if qid % 10 == 0 else 'ABCDE'[qid % 5],
+                'explanation': '',
+                'topic': 'topic-{}'.format(qid % 7),
+                'difficulty': qid % 5 + 1,
+                'source': 'source-{}'.format(qid % 3),
+            })
+            if len(rows) >= batch_size:
+                db.session.execute(Questions.__table__.insert(), rows)
+                rows = []
+        if rows:
+            db.session.execute(Questions.__table__.insert(), rows)
+        db.session.commit()
+
+
+def register_rater(client, username):
+    """Register (and thereby log in) a rater through the real /register route."""
+    response = client.post('/register', data={
+        'username': username,
+        'email': '{}@example.com'.format(username),
+        'password': 'benchmark',
+        'password2': 'benchmark',
+    })
+    if response.status_code != 302:
+        raise RuntimeError('registering {} failed with HTTP {}'.format(username, response.status_code))
+    return response
+
+
+def answer_form(question_id, rng=random):
+    """Form data a rater might submit for question_id (0-based)."""
+    if question_id % 10 == 0:
+        options = sorted(rng.sample('ABCDE', 2))
+    else:
+        options = [rng.choice('ABCDE')]
+    return {
+        'options': options,
+        'category': sorted(rng.sample([str(n) for n in range(1, 11)], rng.randint(1, 3)), key=int),
+        'difficulty': rng.randint(1, 5),
+        'individual_question_time': '{:.2f}'.format(rng.uniform(2, 30)),
+        'stopped_for_time': '0',
+        'is_flagged': 'true' if rng.random() < 0.02 else '',
+    }
+
+
+def question_path_id(location):
+    """0-based question id from a /question/<n> redirect location, or None."""
+    if not location or '/question/' not in location:
+        return None
+    return int(location.rsplit('/', 1)[1]) - 1
@@ -0,0 +1,89 @@
+"""
+Concurrency check for the SQLite production profile.
+
+Starts N rater processes against one temporary database. Each registers,
+resumes with /start_quiz and submits answers as fast as it can, so commits
+collide the way they do when a whole class submits at once. Afterwards the
+script verifies that no answer was lost and the maintained aggregates
+match user_interactions, and exits non-zero otherwise.
+
+    python -m benchmarks.concurrent_raters --raters 24 --answers 40
+"""
+import argparse
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+from benchmarks import common
+
+
+def run_rater(args):
+    database_path, username, answers, seed = args
+    common.use_temp_database(database_path)
+    app = common.load_app()
+    client = app.test_client()
+    rng = random.Random(seed)
+
+    common.register_rater(client, username)
+    location = client.get('/start_quiz').location
+    errors = 0
+    submitted = 0
+    for _ in range(answers):
+        question_id = common.question_path_id(location)
+        if question_id is None:
+            break
+        response = client.post(location, data=common.answer_form(question_id, rng))
+        if response.status_code != 302:
+            errors += 1
+            break
+        submitted += 1
+        location = response.location
+    return submitted, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--raters', type=int, default=24, help='simulated raters (one process each)')
+    parser.add_argument('--answers', type=int, default=40, help='answers submitted per rater')
+    parser.add_argument('--processes', type=int, default=None, help='concurrent processes (default: raters)')
+    args = parser.parse_args(argv)
+
+    database_path = common.use_temp_database()
+    try:
+        app = common.load_app()
+        # register() hands each block of questions to three raters
+        common.seed_questions(app, common.QUESTIONS_PER_RATER * math.ceil(args.raters / 3))
+
+        tasks = [(database_path, 'rater{}'.format(i), args.answers, i) for i in range(args.raters)]
+        started = time.perf_counter()
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(args.processes or args.raters) as pool:
+            results = pool.map(run_rater, tasks)
+        elapsed = time.perf_counter() - started
+
+        submitted = sum(r[0] for r in results)
+        errors = sum(r[1] for r in results)
+
+        from app import db
+        from app.models import User_Interactions
+        from app.scoring import reconcile_scores
+        with app.app_context():
+            stored = db.session.query(User_Interactions).count()
+            drifted = reconcile_scores()
+
+        print('{} raters, {} answers in {:.2f}s ({:.0f} answers/sec)'.format(
+            args.raters, submitted, elapsed, submitted / elapsed))
+        print('HTTP errors: {}, stored interactions: {}, users with drifted totals: {}'.format(
+            errors, stored, len(drifted)))
+
+        ok = errors == 0 and stored == submitted == args.raters * args.answers and not drifted
+        print('OK' if ok else 'FAILED')
+        return 0 if ok else 1
+    finally:
+        common.remove_database(database_path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
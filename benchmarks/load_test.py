@@ -0,0 +1,220 @@
+"""
+HTTP load test of the gunicorn worker profiles (see gunicorn.conf.py).
+
+For every profile a gunicorn server is started on a copy of one seeded
+temporary database. Rater threads then register and answer questions
+through the real pages over keep-alive connections: GET the question and
+POST the form, with CSRF token. Slow-client threads meanwhile trickle
+their request headers in over several seconds, the way a rater on a poor
+mobile link does. The report gives requests/sec and p50/p99 latency for
+the raters' requests. Each run is then checked: every answer that got its
+redirect must be stored, and the score totals must match user_interactions.
+
+    python -m benchmarks.load_test --profiles sync,gthread,gevent --raters 16 --slow-clients 8
+"""
+import argparse
+import http.client
+import os
+import re
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks import common
+
+CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+class Rater(object):
+    """One rater with its own keep-alive connection and session cookie."""
+
+    def __init__(self, port, latencies, timeout=60):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+        self.cookie = None
+        self.latencies = latencies
+
+    def request(self, method, path, form=None):
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        body = None
+        if form is not None:
+            body = urlencode(form, doseq=True)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()  # reconnects on the next request
+            raise
+        self.latencies.append(time.perf_counter() - started)
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        location = response.getheader('Location')
+        return response.status, urlsplit(location).path if location else None, data.decode('utf-8')
+
+
+def run_rater(port, name, deadline, results, rng_seed):
+    import random
+    rng = random.Random(rng_seed)
+    latencies = []
+    answered = errors = 0
+    rater = Rater(port, latencies)
+    try:
+        _, _, page = rater.request('GET', '/register')
+        rater.request('POST', '/register', {
+            'csrf_token': CSRF_TOKEN.search(page).group(1), 'username': name,
+            'email': '{}@example.com'.format(name), 'password': 'load', 'password2': 'load',
+        })
+        _, location, _ = rater.request('GET', '/start_quiz')
+        while time.monotonic() < deadline:
+            question_id = common.question_path_id(location)
+            if question_id is None:
+                break
+            status, _, page = rater.request('GET', location)
+            token = CSRF_TOKEN.search(page)
+            if status != 200 or token is None:
+                errors += 1
+                break
+            form = dict(common.answer_form(question_id, rng), csrf_token=token.group(1))
+            status, next_location, _ = rater.request('POST', location, form)
+            if status != 302:
+                errors += 1
+                break
+            answered += 1
+            location = next_location
+    except (OSError, http.client.HTTPException, AttributeError):
+        errors += 1
+    results.append((latencies, answered, errors))
+
+
+def run_slow_client(port, deadline, trickle_seconds):
+    """Sends a request one header line at a time, spread over trickle_seconds, until the deadline."""
+    lines = [b'GET / HTTP/1.1\r\n', b'Host: localhost\r\n', b'User-Agent: slow-rater\r\n',
+             b'Accept: text/html\r\n', b'Accept-Language: zh-TW\r\n', b'Connection: close\r\n', b'\r\n']
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=60) as sock:
+                for line in lines:
+                    sock.sendall(line)
+                    time.sleep(trickle_seconds / len(lines))
+                while sock.recv(65536):
+                    pass
+        except OSError:
+            time.sleep(0.1)
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited with status {}'.format(process.returncode))
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start listening on port {}'.format(port))
+
+
+def check_database(path, answered):
+    """(stored interactions, users whose totals differ from user_interactions)"""
+    with sqlite3.connect(path) as conn:
+        stored = conn.execute('SELECT count(*) FROM user_interactions').fetchone()[0]
+        drifted = conn.execute('''
+            SELECT count(*) FROM user u LEFT JOIN (
+                SELECT user_id, sum(correctness) AS score, count(*) AS answered
+                FROM user_interactions GROUP BY user_id
+            ) t ON t.user_id = u.user_id
+            WHERE coalesce(u.total_score, 0) != coalesce(t.score, 0)
+               OR coalesce(u.total_answered, 0) != coalesce(t.answered, 0)
+        ''').fetchone()[0]
+    return stored, drifted
+
+
+def run_profile(profile, template_path, args, port):
+    database_path = common.use_temp_database()
+    shutil.copyfile(template_path, database_path)
+    env = dict(os.environ, GUNICORN_PROFILE=profile, DATABASE_URL='sqlite:///' + database_path)
+    if args.workers:
+        env['WEB_CONCURRENCY'] = str(args.workers)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(common.ROOT, 'gunicorn.conf.py'),
+         '--bind', '127.0.0.1:{}'.format(port), 'main:app'],
+        cwd=common.ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        wait_for_port(port, server)
+        deadline = time.monotonic() + args.duration
+        results = []
+        threads = [threading.Thread(target=run_slow_client, args=(port, deadline, args.trickle_seconds), daemon=True)
+                   for _ in range(args.slow_clients)]
+        threads += [threading.Thread(target=run_rater, args=(port, '{}{}'.format(profile, i), deadline, results, i))
+                    for i in range(args.raters)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads[args.slow_clients:]:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        _, stderr = server.communicate(timeout=60)
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    answered = sum(result[1] for result in results)
+    errors = sum(result[2] for result in results)
+    stored, drifted = check_database(database_path, answered)
+    common.remove_database(database_path)
+    if not latencies:
+        print(stderr.decode('utf-8', 'replace')[-2000:])
+        raise RuntimeError('no request of the {} profile succeeded'.format(profile))
+
+    def percentile(fraction):
+        return 1000 * latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+    ok = errors == 0 and stored == answered and drifted == 0
+    print('{:<8} {:>6} requests {:>7.1f} req/s  p50 {:>7.1f} ms  p99 {:>7.1f} ms  '
+          '{:>5} answers  {} errors  stored {}  drifted {}  {}'.format(
+              profile, len(latencies), len(latencies) / elapsed, percentile(0.5), percentile(0.99),
+              answered, errors, stored, drifted, 'ok' if ok else 'FAILED'))
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--profiles', default='sync,gthread,gevent', help='comma-separated GUNICORN_PROFILE values')
+    parser.add_argument('--raters', type=int, default=16, help='concurrent raters answering questions')
+    parser.add_argument('--slow-clients', type=int, default=8, help='concurrent clients trickling requests in')
+    parser.add_argument('--trickle-seconds', type=float, default=5, help='how long a slow client takes to send a request')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of load per profile')
+    parser.add_argument('--workers', type=int, default=None, help='WEB_CONCURRENCY override for every profile')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    template_path = common.use_temp_database()
+    try:
+        app = common.load_app()
+        # register() hands each block of questions to three raters
+        common.seed_questions(app, common.QUESTIONS_PER_RATER * (args.raters // 3 + 1))
+        from app import db
+        with app.app_context():
+            db.engine.dispose()
+
+        print('{} raters, {} slow clients, {:.0f}s per profile'.format(args.raters, args.slow_clients, args.duration))
+        ok = True
+        for offset, profile in enumerate(args.profiles.split(',')):
+            ok = run_profile(profile.strip(), template_path, args, args.port + offset) and ok
+        print('OK' if ok else 'FAILED')
+        return 0 if ok else 1
+    finally:
+        common.remove_database(template_path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
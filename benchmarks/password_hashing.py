@@ -0,0 +1,106 @@
+"""
+Logins per second for each password hashing setting.
+
+For every PASSWORD_HASH_METHOD this prints the cost of one hash and
+check. It then logs raters in through the real /login route from
+--threads concurrent test clients and reports logins/sec. Last, it checks
+that a rater whose hash was made with the previous setting is rehashed
+on login.
+
+    python -m benchmarks.password_hashing --logins 40 --threads 4
+    python -m benchmarks.password_hashing --methods pbkdf2:sha256:600000,scrypt:16384:8:1
+"""
+import argparse
+import sys
+import threading
+import time
+
+from benchmarks import common
+
+METHODS = 'pbkdf2:sha256:1000000,pbkdf2:sha256:600000,scrypt:32768:8:1,scrypt:16384:8:1'
+PASSWORD = 'benchmark'
+
+
+def time_call(fn, *args, repeat=3):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return (time.perf_counter() - started) / repeat
+
+
+def run_logins(app, usernames, logins, threads):
+    """Log in logins times spread over threads clients. Returns (seconds, failures)."""
+    failures = []
+
+    def worker(index):
+        client = app.test_client()
+        for n in range(index, logins, threads):
+            response = client.post('/login', data={'username': usernames[n % len(usernames)], 'password': PASSWORD})
+            if response.status_code != 302 or response.location != '/':
+                failures.append(response.status_code)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - started, len(failures)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--methods', default=METHODS, help='comma-separated PASSWORD_HASH_METHOD values')
+    parser.add_argument('--logins', type=int, default=40, help='logins per method')
+    parser.add_argument('--threads', type=int, default=4, help='concurrent clients')
+    args = parser.parse_args(argv)
+
+    database_path = common.use_temp_database()
+    try:
+        app = common.load_app()
+        app.config['WTF_CSRF_ENABLED'] = False
+        common.seed_questions(app, common.QUESTIONS_PER_RATER)
+
+        from app import db, passwords
+        from app.models import User
+
+        methods = args.methods.split(',')
+        print('{:<24} {:>9} {:>9} {:>10}  ({} logins, {} threads, PASSWORD_HASH_THREADS={})'.format(
+            'method', 'hash ms', 'check ms', 'logins/s', args.logins, args.threads, app.config['PASSWORD_HASH_THREADS']))
+        ok = True
+        for index, method in enumerate(methods):
+            app.config['PASSWORD_HASH_METHOD'] = method
+            with app.app_context():
+                hash_seconds = time_call(passwords.hash_password, PASSWORD)
+                password_hash = passwords.hash_password(PASSWORD)
+                check_seconds = time_call(passwords.check_password, password_hash, PASSWORD)
+                usernames = []
+                for n in range(args.threads):
+                    user = User(username='m{}r{}'.format(index, n), email='m{}r{}@example.com'.format(index, n),
+                                password_hash=password_hash)
+                    db.session.add(user)
+                    usernames.append(user.username)
+                db.session.commit()
+
+            elapsed, failures = run_logins(app, usernames, args.logins, args.threads)
+            ok = ok and not failures
+            print('{:<24} {:>9.1f} {:>9.1f} {:>10.1f}{}'.format(
+                method, 1000 * hash_seconds, 1000 * check_seconds, args.logins / elapsed,
+                '  {} failed'.format(failures) if failures else ''))
+
+        # The raters of the first method log in under the last one and must be upgraded
+        app.config['PASSWORD_HASH_METHOD'] = methods[-1]
+        run_logins(app, ['m0r0'], 1, 1)
+        with app.app_context():
+            user = User.query.filter_by(username='m0r0').first()
+            rehashed = not user.password_needs_rehash() and user.check_password(PASSWORD)
+        print('rehashed on login from {} to {}: {}'.format(methods[0], methods[-1], rehashed))
+        ok = ok and (rehashed or len(methods) == 1)
+        print('OK' if ok else 'FAILED')
+        return 0 if ok else 1
+    finally:
+        common.remove_database(database_path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Requests and latency per answered question: form posts vs. the prefetch bundle.
+
+Two raters answer the same number of questions against one temporary
+database, each starting with cold question and user caches. The form rater
+does what the plain question page does (POST the form, follow the redirect
+to the next page). The bundle rater does what question_bundle.js does: one
+full page load, then /api/questions/next bundles and /api/answers posts.
+Server time is measured around each test-client request; --rtt-ms adds a
+simulated network round trip per request to estimate what a rater on a
+slow link waits. Exits non-zero if the bundle flow does not need fewer
+requests per answer, or if any answer was lost.
+
+    python -m benchmarks.prefetch_bundle --answers 100 --rtt-ms 300
+"""
+import argparse
+import random
+import sys
+import time
+
+from benchmarks import common
+
+PREFETCH_BELOW = 3  # same refill threshold as app/static/js/question_bundle.js
+
+
+class Recorder(object):
+    """Wraps a test client and records (seconds, bytes) for every request."""
+
+    def __init__(self, client):
+        self.client = client
+        self.requests = []
+
+    def __call__(self, method, *args, **kwargs):
+        started = time.perf_counter()
+        response = getattr(self.client, method)(*args, **kwargs)
+        self.requests.append((time.perf_counter() - started, len(response.data)))
+        return response
+
+
+def json_answer(question_id, rng):
+    form = common.answer_form(question_id, rng)
+    return {
+        'question_id': question_id + 1,
+        'choices': form['options'],
+        'categories': form['category'],
+        'difficulty': form['difficulty'],
+        'individual_question_time': float(form['individual_question_time']),
+        'stopped_for_time': 0,
+        'is_flagged': form['is_flagged'] == 'true',
+        'client_timestamp': int(time.time() * 1000),
+    }
+
+
+def form_flow(record, answers, rng):
+    location = record('get', '/start_quiz').location
+    answered = 0
+    while answered < answers:
+        question_id = common.question_path_id(location)
+        if question_id is None:
+            break
+        record('get', location)
+        location = record('post', location, data=common.answer_form(question_id, rng)).location
+        answered += 1
+    return answered
+
+
+def bundle_flow(record, answers, rng, flush_every):
+    location = record('get', '/start_quiz').location
+    record('get', location)
+    current = common.question_path_id(location)
+    # The page prefetches as soon as it loads
+    upcoming = [q['question_id'] - 1 for q in record(
+        'get', '/api/questions/next?after={}'.format(current + 1)).get_json()['questions']]
+    queue = []
+    answered = 0
+    while answered < answers and current is not None:
+        queue.append(json_answer(current, rng))
+        answered += 1
+        if len(queue) >= flush_every or answered == answers:
+            result = record('post', '/api/answers', json={'answers': queue}).get_json()
+            if result['saved'] != len(queue):
+                raise RuntimeError('answers rejected: {}'.format(result['results']))
+            queue = []
+        current = upcoming.pop(0) if upcoming else None
+        if current is not None and len(upcoming) < PREFETCH_BELOW and answered < answers:
+            after = upcoming[-1] if upcoming else current
+            bundle = record('get', '/api/questions/next?after={}'.format(after + 1)).get_json()
+            upcoming += [q['question_id'] - 1 for q in bundle['questions']]
+    return answered
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def report(name, recorder, answered, rtt):
+    times = [seconds for seconds, _ in recorder.requests]
+    count = len(recorder.requests)
+    server = sum(times)
+    print('{:<7} {:>5.2f} requests/answer {:>7.0f} bytes/answer  server {:>5.1f} ms/answer '
+          '(p50 {:.1f} ms, p95 {:.1f} ms per request)  with {:.0f} ms RTT: {:.0f} ms/answer'.format(
+              name, count / answered, sum(size for _, size in recorder.requests) / answered,
+              1000 * server / answered, 1000 * percentile(times, 0.5), 1000 * percentile(times, 0.95),
+              1000 * rtt, 1000 * (server + count * rtt) / answered))
+    return count / answered
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--answers', type=int, default=100, help='questions each rater answers')
+    parser.add_argument('--flush-every', type=int, default=1,
+                        help='answers per /api/answers post (the page sends each one as soon as it can)')
+    parser.add_argument('--rtt-ms', type=float, default=300, help='simulated network round trip per request')
+    args = parser.parse_args(argv)
+    args.answers = min(args.answers, common.QUESTIONS_PER_RATER - 1)
+
+    database_path = common.use_temp_database()
+    try:
+        app = common.load_app()
+        common.seed_questions(app, common.QUESTIONS_PER_RATER)
+
+        from app import db
+        from app.models import User_Interactions
+        from app.question_cache import question_cache
+        from app.scoring import reconcile_scores
+        from app.user_cache import user_cache
+
+        rng = random.Random(0)
+        results = {}
+        for name in ('form', 'bundle'):
+            client = app.test_client()
+            common.register_rater(client, name)
+            question_cache.invalidate()
+            user_cache.invalidate()
+            recorder = Recorder(client)
+            if name == 'form':
+                answered = form_flow(recorder, args.answers, rng)
+            else:
+                answered = bundle_flow(recorder, args.answers, rng, args.flush_every)
+            results[name] = (report(name, recorder, answered, args.rtt_ms / 1000), answered)
+
+        with app.app_context():
+            stored = db.session.query(User_Interactions).count()
+            drifted = reconcile_scores()
+
+        answered = sum(n for _, n in results.values())
+        print('stored interactions: {} of {}, users with drifted totals: {}'.format(stored, answered, len(drifted)))
+        ok = stored == answered and not drifted and results['bundle'][0] < results['form'][0]
+        print('OK' if ok else 'FAILED')
+        return 0 if ok else 1
+    finally:
+        common.remove_database(database_path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
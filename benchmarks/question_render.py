@@ -0,0 +1,90 @@
+"""
+Render time of the question page with and without the fragment cache.
+
+Seeds the question bank (6,000 questions by default) and renders the page
+for every question through render_question_page(), the function question()
+uses, in three passes: with FRAGMENT_CACHE_SIZE=0 (everything rendered per
+request), with an empty cache (first view of each question) and with a
+warm cache. Checks that cached and uncached pages are identical apart from
+the CSRF token.
+
+    python -m benchmarks.question_render --questions 6000
+"""
+import argparse
+import re
+import sys
+import time
+
+from benchmarks import common
+
+CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="[^"]*"')
+
+
+def render_all(app, question_ids):
+    """Returns (per-render seconds, pages) for one pass over question_ids."""
+    from app.forms import QuestionForm
+    from app.question_cache import question_cache
+    from app.routes import render_question_page
+
+    times, pages = [], []
+    for question_id in question_ids:
+        with app.test_request_context('/question/{}'.format(question_id + 1)):
+            started = time.perf_counter()
+            q = question_cache.get(question_id)
+            page = render_question_page(QuestionForm(), q, question_id % common.QUESTIONS_PER_RATER,
+                                        common.QUESTIONS_PER_RATER)
+            times.append(time.perf_counter() - started)
+        pages.append(CSRF_TOKEN.sub('', page))
+    return times, pages
+
+
+def summary(name, times):
+    times = sorted(times)
+    mean = sum(times) / len(times)
+    print('{:<9} {:>6} renders  mean {:>7.1f} us  p50 {:>7.1f} us  p95 {:>7.1f} us  total {:.2f} s'.format(
+        name, len(times), 1e6 * mean, 1e6 * times[len(times) // 2],
+        1e6 * times[int(0.95 * len(times))], sum(times)))
+    return mean
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--questions', type=int, default=6000, help='size of the question bank')
+    args = parser.parse_args(argv)
+
+    database_path = common.use_temp_database()
+    try:
+        app = common.load_app()
+        common.seed_questions(app, args.questions)
+
+        from app.fragment_cache import fragment_cache
+
+        question_ids = list(range(args.questions))
+        with app.app_context():
+            # Load the bank and compile the templates outside the timed passes
+            render_all(app, question_ids[:1])
+
+            app.config['FRAGMENT_CACHE_SIZE'] = 0
+            fragment_cache.invalidate()
+            uncached_times, uncached_pages = render_all(app, question_ids)
+
+            app.config['FRAGMENT_CACHE_SIZE'] = max(args.questions + 1, 10000)
+            cold_times, _ = render_all(app, question_ids)
+            warm_times, warm_pages = render_all(app, question_ids)
+            stats = fragment_cache.stats()
+
+        uncached = summary('uncached', uncached_times)
+        summary('cold', cold_times)
+        warm = summary('warm', warm_times)
+        print('warm cache: {:.1f}x faster per render, {}'.format(uncached / warm, stats))
+
+        ok = warm_pages == uncached_pages
+        print('cached pages identical: {}'.format(ok))
+        print('OK' if ok else 'FAILED')
+        return 0 if ok else 1
+    finally:
+        common.remove_database(database_path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Session cookie size and cost per backend.
+
+Raters log in and answer questions through the test client under four
+setups:
+
+    cookie+score  the old behaviour: the signed cookie, plus a total_score
+                  counter bumped on every answer (emulated with an
+                  after_request hook), so every answer re-signs and resends it
+    cookie        the signed cookie without the score (the default now)
+    sqlite        server-side, the sessions table
+    filesystem    server-side, files with the in-process LRU
+
+For each setup the report gives the Set-Cookie bytes sent, how many
+responses carried one, the size of the Cookie header sent back, and the
+time spent in the session interface's open/save per request.
+
+    python -m benchmarks.session_backends --raters 10 --answers 20
+"""
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks import common
+
+SETUPS = ('cookie+score', 'cookie', 'sqlite', 'filesystem')
+
+
+class TimedInterface(object):
+    """Wraps a SessionInterface and adds up the time spent in open_session and save_session."""
+
+    def __init__(self, interface):
+        self.interface = interface
+        self.seconds = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self.interface, name)
+
+    def open_session(self, app, request):
+        started = time.perf_counter()
+        try:
+            return self.interface.open_session(app, request)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+    def save_session(self, app, session, response):
+        started = time.perf_counter()
+        try:
+            return self.interface.save_session(app, session, response)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+def interface_for(app, setup, directory):
+    from flask.sessions import SecureCookieSessionInterface
+
+    from app.sessions import ServerSideSessionInterface, make_store
+
+    if setup.startswith('cookie'):
+        return SecureCookieSessionInterface()
+    config = dict(app.config, SESSION_BACKEND=setup, SESSION_FILE_DIR=directory)
+    return ServerSideSessionInterface(make_store(config), app.config['SESSION_GC_SECONDS'])
+
+
+def run_setup(app, setup, args, directory):
+    timed = app.session_interface = TimedInterface(interface_for(app, setup, directory))
+    app.config['LEGACY_SCORE_COOKIE'] = setup == 'cookie+score'
+    rng = random.Random(args.seed)
+    requests = set_cookies = set_cookie_bytes = cookie_bytes = 0
+    for rater in range(args.raters):
+        client = app.test_client()
+        responses = [client.post('/register', data={
+            'username': '{}-{}'.format(setup, rater), 'email': '{}-{}@example.com'.format(setup, rater),
+            'password': 'benchmark', 'password2': 'benchmark'})]
+        location = client.get('/start_quiz').location
+        for _ in range(args.answers):
+            question_id = common.question_path_id(location)
+            if question_id is None:
+                break
+            responses.append(client.get(location))
+            response = client.post(location, data=common.answer_form(question_id, rng))
+            responses.append(response)
+            location = response.location
+            cookie = client.get_cookie(app.config['SESSION_COOKIE_NAME'])
+            cookie_bytes += len(cookie.value) if cookie else 0
+        for response in responses:
+            headers = response.headers.getlist('Set-Cookie')
+            set_cookies += bool(headers)
+            set_cookie_bytes += sum(len(header) for header in headers)
+        requests += len(responses)
+    return {
+        'requests': requests,
+        'set_cookie_responses': set_cookies,
+        'set_cookie_bytes': set_cookie_bytes,
+        'cookie_bytes': cookie_bytes / max(1, args.raters * args.answers),
+        'session_us': 1e6 * timed.seconds / requests,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--raters', type=int, default=10)
+    parser.add_argument('--answers', type=int, default=20, help='questions each rater answers')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    database_path = common.use_temp_database()
+    directory = tempfile.mkdtemp(prefix='awan-sessions-')
+    try:
+        app = common.load_app()
+        app.config['WTF_CSRF_ENABLED'] = False
+        common.seed_questions(app, common.QUESTIONS_PER_RATER * (args.raters // 3 + 1) * len(SETUPS))
+
+        from flask import request, session
+
+        @app.after_request
+        def legacy_score_cookie(response):
+            # What question() used to do on every answer
+            if app.config.get('LEGACY_SCORE_COOKIE') and request.endpoint == 'main.question' and request.method == 'POST':
+                session['total_score'] = session.get('total_score', 0) + 1
+            return response
+
+        print('{:<13} {:>9} {:>12} {:>16} {:>13} {:>14}'.format(
+            'setup', 'requests', 'set-cookie', 'set-cookie bytes', 'cookie bytes', 'session us/req'))
+        for setup in SETUPS:
+            row = run_setup(app, setup, args, directory)
+            print('{:<13} {:>9} {:>12} {:>16} {:>13.0f} {:>14.1f}'.format(
+                setup, row['requests'], row['set_cookie_responses'], row['set_cookie_bytes'],
+                row['cookie_bytes'], row['session_us']))
+        return 0
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+        common.remove_database(database_path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Cold start of the app: import time and time to the first request.
+
+Each run starts a fresh interpreter, so nothing is cached in-process
+(the OS file cache is warm after the first run). Reported:
+
+  * the total of `python -X importtime -c "import main"` and the
+    distributions that take the most of it
+  * time from interpreter start to the first response of GET /login,
+    GET /question/1 for a logged-in rater and `flask --help`, as the
+    median over --runs
+
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks import common
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+\d+ \| *(\S+)')
+
+FIRST_REQUEST = r'''
+import time
+started = time.perf_counter()
+from main import app
+app.config['WTF_CSRF_ENABLED'] = False
+client = app.test_client()
+imported = time.perf_counter()
+assert client.get('/login').status_code == 200
+login_page = time.perf_counter()
+with client.session_transaction() as session:  # the rater seeded by main(), without hashing a password
+    session['user_id'], session['username'] = 1, 'startup'
+assert client.get('/question/1').status_code == 200
+print(imported - started, login_page - started, time.perf_counter() - started)
+'''
+
+
+def import_times(env):
+    """(total seconds, [(seconds, top-level package)] slowest first), adding up self times"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                            cwd=common.ROOT, env=env, capture_output=True, text=True, check=True)
+    by_package = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            package = match.group(2).split('.')[0]
+            by_package[package] = by_package.get(package, 0) + int(match.group(1)) / 1e6
+    return sum(by_package.values()), sorted(((seconds, package) for package, seconds in by_package.items()),
+                                            reverse=True)
+
+
+def timed_process(args, env):
+    """(wall seconds for the whole process, its stdout)"""
+    started = time.perf_counter()
+    result = subprocess.run(args, cwd=common.ROOT, env=env, capture_output=True, text=True, check=True)
+    return time.perf_counter() - started, result.stdout
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='slowest packages to list')
+    args = parser.parse_args(argv)
+
+    database_path = common.use_temp_database()
+    try:
+        app = common.load_app()
+        common.seed_questions(app, common.QUESTIONS_PER_RATER)
+        from app import db
+        from app.assignments import assign_questions
+        from app.models import User
+        with app.app_context():
+            user = User(username='startup', email='startup@example.com')
+            db.session.add(user)
+            db.session.flush()
+            assign_questions(user, range(common.QUESTIONS_PER_RATER))
+            db.session.commit()
+        env = dict(os.environ, FLASK_APP='main.py')
+
+        totals, first_requests, flask_help = [], [], []
+        top = []
+        for _ in range(args.runs):
+            total, top = import_times(env)
+            totals.append(total)
+            wall, output = timed_process([sys.executable, '-c', FIRST_REQUEST], env)
+            first_requests.append([float(value) for value in output.split()] + [wall])
+            flask_help.append(timed_process([sys.executable, '-m', 'flask', '--help'], env)[0])
+
+        print('import main (-X importtime total)  {:>8.1f} ms'.format(1000 * statistics.median(totals)))
+        for seconds, package in top[:args.top]:
+            print('    {:<30} {:>8.1f} ms'.format(package, 1000 * seconds))
+        columns = list(zip(*first_requests))
+        for label, values in zip(('app imported', 'first GET /login', 'first GET /question/1'), columns):
+            print('{:<35} {:>8.1f} ms after interpreter start'.format(label, 1000 * statistics.median(values)))
+        print('{:<35} {:>8.1f} ms'.format('whole process (python -c ...)', 1000 * statistics.median(columns[3])))
+        print('{:<35} {:>8.1f} ms'.format('flask --help', 1000 * statistics.median(flask_help)))
+        return 0
+    finally:
+        common.remove_database(database_path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Counts the SQL statements issued per answer submit.
+
+One rater answers a run of questions through the real /question POST and
+then re-answers some of them. Every statement the engine runs during each
+POST is captured; the script fails if saving an answer takes more than
+MAX_WRITES statements or reads user_interactions first, or if the
+maintained score aggregates and question_stats differ from a recompute.
+
+    python -m benchmarks.submit_statements --answers 50 --reanswers 10
+"""
+import argparse
+import random
+import sys
+from collections import Counter
+
+from benchmarks import common
+
+# user UPDATE (aggregates + resume pointer) and user_interactions upsert, plus the question_stats
+# upsert; the budget tests/test_submit_statements.py asserts
+MAX_WRITES = 3
+
+
+def classify(statement):
+    words = statement.split()
+    verb = words[0].upper()
+    table = words[words.index('FROM') + 1] if verb == 'SELECT' and 'FROM' in words else None
+    return verb, table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--answers', type=int, default=50, help='first answers submitted')
+    parser.add_argument('--reanswers', type=int, default=10, help='answers submitted again afterwards')
+    args = parser.parse_args(argv)
+
+    database_path = common.use_temp_database()
+    try:
+        app = common.load_app()
+        common.seed_questions(app, common.QUESTIONS_PER_RATER)
+
+        from app import db
+        from app.models import QuestionStats
+        from app.query_plans import captured_statements
+        from app.question_stats import COUNTER_COLUMNS, rebuild_question_stats
+        from app.scoring import reconcile_scores
+
+        client = app.test_client()
+        rng = random.Random(0)
+        common.register_rater(client, 'rater0')
+        location = client.get('/start_quiz').location
+
+        submits = []
+        for _ in range(args.answers):
+            question_id = common.question_path_id(location)
+            if question_id is None:
+                break
+            path = location
+            with app.app_context(), captured_statements() as statements:
+                location = client.post(path, data=common.answer_form(question_id, rng)).location
+            submits.append((path, statements))
+        for path in rng.sample([path for path, _ in submits], min(args.reanswers, len(submits))):
+            with app.app_context(), captured_statements() as statements:
+                client.post(path, data=common.answer_form(common.question_path_id(path), rng))
+            submits.append((path, statements))
+
+        ok = True
+        totals = Counter()
+        for path, statements in submits:
+            kinds = [classify(sql) for sql, _ in statements]
+            writes = sum(verb in ('INSERT', 'UPDATE', 'DELETE') for verb, _ in kinds)
+            totals['statements'] += len(kinds)
+            totals['writes'] += writes
+            if writes > MAX_WRITES or ('SELECT', 'user_interactions') in kinds:
+                print('{}: {} statements'.format(path, len(kinds)))
+                for sql, _ in statements:
+                    print('    ' + ' '.join(sql.split())[:120])
+                ok = False
+
+        with app.app_context():
+            drifted = reconcile_scores()
+            live = {row.question_id: [getattr(row, column) for column in COUNTER_COLUMNS]
+                    for row in QuestionStats.query}
+            db.session.expunge_all()
+            rebuild_question_stats()
+            rebuilt = {row.question_id: [getattr(row, column) for column in COUNTER_COLUMNS]
+                       for row in QuestionStats.query}
+
+        print('{} submits: {:.1f} statements per POST, {:.1f} writes per answer (limit {})'.format(
+            len(submits), totals['statements'] / len(submits), totals['writes'] / len(submits), MAX_WRITES))
+        print('users with drifted totals: {}, question_stats matches a rebuild: {}'.format(
+            len(drifted), live == rebuilt))
+        ok = ok and not drifted and live == rebuilt
+        print('OK' if ok else 'FAILED')
+        return 0 if ok else 1
+    finally:
+        common.remove_database(database_path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Benchmark suite for the rating workflow.
+
+Seeds a temporary database with a synthetic question bank at the chosen
+scale and every rater the campaign would have (three per block of 150
+questions, with assignments). Then a sample of raters drives the real
+routes through the Flask test client: login, /start_quiz, GET and POST
+/question/<id>, and /score. For every route the report gives throughput,
+latency percentiles and the number of SQL statements per request. The
+run fails if a route issues more statements than its budget in
+SQL_BUDGET, so a change that adds queries to a hot path is caught before
+a campaign.
+
+    python -m benchmarks.suite --scale 6000
+    python -m benchmarks.suite --scale 60000 --raters 50 --answers 30
+    python -m benchmarks.suite --scale 600000 --json results.json
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+
+from benchmarks import common
+
+PASSWORD = 'benchmark'
+
+# Most SQL statements one request may issue (the worst case, e.g. on a cache miss)
+SQL_BUDGET = {
+    'login': 1,
+    'start_quiz': 3,
+    'question GET': 3,
+    'question POST': 6,
+    'score': 1,
+}
+
+
+def seed_raters(app, scale, batch_size=5000):
+    """One user per rater slot with the block of questions register() would assign. Returns the count."""
+    from werkzeug.security import generate_password_hash
+
+    from app import db
+    from app.models import Assignment, User
+
+    password_hash = generate_password_hash(PASSWORD)  # hashing once keeps seeding fast at any scale
+    blocks = scale // common.QUESTIONS_PER_RATER
+    count = blocks * 3
+    with app.app_context():
+        users, assignments = [], []
+
+        def flush():
+            if users:
+                db.session.execute(User.__table__.insert(), users)
+            if assignments:
+                db.session.execute(Assignment.__table__.insert(), assignments)
+            users.clear()
+            assignments.clear()
+
+        for user_id in range(1, count + 1):
+            start = (user_id - 1) // 3 * common.QUESTIONS_PER_RATER
+            question_ids = list(range(start, start + common.QUESTIONS_PER_RATER))
+            users.append({
+                'user_id': user_id,
+                'username': 'rater{}'.format(user_id),
+                'email': 'rater{}@example.com'.format(user_id),
+                'password_hash': password_hash,
+                'total_score': 0, 'total_answered': 0, 'total_time': 0,
+                'assigned_questions': json.dumps(question_ids),
+                'assigned_count': len(question_ids),
+                'resume_position': 0,
+            })
+            assignments.extend({'user_id': user_id, 'position': position, 'question_id': qid}
+                               for position, qid in enumerate(question_ids))
+            if len(assignments) >= batch_size:
+                flush()
+        flush()
+        db.session.commit()
+    return count
+
+
+class Meter(object):
+    """Times test-client requests and counts the SQL statements each one issues, per route."""
+
+    def __init__(self, app):
+        self.app = app
+        self.latencies = defaultdict(list)
+        self.statements = defaultdict(list)
+
+    def __call__(self, route, method, client, *args, **kwargs):
+        from app.query_plans import captured_statements
+
+        with self.app.app_context(), captured_statements() as statements:
+            started = time.perf_counter()
+            response = getattr(client, method)(*args, **kwargs)
+            elapsed = time.perf_counter() - started
+        self.latencies[route].append(elapsed)
+        self.statements[route].append(len(statements))
+        return response
+
+
+def drive_rater(meter, client, username, answers, rng):
+    response = meter('login', 'post', client, '/login', data={'username': username, 'password': PASSWORD})
+    if response.status_code != 302 or response.location != '/':
+        raise RuntimeError('login as {} failed with HTTP {}'.format(username, response.status_code))
+    location = meter('start_quiz', 'get', client, '/start_quiz').location
+    for _ in range(answers):
+        question_id = common.question_path_id(location)
+        if question_id is None:
+            break
+        meter('question GET', 'get', client, location)
+        response = meter('question POST', 'post', client, location, data=common.answer_form(question_id, rng))
+        if response.status_code != 302:
+            raise RuntimeError('answer by {} failed with HTTP {}'.format(username, response.status_code))
+        location = response.location
+    meter('score', 'get', client, '/score')
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def report(meter, elapsed):
+    rows = {}
+    print('{:<14} {:>7} {:>9} {:>9} {:>9} {:>9} {:>8} {:>8}'.format(
+        'route', 'count', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'sql avg', 'sql max'))
+    for route in SQL_BUDGET:
+        times = sorted(meter.latencies[route])
+        counts = meter.statements[route]
+        if not times:
+            continue
+        rows[route] = {
+            'count': len(times),
+            'requests_per_second': len(times) / sum(times),
+            'p50_ms': 1000 * percentile(times, 0.50),
+            'p95_ms': 1000 * percentile(times, 0.95),
+            'p99_ms': 1000 * percentile(times, 0.99),
+            'sql_mean': sum(counts) / len(counts),
+            'sql_max': max(counts),
+        }
+        row = rows[route]
+        print('{:<14} {:>7} {:>9.0f} {:>9.2f} {:>9.2f} {:>9.2f} {:>8.2f} {:>8}'.format(
+            route, row['count'], row['requests_per_second'], row['p50_ms'], row['p95_ms'], row['p99_ms'],
+            row['sql_mean'], row['sql_max']))
+    total = sum(len(times) for times in meter.latencies.values())
+    print('{} requests in {:.2f}s ({:.0f} req/s overall)'.format(total, elapsed, total / elapsed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=int, default=6000, help='questions in the bank, e.g. 6000, 60000, 600000')
+    parser.add_argument('--raters', type=int, default=30, help='raters that log in and answer')
+    parser.add_argument('--answers', type=int, default=20, help='questions each rater answers')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', metavar='PATH', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    database_path = common.use_temp_database()
+    try:
+        app = common.load_app()
+        started = time.perf_counter()
+        common.seed_questions(app, args.scale)
+        users = seed_raters(app, args.scale)
+        print('seeded {} questions and {} raters in {:.1f}s'.format(args.scale, users, time.perf_counter() - started))
+
+        rng = random.Random(args.seed)
+        meter = Meter(app)
+        started = time.perf_counter()
+        for user_id in rng.sample(range(1, users + 1), min(args.raters, users)):
+            drive_rater(meter, app.test_client(), 'rater{}'.format(user_id), args.answers, rng)
+        rows = report(meter, time.perf_counter() - started)
+
+        over_budget = {route: row['sql_max'] for route, row in rows.items() if row['sql_max'] > SQL_BUDGET[route]}
+        for route, count in over_budget.items():
+            print('{}: {} SQL statements, budget {}'.format(route, count, SQL_BUDGET[route]))
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({'scale': args.scale, 'raters': args.raters, 'answers': args.answers, 'routes': rows}, f, indent=2)
+        print('OK' if not over_budget else 'FAILED')
+        return 0 if not over_budget else 1
+    finally:
+        common.remove_database(database_path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,4 +7,94 @@ class Config(object):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    QUES_PER_PAGE = 1
\ No newline at end of file
+    # Connection pool per worker process. Keep pool_size at least the number of
+    # threads per worker (gunicorn --threads) so requests do not queue for a connection.
+    # (In-memory SQLite uses a single static connection and takes no pool options.)
+    SQLALCHEMY_ENGINE_OPTIONS = {} if SQLALCHEMY_DATABASE_URI in ('sqlite://', 'sqlite:///:memory:') else {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE') or 10),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW') or 10),
+        'pool_timeout': 30,
+    }
+
+    # SQLite production profile (see app/database.py), applied to every new
+    # connection. WAL lets readers run while one rater's answer is being
+    # written; synchronous=NORMAL is durable across app crashes in WAL mode.
+    # Set SQLITE_TUNING=0 to keep SQLite's defaults.
+    SQLITE_TUNING = os.environ.get('SQLITE_TUNING', '1') != '0'
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024)
+
+    # Retries (with exponential backoff starting at DB_COMMIT_BACKOFF seconds)
+    # when a commit still finds the database locked after the busy timeout
+    DB_COMMIT_RETRIES = int(os.environ.get('DB_COMMIT_RETRIES') or 5)
+    DB_COMMIT_BACKOFF = float(os.environ.get('DB_COMMIT_BACKOFF') or 0.05)
+
+    # werkzeug method string and salt length for new password hashes (see app/passwords.py).
+    # Existing hashes are upgraded when their owner next logs in.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH') or 16)
+    # Most password hashes computed at once per process
+    PASSWORD_HASH_THREADS = int(os.environ.get('PASSWORD_HASH_THREADS') or 2)
+
+    QUES_PER_PAGE = 1
+
+    # How register() picks a new rater's questions (see app/assignment_engine.py):
+    # blocks, balanced or stratified. The defaults are the 6,000-question campaign;
+    # the 20-question demo used QUESTIONS_PER_RATER=10 and RATERS_PER_QUESTION=1.
+    ASSIGNMENT_STRATEGY = os.environ.get('ASSIGNMENT_STRATEGY') or 'blocks'
+    QUESTIONS_PER_RATER = int(os.environ.get('QUESTIONS_PER_RATER') or 150)
+    RATERS_PER_QUESTION = int(os.environ.get('RATERS_PER_QUESTION') or 3)
+    # Questions column the stratified strategy balances across: topic or source
+    ASSIGNMENT_STRATA = os.environ.get('ASSIGNMENT_STRATA') or 'topic'
+
+    # ROUTING_MODE=adaptive hands out questions one at a time by priority instead of
+    # a fixed list (see app/routing.py). A question is settled at RATERS_PER_QUESTION
+    # ratings with ROUTING_AGREEMENT agreement and no flags, or at ROUTING_MAX_RATINGS.
+    ROUTING_MODE = os.environ.get('ROUTING_MODE') or 'assigned'
+    ROUTING_MAX_RATINGS = int(os.environ.get('ROUTING_MAX_RATINGS') or 7)
+    ROUTING_AGREEMENT = float(os.environ.get('ROUTING_AGREEMENT') or 0.8)
+    ROUTING_LEASE_SECONDS = float(os.environ.get('ROUTING_LEASE_SECONDS') or 900)
+    ROUTING_REFRESH_SECONDS = float(os.environ.get('ROUTING_REFRESH_SECONDS') or 60)
+
+    # Most answers accepted by one POST /api/answers
+    ANSWER_BATCH_MAX = int(os.environ.get('ANSWER_BATCH_MAX') or 200)
+
+    # Questions per /api/questions/next bundle by default, and the most a client may ask for
+    QUESTION_BUNDLE_SIZE = int(os.environ.get('QUESTION_BUNDLE_SIZE') or 10)
+    QUESTION_BUNDLE_MAX = int(os.environ.get('QUESTION_BUNDLE_MAX') or 50)
+
+    # In-process question cache (see app/question_cache.py)
+    QUESTION_CACHE_SIZE = int(os.environ.get('QUESTION_CACHE_SIZE') or 10000)
+    QUESTION_CACHE_PRELOAD = os.environ.get('QUESTION_CACHE_PRELOAD', '1') != '0'
+    # load_questions.py touches this file after an import; each worker looks at its mtime at most
+    # every QUESTION_CACHE_CHECK_SECONDS and drops its cached questions when it has changed
+    QUESTION_BANK_STAMP = os.environ.get('QUESTION_BANK_STAMP') or os.path.join(basedir, 'question_bank.stamp')
+    QUESTION_CACHE_CHECK_SECONDS = float(os.environ.get('QUESTION_CACHE_CHECK_SECONDS') or 5)
+
+    # Pre-rendered question page fragments per process (see app/fragment_cache.py); 0 turns it off
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE') or 10000)
+
+    # Per-process cache of the logged-in user (see app/user_cache.py)
+    USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL') or 5)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 1000)
+
+    # Where the session lives (see app/sessions.py): cookie (Flask's signed cookie),
+    # sqlite (sessions table) or filesystem (SESSION_FILE_DIR with an in-process LRU)
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND') or 'cookie'
+    SESSION_FILE_DIR = os.environ.get('SESSION_FILE_DIR') or os.path.join(basedir, 'sessions')
+    SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE') or 1000)
+    # Each process deletes expired server-side sessions at most this often
+    SESSION_GC_SECONDS = float(os.environ.get('SESSION_GC_SECONDS') or 3600)
+
+    # Request instrumentation (see app/instrumentation.py), off by default. With it on,
+    # /admin/metrics serves Prometheus text to admins or to "Authorization: Bearer <METRICS_TOKEN>",
+    # and statements slower than SLOW_QUERY_MS are logged.
+    INSTRUMENTATION = os.environ.get('INSTRUMENTATION', '0') == '1'
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS') or 100)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Lets an admin add ?_profile=1 to a URL to write a folded-stack profile of that request
+    PROFILING = os.environ.get('PROFILING', '0') == '1'
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(basedir, 'profiles')
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS') or 1)
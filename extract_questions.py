@@ -2,12 +2,23 @@ import sqlite3
 import json
 import os
 import ast 
-from collections import defaultdict
+import argparse
+import csv
+import io
+import shutil
+import tempfile
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
 
 # --- Configuration ---
 DATABASE_PATH = 'app.db'
-EXTRACTED_JSON_PATH = 'extracted_questions.json'
-FLAGGED_JSON_PATH = 'flagged_questions.json'
+EXTRACTED_BASENAME = 'extracted_questions'
+FLAGGED_BASENAME = 'flagged_questions'
+EXTRACTED_JSON_PATH = EXTRACTED_BASENAME + '.json'
+FLAGGED_JSON_PATH = FLAGGED_BASENAME + '.json'
+
+# Questions per unit of work handed to the process pool
+DEFAULT_CHUNK_SIZE = 500
 
 # Simplified Chinese category map
 CATEGORY_MAP = {
@@ -23,6 +34,14 @@ CATEGORY_MAP = {
     "10": "【其他】"
 }
 
+# Bit order of user_interactions.choice_mask / category_mask (see app/encoding.py)
+CHOICE_LETTERS = "ABCDE"
+CATEGORY_IDS = [str(n) for n in range(1, 11)]
+
+def decode_mask(mask, symbols):
+    """Symbols whose bit is set in mask, e.g. decode_mask(0b1010, "ABCDE") -> ['B', 'D']."""
+    return [symbol for i, symbol in enumerate(symbols) if mask >> i & 1]
+
 def safe_literal_load(data_str, normalize_to_list=False):
     """
     Attempts to parse a string as JSON or Python literal.
@@ -68,120 +87,340 @@ def safe_literal_load(data_str, normalize_to_list=False):
     # Default return if not normalizing (e.g., for base question choices)
     return result
 
-def process_and_export_data():
+def new_question_record(row):
+    """Builds the export record for one row of the questions table."""
+    return {
+        "id": row[0],
+        "question": row[1],
+        "choices": json.loads(row[2]),
+        "answer": row[3],
+        "explanation": row[4],
+        "topic": row[5],
+        "source": row[6],
+        # Filled in per user from user_interactions
+        "difficulty": {},
+        "categories": {},
+        "selected_choices": {}
+    }
+
+
+def add_interaction(record, interaction):
+    """
+    Folds one user_interactions row into the question's record.
+    Returns True if this user flagged the question.
+    """
+    user_id, q_id, diff, cat_str, is_flagged, selected_choices_str, choice_mask, category_mask = interaction
+
+    # Convert user_id to string for consistent JSON keying
+    user_key = str(user_id)
+
+    # --- 1. Difficulty (Store raw user choice) ---
+    if diff is not None:
+        record["difficulty"][user_key] = diff
+
+    # --- 2. Selected Choices (Store raw user answer) ---
+    # Rows written by current versions of the app carry a bitmask; only older,
+    # unconverted rows need the text to be parsed.
+    if choice_mask is not None:
+        choices_data = decode_mask(choice_mask, CHOICE_LETTERS)
+    else:
+        # IMPORTANT: We use normalize_to_list=True here to ensure single choices ('B') become ['B']
+        choices_data = safe_literal_load(selected_choices_str, normalize_to_list=True)
+    if choices_data:
+        record["selected_choices"][user_key] = choices_data
+
+    # --- 3. Categories (Map IDs to Chinese names) ---
+    # Category IDs are always expected to be lists (even if only one), so we don't normalize single strings
+    if category_mask is not None:
+        category_ids = decode_mask(category_mask, CATEGORY_IDS)
+    else:
+        category_ids = safe_literal_load(cat_str)
+
+    # Ensure category_ids is a list (if it was successfully parsed)
+    if isinstance(category_ids, list) and category_ids:
+        # Map the IDs to their Chinese names
+        record["categories"][user_key] = [CATEGORY_MAP.get(cat_id, "Unknown") for cat_id in category_ids]
+
+    # --- 4. Track flagged status ---
+    return is_flagged == 1
+
+
+# Served by the ix_user_interactions_question_user index, so no sort is needed
+INTERACTIONS_SQL = """
+    SELECT user_id, question_id, selected_difficulty, selected_category, is_flagged, selected_choices,
+           choice_mask, category_mask
+    FROM user_interactions{where}
+    ORDER BY question_id, user_id
+"""
+
+
+def iter_question_records(conn, start_id=None, end_id=None):
+    """
+    Yields (record, is_flagged) for every question with start_id <= id < end_id
+    (all questions when the bounds are None), in question_id order.
+
+    Questions and interactions are read with two cursors that are both sorted
+    by question_id and merged, so only the current question is held in memory.
+    """
+    where = " WHERE question_id >= ? AND question_id < ?" if start_id is not None else ""
+    params = (start_id, end_id) if start_id is not None else ()
+
+    question_cursor = conn.cursor()
+    question_cursor.execute(
+        "SELECT question_id, question, choices, answer, explanation, topic, source "
+        "FROM questions" + where + " ORDER BY question_id", params
+    )
+    interaction_cursor = conn.cursor()
+    interaction_cursor.execute(INTERACTIONS_SQL.format(where=where), params)
+
+    pending = interaction_cursor.fetchone()
+    for row in question_cursor:
+        record = new_question_record(row)
+        q_id = row[0]
+        flagged = False
+
+        # Skip interactions whose question no longer exists (orphaned rows)
+        while pending is not None and pending[1] < q_id:
+            pending = interaction_cursor.fetchone()
+
+        while pending is not None and pending[1] == q_id:
+            if add_interaction(record, pending):
+                flagged = True
+            pending = interaction_cursor.fetchone()
+
+        yield record, flagged
+
+
+# --- Output formats ---
+#
+# Every worker writes its question range as a "fragment" (records without the
+# file header/footer); the parent then stitches the fragments together in
+# question_id order. Text formats are concatenated, Parquet fragments are
+# appended as row groups.
+
+CSV_COLUMNS = ["id", "question", "choices", "answer", "explanation", "topic", "source",
+               "difficulty", "categories", "selected_choices"]
+# Columns holding dicts, stored as JSON text in CSV and Parquet
+NESTED_COLUMNS = {"choices", "difficulty", "categories", "selected_choices"}
+
+
+def flat_record(record):
+    """The record as a flat row of CSV_COLUMNS, with nested values JSON-encoded."""
+    return [json.dumps(record[col], ensure_ascii=False) if col in NESTED_COLUMNS else record[col]
+            for col in CSV_COLUMNS]
+
+
+class JsonFormat:
+    """Pretty-printed array, identical to json.dump(records, f, ensure_ascii=False, indent=2)."""
+    extension = 'json'
+    first_prefix = '\n'
+    separator = ',\n'
+
+    def header(self):
+        return '['
+
+    def footer(self, count):
+        return '\n]' if count else ']'
+
+    def record(self, record):
+        return textwrap.indent(json.dumps(record, ensure_ascii=False, indent=2), '  ')
+
+
+class JsonLinesFormat:
+    """One compact JSON record per line."""
+    extension = 'jsonl'
+    first_prefix = ''
+    separator = ''
+
+    def header(self):
+        return ''
+
+    def footer(self, count):
+        return ''
+
+    def record(self, record):
+        return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class CsvFormat:
+    """One row per question; the per-user dicts are JSON text in their cells."""
+    extension = 'csv'
+    first_prefix = ''
+    separator = ''
+
+    def header(self):
+        return self._row(CSV_COLUMNS)
+
+    def footer(self, count):
+        return ''
+
+    def record(self, record):
+        return self._row(flat_record(record))
+
+    def _row(self, values):
+        buf = io.StringIO()
+        csv.writer(buf).writerow(values)
+        return buf.getvalue()
+
+
+FORMATS = {
+    'json': JsonFormat,
+    'jsonl': JsonLinesFormat,
+    'csv': CsvFormat,
+    'parquet': None,  # written with pyarrow, see write_parquet_fragment()
+}
+
+
+def parquet_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.int64()),
+        ("question", pa.string()),
+        ("choices", pa.string()),
+        ("answer", pa.string()),
+        ("explanation", pa.string()),
+        ("topic", pa.string()),
+        ("source", pa.string()),
+        ("difficulty", pa.string()),
+        ("categories", pa.string()),
+        ("selected_choices", pa.string()),
+    ])
+
+
+def write_parquet_fragment(path, records):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    rows = [flat_record(record) for record in records]
+    columns = list(zip(*rows)) if rows else [[] for _ in CSV_COLUMNS]
+    table = pa.Table.from_arrays([pa.array(list(col), type=field.type)
+                                  for col, field in zip(columns, parquet_schema())],
+                                 schema=parquet_schema())
+    pq.write_table(table, path)
+
+
+def export_range(task):
+    """
+    Worker: exports questions in [start_id, end_id) to two fragment files.
+    Returns (all_path, all_count, flagged_path, flagged_count).
+    """
+    database_path, output_format, start_id, end_id, all_path, flagged_path = task
+    conn = sqlite3.connect(database_path)
+    try:
+        records = iter_question_records(conn, start_id, end_id)
+        if output_format == 'parquet':
+            all_records, flagged_records = [], []
+            for record, flagged in records:
+                all_records.append(record)
+                if flagged:
+                    flagged_records.append(record)
+            write_parquet_fragment(all_path, all_records)
+            write_parquet_fragment(flagged_path, flagged_records)
+            return all_path, len(all_records), flagged_path, len(flagged_records)
+
+        fmt = FORMATS[output_format]()
+        all_count = flagged_count = 0
+        with open(all_path, 'w', encoding='utf-8', newline='') as all_f, \
+                open(flagged_path, 'w', encoding='utf-8', newline='') as flagged_f:
+            for record, flagged in records:
+                text = fmt.record(record)
+                all_f.write((fmt.separator if all_count else '') + text)
+                all_count += 1
+                if flagged:
+                    flagged_f.write((fmt.separator if flagged_count else '') + text)
+                    flagged_count += 1
+        return all_path, all_count, flagged_path, flagged_count
+    finally:
+        conn.close()
+
+
+def merge_text_fragments(output_format, fragments, output_path):
+    """Concatenates (path, count) fragments into the final file. Returns the record count."""
+    fmt = FORMATS[output_format]()
+    total = 0
+    with open(output_path, 'w', encoding='utf-8', newline='') as out:
+        out.write(fmt.header())
+        for path, count in fragments:
+            if not count:
+                continue
+            out.write(fmt.separator if total else fmt.first_prefix)
+            with open(path, encoding='utf-8', newline='') as part:
+                shutil.copyfileobj(part, out)
+            total += count
+        out.write(fmt.footer(total))
+    return total
+
+
+def merge_parquet_fragments(fragments, output_path):
+    """Appends each fragment to the final file as its own row group. Returns the record count."""
+    import pyarrow.parquet as pq
+    total = 0
+    with pq.ParquetWriter(output_path, parquet_schema()) as writer:
+        for path, count in fragments:
+            if count:
+                writer.write_table(pq.read_table(path))
+                total += count
+    return total
+
+
+def question_id_ranges(conn, chunk_size):
+    """Splits the question ids into [start, end) ranges of chunk_size ids."""
+    low, high = conn.execute("SELECT MIN(question_id), MAX(question_id) FROM questions").fetchone()
+    if low is None:
+        return [(0, 1)]
+    return [(start, min(start + chunk_size, high + 1)) for start in range(low, high + 1, chunk_size)]
+
+
+def process_and_export_data(output_format='json', workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
     """
     Connects to the database, aggregates ALL raw interaction data per question/user,
-    and exports questions to two JSON files based on the new structure.
+    and exports questions to two files (all questions and flagged questions).
+
+    The question ids are split into ranges of chunk_size that a pool of
+    workers processes in parallel (parsing the stored answers is the slow
+    part); their outputs are merged in question_id order. output_format is
+    one of 'json' (pretty-printed array), 'jsonl', 'csv' or 'parquet'
+    (requires pyarrow).
     """
+    if output_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("Parquet export requires pyarrow: pip install pyarrow")
+            return
+
+    extracted_path = f"{EXTRACTED_BASENAME}.{output_format}"
+    flagged_path = f"{FLAGGED_BASENAME}.{output_format}"
+    database_path = os.path.abspath(DATABASE_PATH)
+    workers = workers or os.cpu_count() or 1
     conn = None
+    tmp_dir = tempfile.mkdtemp(prefix='export-')
     try:
-        # Step 1: Connect and fetch base questions
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-
-        # Fetch all base question data
-        cursor.execute("SELECT question_id, question, choices, answer, explanation, topic, source FROM questions")
-        base_questions = {row[0]: {
-            "id": row[0],
-            "question": row[1],
-            "choices": json.loads(row[2]),
-            "answer": row[3],
-            "explanation": row[4],
-            "topic": row[5],
-            "source": row[6],
-            # Initialize new fields to empty dictionaries as per request
-            "difficulty": {},
-            "categories": {},
-            "selected_choices": {}
-        } for row in cursor.fetchall()}
-
-        # Dictionary to hold all raw interactions keyed by question_id
-        raw_interactions = defaultdict(lambda: {
-            "difficulty": {},
-            "categories": {},
-            "selected_choices": {},
-            "is_flagged": False
-        })
-        
-        flagged_question_ids = set()
-
-        # Step 2: Fetch ALL user interactions, including user_id and selected_choices
-        cursor.execute(
-            """
-            SELECT user_id, question_id, selected_difficulty, selected_category, is_flagged, selected_choices 
-            FROM user_interactions
-            """
-        )
-        interactions = cursor.fetchall()
-
-        # Step 3: Aggregate raw data from interactions
-        for interaction in interactions:
-            user_id, q_id, diff, cat_str, is_flagged, selected_choices_str = interaction
-            
-            # Skip if the base question data doesn't exist (e.g., orphaned interaction)
-            if q_id not in base_questions:
-                continue
+        conn = sqlite3.connect(database_path)
+        ranges = question_id_ranges(conn, chunk_size)
+        conn.close()
+        conn = None
+
+        tasks = [(database_path, output_format, start, end,
+                  os.path.join(tmp_dir, f"all-{i}"), os.path.join(tmp_dir, f"flagged-{i}"))
+                 for i, (start, end) in enumerate(ranges)]
+
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(export_range, tasks))  # map() keeps task order
+        else:
+            results = [export_range(task) for task in tasks]
+
+        all_fragments = [(r[0], r[1]) for r in results]
+        flagged_fragments = [(r[2], r[3]) for r in results]
+        if output_format == 'parquet':
+            total = merge_parquet_fragments(all_fragments, extracted_path)
+            flagged_total = merge_parquet_fragments(flagged_fragments, flagged_path)
+        else:
+            total = merge_text_fragments(output_format, all_fragments, extracted_path)
+            flagged_total = merge_text_fragments(output_format, flagged_fragments, flagged_path)
 
-            # Convert user_id to string for consistent JSON keying
-            user_key = str(user_id)
-            
-            # --- 1. Difficulty (Store raw user choice) ---
-            if diff is not None:
-                raw_interactions[q_id]["difficulty"][user_key] = diff
-            
-            # --- 2. Selected Choices (Store raw user answer) ---
-            # IMPORTANT: We use normalize_to_list=True here to ensure single choices ('B') become ['B']
-            choices_data = safe_literal_load(selected_choices_str, normalize_to_list=True)
-            # print("choices_data: ", choices_data)
-            
-            if choices_data:
-                raw_interactions[q_id]["selected_choices"][user_key] = choices_data
-
-
-            # --- 3. Categories (Map IDs to Chinese names) ---
-            # Category IDs are always expected to be lists (even if only one), so we don't normalize single strings
-            category_ids = safe_literal_load(cat_str)
-            
-            # Ensure category_ids is a list (if it was successfully parsed)
-            if isinstance(category_ids, list) and category_ids:
-                # Map the IDs to their Chinese names
-                category_names = [CATEGORY_MAP.get(cat_id, "Unknown") for cat_id in category_ids]
-                raw_interactions[q_id]["categories"][user_key] = category_names
-
-
-            # --- 4. Track flagged status ---
-            if is_flagged == 1:
-                flagged_question_ids.add(q_id)
-
-        # Step 4: Merge raw interaction data into the final question structure
-        final_questions_list = []
-        flagged_questions_list = []
-
-        for q_id, q_data in base_questions.items():
-            
-            # Get the raw interaction data for this specific question
-            interaction_data = raw_interactions.get(q_id)
-            
-            if interaction_data:
-                # Replace the placeholder fields with the collected raw data
-                q_data["difficulty"] = interaction_data["difficulty"]
-                q_data["categories"] = interaction_data["categories"]
-                q_data["selected_choices"] = interaction_data["selected_choices"]
-            
-            final_questions_list.append(q_data)
-
-            # Add to the flagged list if it was flagged by any user
-            if q_id in flagged_question_ids:
-                flagged_questions_list.append(q_data)
-
-        # Step 5: Write the data to JSON files
-        with open(EXTRACTED_JSON_PATH, 'w', encoding='utf-8') as f:
-            json.dump(final_questions_list, f, ensure_ascii=False, indent=2)
-            print(f"Successfully exported {len(final_questions_list)} questions to {EXTRACTED_JSON_PATH} with raw user data.")
-
-        with open(FLAGGED_JSON_PATH, 'w', encoding='utf-8') as f:
-            json.dump(flagged_questions_list, f, ensure_ascii=False, indent=2)
-            print(f"Successfully exported {len(flagged_questions_list)} flagged questions to {FLAGGED_JSON_PATH}.")
+        print(f"Successfully exported {total} questions to {extracted_path} with raw user data.")
+        print(f"Successfully exported {flagged_total} flagged questions to {flagged_path}.")
 
     except sqlite3.Error as e:
         print(f"Database error: {e}")
@@ -190,6 +429,16 @@ def process_and_export_data():
     finally:
         if conn:
             conn.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
 if __name__ == "__main__":
-    process_and_export_data()
+    parser = argparse.ArgumentParser(description="Export questions with all rater answers.")
+    parser.add_argument('--format', choices=sorted(FORMATS), default='json',
+                        help="json: pretty-printed array (default); jsonl: one record per line; "
+                             "csv; parquet (requires pyarrow)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes (default: number of CPUs; 1 disables the pool)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Question ids per unit of work")
+    args = parser.parse_args()
+    process_and_export_data(args.format, workers=args.workers, chunk_size=args.chunk_size)
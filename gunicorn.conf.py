@@ -0,0 +1,71 @@
+"""
+gunicorn settings, picked up automatically by ``gunicorn main:app`` (see Procfile).
+
+GUNICORN_PROFILE chooses how a worker process serves requests:
+
+    gthread (default)  a few processes with a thread pool each; idle keep-alive
+                       connections wait in a poller instead of holding a thread
+    gevent             one process per CPU serving many connections as greenlets;
+                       needs ``pip install gevent``
+    sync               one request at a time per process (the old behaviour)
+
+WEB_CONCURRENCY, GUNICORN_THREADS and GUNICORN_CONNECTIONS override the
+worker, thread and connection counts of the profile.
+
+The app is imported and its caches warmed once in the master before the
+workers are forked (app/preload.py), except under gevent, where the import
+has to happen after gevent has patched the worker. GUNICORN_PRELOAD=0/1
+overrides that.
+"""
+import multiprocessing
+import os
+
+profile = os.environ.get('GUNICORN_PROFILE', 'gthread')
+cpus = multiprocessing.cpu_count()
+
+bind = '0.0.0.0:{}'.format(os.environ.get('PORT', '8000'))
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+accesslog = os.environ.get('GUNICORN_ACCESSLOG')  # e.g. "-" for stdout
+
+if profile == 'sync':
+    worker_class = 'sync'
+    workers = 2 * cpus + 1
+    threads = 1
+elif profile == 'gthread':
+    worker_class = 'gthread'
+    workers = cpus + 1
+    threads = int(os.environ.get('GUNICORN_THREADS') or 8)
+elif profile == 'gevent':
+    worker_class = 'gevent'
+    workers = cpus
+    worker_connections = int(os.environ.get('GUNICORN_CONNECTIONS') or 1000)
+    threads = 1
+else:
+    raise RuntimeError('Unknown GUNICORN_PROFILE {!r}, expected sync, gthread or gevent'.format(profile))
+
+workers = int(os.environ.get('WEB_CONCURRENCY') or workers)
+
+# Each thread needs its own database connection. Greenlets queue for the pool
+# (DB_POOL_SIZE + DB_MAX_OVERFLOW per process, see config.py), which also
+# bounds how many of them wait on SQLite's write lock at once.
+if profile == 'gthread':
+    os.environ.setdefault('DB_POOL_SIZE', str(threads))
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0' if profile == 'gevent' else '1') == '1'
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before any worker is forked
+    if preload_app:
+        from app.preload import preload
+        preload(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    # Drop any pooled connection inherited from the master without closing it under the master's feet
+    if preload_app:
+        from app import db
+        with server.app.wsgi().app_context():
+            db.engine.dispose(close=False)
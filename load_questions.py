@@ -1,67 +1,225 @@
+import argparse
+import io
 import json
-import requests
 import os
-from app import db, app
+import re
+import time
+
+from flask import current_app
+
+from app import db, create_app
+from app.dialect import upsert_insert
 from app.models import Questions
+from app.question_cache import touch_bank_stamp
+
+DEFAULT_URL = "https://huggingface.co/datasets/TechTCM/TCMBenchmark/resolve/main/6000_stratified_items.json"
+
+# Whitespace and the commas between array elements
+_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_json_array(stream, chunk_size=1 << 16):
+    """
+    Yields the elements of a top-level JSON array read from a text stream,
+    one at a time, without loading the whole document into memory.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def skip_separators():
+        nonlocal buf, pos, eof
+        while True:
+            pos = _SEPARATORS.match(buf, pos).end()
+            if pos < len(buf) or eof:
+                return
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buf, pos = chunk, 0
+
+    skip_separators()
+    if pos >= len(buf) or buf[pos] != '[':
+        raise ValueError("Expected the file to contain a JSON array of questions.")
+    pos += 1
+
+    while True:
+        skip_separators()
+        if pos >= len(buf):
+            raise ValueError("Unexpected end of file inside the JSON array.")
+        if buf[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            item, end = None, None
+        # Incomplete element (or a number that may continue in the next chunk): read more
+        if end is None or (end == len(buf) and not eof):
+            if eof:
+                raise ValueError("Malformed JSON near character {}.".format(pos))
+            chunk = stream.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        pos = end
+        yield item
+
+
+def open_source(source):
+    """
+    Opens a local JSON file or a URL as a text stream. URLs are streamed with
+    the HUGGINGFACE_TOKEN environment variable as bearer token, if it is set.
+    """
+    if not re.match(r'https?://', source):
+        return open(source, encoding='utf-8')
+
+    # Only needed for remote imports
+    import requests
+
+    headers = {}
+    hf_token = os.environ.get("HUGGINGFACE_TOKEN")
+    if hf_token:
+        headers["Authorization"] = f"Bearer {hf_token}"
+    else:
+        print("Warning: HUGGINGFACE_TOKEN is not set; private datasets will not download.")
+
+    response = requests.get(source, headers=headers, timeout=30, stream=True)
+    response.raise_for_status()  # Raise an exception for bad status codes
+    response.raw.decode_content = True  # undo gzip/deflate transfer encoding
+    return io.TextIOWrapper(response.raw, encoding='utf-8')
+
+
+def question_row(item):
+    """Maps one item of the dataset to a row of the questions table."""
+    return {
+        'question_id': item.get('id'),
+        'question': item.get('question'),
+        'choices': json.dumps(item.get('choices')),  # Store choices as a JSON string
+        'answer': item.get('answer'),
+        'explanation': item.get('explanation'),
+        'topic': item.get('topic'),
+        'difficulty': item.get('difficulty'),
+        'source': item.get('source'),
+    }
+
+
+def _upsert_statement():
+    """INSERT ... ON CONFLICT (question_id) DO UPDATE for the questions table."""
+    stmt = upsert_insert(Questions.__table__)
+    return stmt.on_conflict_do_update(
+        index_elements=['question_id'],
+        set_={name: stmt.excluded[name] for name in question_row({}) if name != 'question_id'},
+    )
+
+
+def _write_batch(rows, replace):
+    """Writes one batch of rows. Returns (inserted, updated, skipped)."""
+    ids = [row['question_id'] for row in rows]
+    existing = {qid for (qid,) in db.session.query(Questions.id).filter(Questions.id.in_(ids))}
+
+    if replace:
+        # An id repeated within the batch is inserted once and then replaced
+        db.session.execute(_upsert_statement(), rows)
+        inserted = len(set(ids) - existing)
+        return inserted, len(rows) - inserted, 0
+
+    # An id repeated within the batch is kept the first time, as the row-by-row import did
+    new_rows = []
+    for row in rows:
+        if row['question_id'] not in existing:
+            existing.add(row['question_id'])
+            new_rows.append(row)
+    if new_rows:
+        db.session.execute(Questions.__table__.insert(), new_rows)
+    return len(new_rows), 0, len(rows) - len(new_rows)
+
+
+def import_questions(items, replace=False, batch_size=1000):
+    """
+    Imports an iterable of dataset items in chunked bulk statements.
+
+    With replace=False questions whose id already exists are skipped; with
+    replace=True they are overwritten. Each batch is committed on its own, so
+    memory use stays flat regardless of the size of the dataset.
+    """
+    started = time.perf_counter()
+    inserted = updated = skipped = 0
+    batch = []
+
+    def flush():
+        nonlocal inserted, updated, skipped
+        counts = _write_batch(batch, replace)
+        db.session.commit()
+        inserted += counts[0]
+        updated += counts[1]
+        skipped += counts[2]
+        batch.clear()
+        elapsed = time.perf_counter() - started
+        total = inserted + updated + skipped
+        print(f"{total} rows processed ({total / elapsed:.0f} rows/sec)")
+
+    for item in items:
+        batch.append(question_row(item))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    elapsed = time.perf_counter() - started
+    total = inserted + updated + skipped
+    print(f"Done: {inserted} inserted, {updated} replaced, {skipped} skipped "
+          f"in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f} rows/sec).")
+
+    touch_bank_stamp()
+    print(f"Running app workers reload the questions within {current_app.config['QUESTION_CACHE_CHECK_SECONDS']:g}s. "
+          "Restart them to assign new questions to raters.")
+    return inserted, updated, skipped
+
+
+def load_questions(source, replace=False, batch_size=1000):
+    """Streams questions from a local JSON file or URL into the database."""
+    print(f"Reading questions from {source}...")
+    with open_source(source) as stream:
+        return import_questions(iter_json_array(stream), replace=replace, batch_size=batch_size)
+
 
 def load_questions_from_json_url(url):
     """
     Loads questions from a JSON file hosted at a given URL and
-    adds them to the database.
+    adds them to the database, skipping ids that already exist.
     """
-    # Get the Hugging Face token from an environment variable for security
-    hf_token = os.environ.get("HUGGINGFACE_TOKEN")
+    return load_questions(url)
 
-    if not hf_token:
-        print("Error: HUGGINGFACE_TOKEN environment variable is not set.")
-        print("Please set your Hugging Face token before running this script.")
-        return
-
-    headers = {"Authorization": f"Bearer {hf_token}"}
-
-    print("Attempting to download questions from the provided URL...")
-    try:
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        data = response.json()
-        print("Download successful. Starting to process questions...")
-    except requests.exceptions.RequestException as e:
-        print(f"Error downloading the file from {url}: {e}")
-        return
-
-    for item in data:
-        existing_q = Questions.query.get(item.get('id'))
-        if existing_q:
-            print(f"Skipping question with ID {item['id']} as it already exists.")
-            continue
-            
-        new_question = Questions(
-            id=item.get('id'),
-            question=item.get('question'),
-            choices=json.dumps(item.get('choices')),  # Store choices as a JSON string
-            answer=item.get('answer'),
-            explanation=item.get('explanation'),
-            topic=item.get('topic'),
-            difficulty=item.get('difficulty'),
-            source=item.get('source')
-        )
-        db.session.add(new_question)
-        print(f"Added question with ID {item['id']}")
-
-    db.session.commit()
-    print("All new questions successfully committed to the database.")
 
-if __name__ == '__main__':
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import questions from a JSON array file or URL.")
+    parser.add_argument('source', nargs='?', default=DEFAULT_URL,
+                        help="Local path or http(s) URL of the dataset (default: the 6000 item set).")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--replace', action='store_true',
+                      help="Overwrite questions whose id already exists.")
+    mode.add_argument('--skip-existing', action='store_true',
+                      help="Leave existing questions untouched (the default).")
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help="Rows per bulk statement and commit.")
+    args = parser.parse_args(argv)
+
+    app = create_app()
     # Add a with block to create an application context
     with app.app_context():
-        # The code inside this block can now access the database
-        # huggingface_url = "https://huggingface.co/datasets/TechTCM/TCMBenchmark/resolve/main/Full_TechTCM_Evaluation_Set.json"
-        # huggingface_url = "https://huggingface.co/datasets/TechTCM/TCMBenchmark/resolve/main/multi_single_mix.json"
-        # huggingface_url = "https://huggingface.co/datasets/TechTCM/TCMBenchmark/resolve/main/10000_items.json"
-        
-        #huggingface_url = "https://huggingface.co/datasets/TechTCM/TCMBenchmark/resolve/main/5000_stratified_items.json"
-        #huggingface_url = "https://huggingface.co/datasets/TechTCM/TCMBenchmark/resolve/main/20_stratified_items.json"
-        
-        huggingface_url = "https://huggingface.co/datasets/TechTCM/TCMBenchmark/resolve/main/6000_stratified_items.json"
-        
-        load_questions_from_json_url(huggingface_url)
+        # Other datasets on the hub:
+        # https://huggingface.co/datasets/TechTCM/TCMBenchmark/resolve/main/Full_TechTCM_Evaluation_Set.json
+        # https://huggingface.co/datasets/TechTCM/TCMBenchmark/resolve/main/multi_single_mix.json
+        # https://huggingface.co/datasets/TechTCM/TCMBenchmark/resolve/main/10000_items.json
+        # https://huggingface.co/datasets/TechTCM/TCMBenchmark/resolve/main/5000_stratified_items.json
+        # https://huggingface.co/datasets/TechTCM/TCMBenchmark/resolve/main/20_stratified_items.json
+        try:
+            load_questions(args.source, replace=args.replace, batch_size=args.batch_size)
+        except OSError as e:  # includes requests' RequestException
+            print(f"Error reading {args.source}: {e}")
+        except ValueError as e:
+            print(f"Error parsing {args.source}: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""widen user.password_hash for scrypt hashes
+
+Revision ID: 2d7f5c8e1b90
+Revises: 7b9e2f4c1a68
+Create Date: 2026-10-18 18:02:44.117305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d7f5c8e1b90'
+down_revision = '7b9e2f4c1a68'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=128),
+               type_=sa.String(length=256),
+               existing_nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=256),
+               type_=sa.String(length=128),
+               existing_nullable=True)
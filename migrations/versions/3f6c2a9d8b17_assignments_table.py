@@ -0,0 +1,57 @@
+"""assignments table, backfilled from user.assigned_questions
+
+Revision ID: 3f6c2a9d8b17
+Revises: e1d0c4b2a9f3
+Create Date: 2026-10-18 14:02:11.218904
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6c2a9d8b17'
+down_revision = 'e1d0c4b2a9f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    assignments = op.create_table('assignments',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.question_id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.user_id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'position')
+    )
+    op.create_index('ix_assignments_user_question', 'assignments', ['user_id', 'question_id'], unique=True)
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('assigned_count', sa.Integer(), nullable=True))
+
+    # Copy the JSON lists into position-indexed rows
+    conn = op.get_bind()
+    user = sa.table('user',
+        sa.column('user_id', sa.Integer),
+        sa.column('assigned_questions', sa.Text),
+        sa.column('assigned_count', sa.Integer))
+    rows = conn.execute(sa.select(user.c.user_id, user.c.assigned_questions)
+                        .where(user.c.assigned_questions.isnot(None))).fetchall()
+    for user_id, assigned_questions in rows:
+        question_ids = json.loads(assigned_questions)
+        if question_ids:
+            op.bulk_insert(assignments, [
+                {'user_id': user_id, 'position': position, 'question_id': qid}
+                for position, qid in enumerate(question_ids)
+            ])
+        conn.execute(user.update().where(user.c.user_id == user_id)
+                     .values(assigned_count=len(question_ids)))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('assigned_count')
+    op.drop_index('ix_assignments_user_question', table_name='assignments')
+    op.drop_table('assignments')
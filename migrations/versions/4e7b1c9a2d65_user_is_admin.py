@@ -0,0 +1,26 @@
+"""user.is_admin flag for the /admin endpoints
+
+Revision ID: 4e7b1c9a2d65
+Revises: 9c3a6e0f5b27
+Create Date: 2026-10-19 10:12:37.184502
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e7b1c9a2d65'
+down_revision = '9c3a6e0f5b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_admin', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('is_admin')
@@ -0,0 +1,90 @@
+"""question_stats table
+
+Revision ID: 5a0b7e3c9d14
+Revises: c52e9f0a6d31
+Create Date: 2026-10-18 15:48:05.102377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a0b7e3c9d14'
+down_revision = 'c52e9f0a6d31'
+branch_labels = None
+depends_on = None
+
+
+# The counters and the GROUP BY that fills them, frozen from app/question_stats.py as of this revision
+DIFFICULTY_LEVELS = [1, 2, 3, 4, 5]
+CHOICE_COLUMNS = ['choice_{}'.format(letter) for letter in 'abcde']
+CATEGORY_COLUMNS = ['category_{}'.format(n) for n in range(1, 11)]
+COUNTER_COLUMNS = (['ratings', 'correct', 'flags'] + ['difficulty_{}'.format(level) for level in DIFFICULTY_LEVELS]
+                   + CHOICE_COLUMNS + CATEGORY_COLUMNS)
+
+
+def _counter_aggregates(ui):
+    choice_mask = sa.func.coalesce(ui.c.choice_mask, 0)
+    category_mask = sa.func.coalesce(ui.c.category_mask, 0)
+
+    def bit_count(mask, i):
+        return sa.func.sum(mask.op('>>')(i).op('&')(1))
+
+    aggregates = [
+        sa.func.count(),
+        sa.func.sum(ui.c.correctness),
+        sa.func.sum(sa.case((ui.c.is_flagged == 1, 1), else_=0)),
+    ]
+    aggregates += [sa.func.sum(sa.case((ui.c.selected_difficulty == level, 1), else_=0)) for level in DIFFICULTY_LEVELS]
+    aggregates += [bit_count(choice_mask, i) for i in range(len(CHOICE_COLUMNS))]
+    aggregates += [bit_count(category_mask, i) for i in range(len(CATEGORY_COLUMNS))]
+    return aggregates
+
+
+def upgrade():
+    question_stats = op.create_table('question_stats',
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('ratings', sa.Integer(), nullable=False),
+    sa.Column('correct', sa.Integer(), nullable=False),
+    sa.Column('flags', sa.Integer(), nullable=False),
+    sa.Column('difficulty_1', sa.Integer(), nullable=False),
+    sa.Column('difficulty_2', sa.Integer(), nullable=False),
+    sa.Column('difficulty_3', sa.Integer(), nullable=False),
+    sa.Column('difficulty_4', sa.Integer(), nullable=False),
+    sa.Column('difficulty_5', sa.Integer(), nullable=False),
+    sa.Column('choice_a', sa.Integer(), nullable=False),
+    sa.Column('choice_b', sa.Integer(), nullable=False),
+    sa.Column('choice_c', sa.Integer(), nullable=False),
+    sa.Column('choice_d', sa.Integer(), nullable=False),
+    sa.Column('choice_e', sa.Integer(), nullable=False),
+    sa.Column('category_1', sa.Integer(), nullable=False),
+    sa.Column('category_2', sa.Integer(), nullable=False),
+    sa.Column('category_3', sa.Integer(), nullable=False),
+    sa.Column('category_4', sa.Integer(), nullable=False),
+    sa.Column('category_5', sa.Integer(), nullable=False),
+    sa.Column('category_6', sa.Integer(), nullable=False),
+    sa.Column('category_7', sa.Integer(), nullable=False),
+    sa.Column('category_8', sa.Integer(), nullable=False),
+    sa.Column('category_9', sa.Integer(), nullable=False),
+    sa.Column('category_10', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.question_id'], ),
+    sa.PrimaryKeyConstraint('question_id')
+    )
+
+    # Counted from the answers recorded so far, since the answer POST only adds and subtracts deltas
+    ui = sa.table('user_interactions',
+        sa.column('question_id', sa.Integer),
+        sa.column('correctness', sa.Integer),
+        sa.column('is_flagged', sa.Integer),
+        sa.column('selected_difficulty', sa.Integer),
+        sa.column('choice_mask', sa.Integer),
+        sa.column('category_mask', sa.Integer))
+    op.get_bind().execute(question_stats.insert().from_select(
+        ['question_id'] + COUNTER_COLUMNS,
+        sa.select(ui.c.question_id, *_counter_aggregates(ui)).group_by(ui.c.question_id),
+    ))
+
+
+def downgrade():
+    op.drop_table('question_stats')
@@ -0,0 +1,45 @@
+"""fill user.total_score/total_answered/total_time from user_interactions
+
+The answer POST now only adjusts these columns, and /score reads them as
+they are. Before that they were only written when a rater opened /score,
+so they are recomputed here for every user.
+
+Revision ID: 6b1e8d3f0a42
+Revises: 4e7b1c9a2d65
+Create Date: 2026-10-19 14:26:03.551870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b1e8d3f0a42'
+down_revision = '4e7b1c9a2d65'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    user = sa.table('user',
+        sa.column('user_id', sa.Integer),
+        sa.column('total_score', sa.Integer),
+        sa.column('total_answered', sa.Integer),
+        sa.column('total_time', sa.Float))
+    ui = sa.table('user_interactions',
+        sa.column('user_id', sa.Integer),
+        sa.column('correctness', sa.Integer),
+        sa.column('individual_question_time', sa.Float))
+
+    def total(aggregate):
+        return sa.select(sa.func.coalesce(aggregate, 0)).where(ui.c.user_id == user.c.user_id).scalar_subquery()
+
+    op.get_bind().execute(user.update().values(
+        total_score=total(sa.func.sum(ui.c.correctness)),
+        total_answered=total(sa.func.count()),
+        total_time=total(sa.func.sum(ui.c.individual_question_time)),
+    ))
+
+
+def downgrade():
+    pass
@@ -0,0 +1,28 @@
+"""covering indexes for the hot user_interactions queries
+
+Revision ID: 7b9e2f4c1a68
+Revises: 5a0b7e3c9d14
+Create Date: 2026-10-18 16:31:09.442751
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b9e2f4c1a68'
+down_revision = '5a0b7e3c9d14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_interactions', schema=None) as batch_op:
+        batch_op.create_index('ix_user_interactions_question_user', ['question_id', 'user_id'], unique=False)
+        batch_op.create_index('ix_user_interactions_user_totals', ['user_id', 'correctness', 'individual_question_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_interactions', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_interactions_user_totals')
+        batch_op.drop_index('ix_user_interactions_question_user')
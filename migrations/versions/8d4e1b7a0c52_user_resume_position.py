@@ -0,0 +1,27 @@
+"""user.resume_position pointer for start_quiz
+
+Revision ID: 8d4e1b7a0c52
+Revises: 3f6c2a9d8b17
+Create Date: 2026-10-18 14:40:37.551023
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4e1b7a0c52'
+down_revision = '3f6c2a9d8b17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # NULL is read as 0; start_quiz() moves the pointer forward on first use
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('resume_position', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('resume_position')
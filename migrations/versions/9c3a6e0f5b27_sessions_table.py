@@ -0,0 +1,34 @@
+"""sessions table for server-side sessions
+
+Revision ID: 9c3a6e0f5b27
+Revises: 2d7f5c8e1b90
+Create Date: 2026-10-18 19:14:05.630218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3a6e0f5b27'
+down_revision = '2d7f5c8e1b90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sessions',
+    sa.Column('session_id', sa.String(length=64), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.Column('expires', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('session_id')
+    )
+    with op.batch_alter_table('sessions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sessions_expires'), ['expires'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sessions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sessions_expires'))
+
+    op.drop_table('sessions')
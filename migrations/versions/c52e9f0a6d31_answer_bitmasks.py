@@ -0,0 +1,98 @@
+"""choice_mask/category_mask bitmask columns on user_interactions
+
+Revision ID: c52e9f0a6d31
+Revises: 8d4e1b7a0c52
+Create Date: 2026-10-18 15:12:49.330716
+
+"""
+import ast
+import json
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e9f0a6d31'
+down_revision = '8d4e1b7a0c52'
+branch_labels = None
+depends_on = None
+
+
+# A frozen copy of the conversion in app/encoding.py as of this revision, so
+# later changes to the app cannot change what this migration does. Values
+# outside A-E / 1-10 are left out of the mask instead of failing the upgrade.
+CHOICE_LETTERS = 'ABCDE'
+CATEGORY_IDS = [str(n) for n in range(1, 11)]
+
+
+def _legacy_list(text):
+    if not text:
+        return []
+    try:
+        value = json.loads(text)
+    except ValueError:
+        try:
+            value = ast.literal_eval(text)
+        except (ValueError, SyntaxError, TypeError):
+            value = text
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value]
+    return [str(value)]
+
+
+def _mask(values, allowed, kind, text):
+    mask = 0
+    for value in values:
+        if value in allowed:
+            mask |= 1 << allowed.index(value)
+        else:
+            logger.warning('Skipping unknown %s %r in legacy answer %r', kind, value, text)
+    return mask
+
+
+def legacy_choice_mask(text):
+    letters = []
+    for item in _legacy_list(text):
+        letters.extend(item if item.isalpha() else [])
+    return _mask(letters, CHOICE_LETTERS, 'choice', text)
+
+
+def legacy_category_mask(text):
+    return _mask(_legacy_list(text), CATEGORY_IDS, 'category', text)
+
+
+def upgrade():
+    with op.batch_alter_table('user_interactions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('choice_mask', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('category_mask', sa.Integer(), nullable=True))
+
+    # Convert every historical answer from its text form
+    conn = op.get_bind()
+    interactions = sa.table('user_interactions',
+        sa.column('user_id', sa.Integer),
+        sa.column('question_id', sa.Integer),
+        sa.column('selected_choices', sa.Text),
+        sa.column('selected_category', sa.Text),
+        sa.column('choice_mask', sa.Integer),
+        sa.column('category_mask', sa.Integer))
+    rows = conn.execute(sa.select(interactions.c.user_id, interactions.c.question_id,
+                                  interactions.c.selected_choices, interactions.c.selected_category)).fetchall()
+    update = interactions.update().where(
+        interactions.c.user_id == sa.bindparam('uid'),
+        interactions.c.question_id == sa.bindparam('qid'),
+    ).values(choice_mask=sa.bindparam('cm'), category_mask=sa.bindparam('km'))
+    params = [{'uid': user_id, 'qid': question_id,
+               'cm': legacy_choice_mask(choices), 'km': legacy_category_mask(categories)}
+              for user_id, question_id, choices, categories in rows]
+    if params:
+        conn.execute(update, params)
+
+
+def downgrade():
+    with op.batch_alter_table('user_interactions', schema=None) as batch_op:
+        batch_op.drop_column('category_mask')
+        batch_op.drop_column('choice_mask')
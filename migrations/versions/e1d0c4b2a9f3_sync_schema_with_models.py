@@ -0,0 +1,87 @@
+"""bring the initial schema in line with the models
+
+The first revision still described the original quiz app (user.id, marks,
+questions.id). This renames the primary key columns, drops marks, adds the
+columns the models gained since, and creates user_interactions.
+
+Databases that were created with db.create_all() already have some or all
+of this shape, so every step first checks whether it is still needed.
+
+Revision ID: e1d0c4b2a9f3
+Revises: a1e82b697be6
+Create Date: 2026-10-18 16:20:44.870215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1d0c4b2a9f3'
+down_revision = 'a1e82b697be6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    questions = {column['name'] for column in inspector.get_columns('questions')}
+    if 'question_id' not in questions or 'category' not in questions:
+        with op.batch_alter_table('questions', schema=None) as batch_op:
+            if 'question_id' not in questions:
+                batch_op.alter_column('id', new_column_name='question_id', existing_type=sa.Integer(), existing_nullable=False)
+            if 'category' not in questions:
+                batch_op.add_column(sa.Column('category', sa.String(length=64), nullable=True))
+
+    user = {column['name'] for column in inspector.get_columns('user')}
+    user_indexes = {index['name'] for index in inspector.get_indexes('user')}
+    added = [column for column in (
+        sa.Column('total_score', sa.Integer(), nullable=True),
+        sa.Column('total_answered', sa.Integer(), nullable=True),
+        sa.Column('total_time', sa.Float(), nullable=True),
+        sa.Column('assigned_questions', sa.Text(), nullable=True),
+    ) if column.name not in user]
+    if 'marks' in user or 'user_id' not in user or added:
+        with op.batch_alter_table('user', schema=None) as batch_op:
+            if 'ix_user_marks' in user_indexes:
+                batch_op.drop_index('ix_user_marks')
+            if 'marks' in user:
+                batch_op.drop_column('marks')
+            if 'user_id' not in user:
+                batch_op.alter_column('id', new_column_name='user_id', existing_type=sa.Integer(), existing_nullable=False)
+            for column in added:
+                batch_op.add_column(column)
+
+    if not inspector.has_table('user_interactions'):
+        op.create_table('user_interactions',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('question_id', sa.Integer(), nullable=False),
+        sa.Column('correctness', sa.Integer(), nullable=False),
+        sa.Column('selected_choices', sa.Text(), nullable=True),
+        sa.Column('individual_question_time', sa.Float(), nullable=False),
+        sa.Column('stopped_for', sa.Float(), nullable=False),
+        sa.Column('selected_category', sa.Text(), nullable=True),
+        sa.Column('selected_difficulty', sa.Integer(), nullable=True),
+        sa.Column('is_flagged', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['question_id'], ['questions.question_id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.user_id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'question_id')
+        )
+
+
+def downgrade():
+    op.drop_table('user_interactions')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('assigned_questions')
+        batch_op.drop_column('total_time')
+        batch_op.drop_column('total_answered')
+        batch_op.drop_column('total_score')
+        batch_op.alter_column('user_id', new_column_name='id', existing_type=sa.Integer(), existing_nullable=False)
+        batch_op.add_column(sa.Column('marks', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_user_marks', ['marks'], unique=False)
+
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.drop_column('category')
+        batch_op.alter_column('question_id', new_column_name='id', existing_type=sa.Integer(), existing_nullable=False)
@@ -0,0 +1,44 @@
+"""
+Fixtures for the test suite: an app built with create_app() against a
+temporary SQLite file, seeded with synthetic questions, with the
+process-wide caches emptied so every test starts cold. The helpers that
+drive the routes are shared with the benchmarks (benchmarks/common.py).
+"""
+import pytest
+
+from app import create_app, db
+from app.assignment_engine import assignment_engine
+from app.fragment_cache import fragment_cache
+from app.question_cache import question_cache
+from app.user_cache import user_cache
+from benchmarks.common import seed_questions
+from config import Config
+
+QUESTIONS = 200
+QUESTIONS_PER_RATER = 20
+
+
+def reset_caches():
+    question_cache.invalidate()
+    user_cache.invalidate()
+    fragment_cache.invalidate()
+    assignment_engine.reset()
+
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'test.db')
+        WTF_CSRF_ENABLED = False
+        PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'  # registration speed is not under test
+        QUESTIONS_PER_RATER = QUESTIONS_PER_RATER
+
+    app = create_app(TestConfig)
+    seed_questions(app, QUESTIONS)
+    reset_caches()
+    yield app
+    reset_caches()
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
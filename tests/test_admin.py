@@ -0,0 +1,31 @@
+"""
+Admin rights come from the stored is_admin flag, not from a username that
+anyone could register.
+"""
+from app import db
+from app.models import User
+from app.user_cache import user_cache
+from benchmarks.common import register_rater
+
+
+def test_admin_endpoints_need_the_flag(app):
+    client = app.test_client()
+    register_rater(client, 'admin')
+    assert client.get('/admin/question_stats').status_code == 403
+
+    with app.app_context():
+        user = User.query.filter_by(username='admin').one()
+        user.is_admin = True
+        db.session.commit()
+        user_cache.invalidate(user.id)
+    assert client.get('/admin/question_stats').status_code == 200
+
+
+def test_set_admin_command(app):
+    register_rater(app.test_client(), 'alice')
+    runner = app.test_cli_runner()
+    assert 'now an admin' in runner.invoke(args=['set-admin', 'alice']).output
+    with app.app_context():
+        assert User.query.filter_by(username='alice').one().is_admin
+    assert 'no longer an admin' in runner.invoke(args=['set-admin', 'alice', '--revoke']).output
+    assert runner.invoke(args=['set-admin', 'nobody']).exit_code != 0
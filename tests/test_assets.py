@@ -0,0 +1,16 @@
+"""
+Assets are served without reading the session, so shared caches may store
+them for logged-in raters too.
+"""
+from app.assets import CATEGORIES_VERSION
+from benchmarks.common import register_rater
+
+
+def test_assets_do_not_vary_on_the_cookie(app):
+    client = app.test_client()
+    register_rater(client, 'rater')
+    for url in ('/assets/categories.{}.js'.format(CATEGORIES_VERSION), '/static/js/question_bundle.js'):
+        response = client.get(url)
+        assert response.status_code == 200
+        assert 'Cookie' not in response.headers.get('Vary', '')
+        response.close()
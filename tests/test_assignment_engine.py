@@ -0,0 +1,33 @@
+"""
+A worker's coverage counts include lists other workers commit, whatever
+order the users are committed in.
+"""
+from sqlalchemy import func
+
+from app import db
+from app.assignment_engine import AssignmentEngine
+from app.models import Assignment, User
+
+
+def register_with(engine, user_id):
+    user = User(id=user_id, username='rater{}'.format(user_id), email='rater{}@example.com'.format(user_id))
+    db.session.add(user)
+    db.session.flush()
+    engine.assign(user)
+    db.session.commit()
+
+
+def test_counts_users_committed_out_of_order(app):
+    app.config['ASSIGNMENT_STRATEGY'] = 'balanced'
+    with app.app_context():
+        this_worker, other_worker = AssignmentEngine(), AssignmentEngine()
+        register_with(this_worker, 1)
+        register_with(other_worker, 3)  # commits before user 2 does
+        register_with(this_worker, 4)
+        register_with(other_worker, 2)
+        register_with(this_worker, 5)
+
+        stored = dict(db.session.query(Assignment.question_id, func.count()).group_by(Assignment.question_id))
+        counted = {question_id: count for question_id, count in this_worker._strategy.coverage().items() if count}
+        assert counted == stored
+        assert this_worker.stats()['max'] - this_worker.stats()['min'] <= 1
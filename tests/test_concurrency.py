@@ -0,0 +1,47 @@
+"""
+Raters submitting at the same time against one SQLite file (the production
+profile from app/database.py): no answer may be lost to "database is locked"
+and the maintained aggregates must match user_interactions.
+"""
+import random
+import threading
+
+from app import db
+from app.models import User_Interactions
+from app.scoring import reconcile_scores
+from benchmarks.common import answer_form, question_path_id, register_rater
+
+RATERS = 8
+ANSWERS = 15
+
+
+def run_rater(app, index, results):
+    client = app.test_client()
+    rng = random.Random(index)
+    register_rater(client, 'rater{}'.format(index))
+    location = client.get('/start_quiz').location
+    statuses = []
+    for _ in range(ANSWERS):
+        question_id = question_path_id(location)
+        response = client.post(location, data=answer_form(question_id, rng))
+        statuses.append(response.status_code)
+        location = response.location
+    results[index] = statuses
+
+
+def test_concurrent_raters_lose_no_answers(app):
+    with app.app_context():
+        assert db.session.execute(db.text('PRAGMA journal_mode')).scalar() == 'wal'
+
+    results = {}
+    threads = [threading.Thread(target=run_rater, args=(app, index, results)) for index in range(RATERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == list(range(RATERS))
+    assert all(statuses == [302] * ANSWERS for statuses in results.values())
+    with app.app_context():
+        assert User_Interactions.query.count() == RATERS * ANSWERS
+        assert reconcile_scores() == []
@@ -0,0 +1,19 @@
+"""
+Login follows a relative ?next= and ignores one pointing at another host.
+"""
+from benchmarks.common import register_rater
+
+
+def login(client, next_page):
+    return client.post('/login', query_string={'next': next_page},
+                       data={'username': 'rater', 'password': 'benchmark'})
+
+
+def test_login_redirects_to_next(app):
+    client = app.test_client()
+    register_rater(client, 'rater')
+    client.get('/logout')
+
+    assert login(client, '/score').location == '/score'
+    client.get('/logout')
+    assert login(client, 'https://evil.example/').location == '/'
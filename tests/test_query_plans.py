@@ -0,0 +1,29 @@
+"""
+The hot queries keep using their indexes (what `flask check-query-plans`
+reports, as a test).
+"""
+import random
+
+import pytest
+
+from app.query_plans import CHECKS, check_query_plans
+from benchmarks.common import answer_form, question_path_id, register_rater
+
+
+@pytest.fixture
+def answered(app):
+    client = app.test_client()
+    rng = random.Random(0)
+    register_rater(client, 'rater')
+    location = client.get('/start_quiz').location
+    for _ in range(5):
+        location = client.post(location, data=answer_form(question_path_id(location), rng)).location
+    return app
+
+
+def test_hot_queries_use_their_indexes(answered):
+    with answered.app_context():
+        results = check_query_plans()
+    assert len(results) == len(CHECKS)
+    failed = {description: (problems, plan) for description, plan, problems in results if problems}
+    assert failed == {}
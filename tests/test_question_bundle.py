@@ -0,0 +1,57 @@
+"""
+The prefetch flow of question_bundle.js against cold caches: one page load,
+then bundles and batched answers, needing fewer requests per answered
+question than posting the form for each one (a POST and a page load).
+"""
+from app.question_cache import question_cache
+from benchmarks.common import question_path_id, register_rater
+
+
+def json_answer(question_id):
+    """An answer for question_id (1-based, as the API takes it)."""
+    return {
+        'question_id': question_id,
+        'choices': ['B', 'D'] if (question_id - 1) % 10 == 0 else ['A'],
+        'categories': ['3'],
+        'difficulty': 2,
+        'individual_question_time': 4.5,
+        'stopped_for_time': 0,
+        'is_flagged': False,
+        'client_timestamp': question_id,
+    }
+
+
+def test_bundle_needs_fewer_requests_per_answer_from_cold_caches(app):
+    app.config['QUESTION_CACHE_PRELOAD'] = False
+    client = app.test_client()
+    register_rater(client, 'rater')
+    location = client.get('/start_quiz').location
+    with app.app_context():
+        assert question_cache.stats()['size'] == 0
+
+    requests = 1
+    assert client.get(location).status_code == 200
+    current = question_path_id(location) + 1
+    pending = [current]
+    answered = []
+    while True:
+        requests += 1
+        bundle = client.get('/api/questions/next?after={}'.format(current)).get_json()
+        assert bundle['total'] == 20
+        for question in bundle['questions']:
+            assert set(question) == {'question_id', 'url', 'position', 'question', 'choices', 'multi_select'}
+        batch = [json_answer(question_id) for question_id in pending + [q['question_id'] for q in bundle['questions']]]
+        if not batch:
+            break
+        requests += 1
+        results = client.post('/api/answers', json={'answers': batch}).get_json()['results']
+        assert [result['status'] for result in results] == ['saved'] * len(batch)
+        answered += [answer['question_id'] for answer in batch]
+        pending = []
+        if not bundle['questions']:
+            break
+        current = bundle['questions'][-1]['question_id']
+
+    assert sorted(answered) == list(range(1, 21))
+    assert requests / len(answered) < 2 / 3  # posting the form costs 2 per answer
+    assert client.get('/start_quiz').location.endswith('/score')
@@ -0,0 +1,23 @@
+"""
+Running workers drop their cached questions once load_questions.py signals
+an import.
+"""
+import json
+
+from app import db
+from app.models import Questions
+from app.question_cache import question_cache, touch_bank_stamp
+
+
+def test_import_reaches_the_cache(app, tmp_path):
+    app.config['QUESTION_BANK_STAMP'] = str(tmp_path / 'question_bank.stamp')
+    app.config['QUESTION_CACHE_CHECK_SECONDS'] = 0
+    with app.app_context():
+        assert question_cache.get(1).choices['A'] == '選項 A1'
+
+        # What load_questions.py does, as another process would
+        Questions.query.filter_by(id=1).update({'choices': json.dumps({'A': 'new'})})
+        db.session.commit()
+        assert question_cache.get(1).choices['A'] == '選項 A1'
+        touch_bank_stamp()
+        assert question_cache.get(1).choices == {'A': 'new'}
@@ -0,0 +1,69 @@
+"""
+Statements per answer submit.
+
+Saving an answer writes the user_interactions row with one upsert and the
+score aggregates plus resume pointer with one UPDATE of the user row. The
+question_stats upsert, which keeps the per-question counters current in the
+same transaction, is the third and last write. None of them reads
+user_interactions first, and a re-answer costs the same as a first answer.
+"""
+import random
+
+from app import db
+from app.models import QuestionStats
+from app.query_plans import captured_statements
+from app.question_stats import COUNTER_COLUMNS, rebuild_question_stats
+from app.scoring import reconcile_scores
+from benchmarks.common import answer_form, question_path_id, register_rater
+
+# (verb, table) of every write an answer may issue, in order
+ANSWER_WRITES = [('UPDATE', 'user'), ('INSERT', 'question_stats'), ('INSERT', 'user_interactions')]
+# plus the reads of the request around it: the logged-in user, the question's position and the next one
+MAX_STATEMENTS_PER_POST = 6
+
+
+def classify(sql):
+    words = sql.replace('(', ' ').split()
+    verb = words[0].upper()
+    keyword = {'SELECT': 'FROM', 'INSERT': 'INTO', 'UPDATE': 'UPDATE', 'DELETE': 'FROM'}.get(verb)
+    table = words[words.index(keyword) + 1].strip('"') if keyword in words else None
+    return verb, table
+
+
+def submit(app, client, path, rng):
+    with app.app_context(), captured_statements() as statements:
+        response = client.post(path, data=answer_form(question_path_id(path), rng))
+    assert response.status_code == 302
+    return response.location, [classify(sql) for sql, _ in statements]
+
+
+def stats_rows():
+    return {row.question_id: [getattr(row, column) for column in COUNTER_COLUMNS] for row in QuestionStats.query}
+
+
+def test_answer_submit_stays_within_the_statement_budget(app):
+    client = app.test_client()
+    rng = random.Random(0)
+    register_rater(client, 'rater')
+    location = client.get('/start_quiz').location
+
+    paths = []
+    for _ in range(10):
+        paths.append(location)
+        location, statements = submit(app, client, location, rng)
+        writes = [kind for kind in statements if kind[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        assert writes == ANSWER_WRITES
+        assert ('SELECT', 'user_interactions') not in statements
+        assert len(statements) <= MAX_STATEMENTS_PER_POST
+
+    for path in paths[::3]:  # re-answers
+        _, statements = submit(app, client, path, rng)
+        assert [kind for kind in statements if kind[0] in ('INSERT', 'UPDATE', 'DELETE')] == ANSWER_WRITES
+        assert ('SELECT', 'user_interactions') not in statements
+
+    with app.app_context():
+        assert reconcile_scores() == []
+        live = stats_rows()
+        db.session.expunge_all()
+        rebuild_question_stats()
+        assert stats_rows() == live